@@ -1,10 +1,26 @@
-from fastapi import FastAPI, HTTPException, Query, Path
-from fastapi.responses import RedirectResponse
+from contextlib import ExitStack, asynccontextmanager
+import json
+import threading
+import weakref
+from fastapi import Depends, FastAPI, HTTPException, Query, Path, Request
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from pydantic import BaseModel
+from functools import lru_cache
 from typing import Optional, List
-import duckdb
 import uvicorn
 from datetime import datetime
+from city_dimension import load_city_dimension
+from connection_pool import CursorPool, PoolTimeout
+from customer_summary import CUSTOMER_SUMMARY_TABLE, has_customer_summary
+from date_range import date_range_filter, day_filter
+from json_rows import (arrow_reader, columns_sql, fetch_json_rows, fetch_model_columns, json_array,
+                        json_document, json_lines, json_object_sql)
+from keyset import decode_cursor, encode_cursor, keyset_filter
+from response_formats import BINARY_RESPONSES, JSON, VARY_ACCEPT, encode_table, negotiate
+from result_cache import ResultCache
+from star_schema import CALENDAR_COLUMNS, calendar_columns_sql
 
 class Customer(BaseModel):
     customer_number: int
@@ -44,11 +60,23 @@ class Sale(BaseModel):
     hour_cos: float
     country: str
 
+def sale_rows_sql(query):
+    """`query`'s sales_data rows as the Sale fields, the calendar ones derived from `date`.
+
+    The star layout's sales_data view has the calendar columns but the flat
+    table only `date`; deriving them here serves both, and only for the
+    rows the query returns.
+    """
+    calendar = {name for name, _ in CALENDAR_COLUMNS}
+    stored = ', '.join(name for name in Sale.model_fields if name not in calendar)
+    return f"SELECT {stored}, {calendar_columns_sql('date')} FROM ({query}) AS sales"
+
 class SalesResponse(BaseModel):
-    total_records: int
+    total_records: Optional[int]
     page: int
     page_size: int
     sales: List[Sale]
+    next_cursor: Optional[str] = None
 
 class SalesSummary(BaseModel):
     total_records: int
@@ -66,39 +94,309 @@ class ProductSales(BaseModel):
     total_revenue: float
     avg_price: float
 
-# Database connection helper
-def get_db_connection():
-    return duckdb.connect('sales_timeseries.db', read_only=True)
+# Rows per record batch fetched and sent by the streaming endpoints
+STREAM_BATCH_ROWS = 10000
+
+# Sort key of the customer listings, which continuation tokens encode
+CUSTOMER_KEY = ['customer_number', 'age', 'country']
+
+def sales_filters(
+    start_date: Optional[str] = Query(None, description="Start date in YYYY-MM-DD format", examples=["2024-01-01"]),
+    end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DD format", examples=["2024-12-31"]),
+    product_id: Optional[str] = Query(None, description="Filter by product ID", examples=["P001"]),
+    customer_number: Optional[int] = Query(None, description="Filter by customer number", examples=[100001]),
+    min_age: Optional[int] = Query(None, ge=18, le=100, description="Minimum customer age", examples=[25]),
+    max_age: Optional[int] = Query(None, ge=18, le=100, description="Maximum customer age", examples=[65])
+):
+    """Sales filter query parameters shared by the sales endpoints, as (WHERE conditions, params)"""
+    # Validate date formats if provided
+    if start_date:
+        try:
+            datetime.strptime(start_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400, 
+                detail="Invalid start_date format. Please use YYYY-MM-DD format (e.g., 2024-01-01)"
+            )
+    
+    if end_date:
+        try:
+            datetime.strptime(end_date, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(
+                status_code=400, 
+                detail="Invalid end_date format. Please use YYYY-MM-DD format (e.g., 2024-12-31)"
+            )
+
+    # Build WHERE clause; the date range is prunable by zone maps
+    where_conditions, params = date_range_filter(start_date or None, end_date or None)
+    if product_id:
+        where_conditions.append("product_id = ?")
+        params.append(product_id)
+    if customer_number:
+        where_conditions.append("customer_number = ?")
+        params.append(customer_number)
+    if min_age:
+        where_conditions.append("age >= ?")
+        params.append(min_age)
+    if max_age:
+        where_conditions.append("age <= ?")
+        params.append(max_age)
+    return where_conditions, params
+
+# One row per customer and age they shopped at, unnested from the precomputed customer_summary
+CUSTOMER_AGES = f"(SELECT customer_number, UNNEST(ages, recursive := true) FROM {CUSTOMER_SUMMARY_TABLE})"
+
+# OpenAPI `responses` entry for the paged, streamable customer listings
+CUSTOMER_RESPONSES = {200: {
+    "headers": {"X-Next-Cursor": {"description": "Token for the next page; absent on the last page",
+                                  "schema": {"type": "string"}}},
+    "content": {"application/x-ndjson": {}},
+}}
+
+def customer_filters(
+    country: Optional[str] = Query(None, description="Filter by country", examples=["Singapore"]),
+    min_age: Optional[int] = Query(None, ge=18, le=100, description="Minimum customer age", examples=[25]),
+    max_age: Optional[int] = Query(None, ge=18, le=100, description="Maximum customer age", examples=[65])
+):
+    """Customer filter query parameters shared by the customer listings, as (WHERE conditions, params)
+
+    The star layout stores country names and the flat layout their
+    country_id, so a country matches by name or by any of its ids.
+    """
+    where_conditions, params = [], []
+    if country:
+        matches = [country, *(str(country_id) for country_id in load_city_dimension().country_ids_named(country))]
+        where_conditions.append(f"CAST(country AS VARCHAR) IN ({', '.join('?' * len(matches))})")
+        params += matches
+    if min_age:
+        where_conditions.append("age >= ?")
+        params.append(min_age)
+    if max_age:
+        where_conditions.append("age <= ?")
+        params.append(max_age)
+    return where_conditions, params
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that closes its generator however the response ends.
+
+    When the client goes away Starlette stops iterating but leaves a sync
+    generator suspended until garbage collection, still holding whatever
+    its `with` blocks hold (a pooled cursor, for stream_rows).
+    """
+
+    def __init__(self, content, **kwargs):
+        super().__init__(content, **kwargs)
+        self.generator = content
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.generator.close()
+
+def csv_bytes(batch, header):
+    """Encode a record batch or table as CSV, with the header row if `header`"""
+    sink = pa.BufferOutputStream()
+    pa_csv.write_csv(batch, sink, pa_csv.WriteOptions(include_header=header))
+    return sink.getvalue().to_pybytes()
+
+def main(db_path='sales_timeseries.db', pool_size=8, pool_timeout=30.0, cache_bytes=64 * 1024 * 1024,
+         stream_limit=None):
+    """Build the API app.
+
+    The database is opened once, read-only, when the app starts; requests
+    borrow one of `pool_size` cursors on that connection and get a 503 if
+    none frees up within `pool_timeout` seconds. A streamed response keeps
+    its cursor until the client has read it all, so at most `stream_limit`
+    streams (default: half the pool) run at once and slow downloads cannot
+    take every cursor; a stream over the limit waits `pool_timeout` seconds
+    for a slot, then gets a 503. Whole-table aggregates are kept in a
+    ResultCache of up to `cache_bytes`, keyed on the version of the
+    database file, and recomputed once it is rebuilt.
+    """
+    @asynccontextmanager
+    async def lifespan(app):
+        with CursorPool(db_path, pool_size, pool_timeout) as pool:
+            app.state.db_pool = pool
+            app.state.result_cache = ResultCache(cache_bytes)
+            yield
+
+    if stream_limit is None:
+        stream_limit = max(1, pool_size // 2)
+    if stream_limit < 1:
+        raise ValueError("stream_limit must be at least 1")
+    stream_slots = threading.BoundedSemaphore(stream_limit)
+    streams = {'active': 0}
+    streams_lock = threading.Lock()
+
+    def release_stream_slot():
+        with streams_lock:
+            streams['active'] -= 1
+        stream_slots.release()
 
-def main():
     app = FastAPI(
         title="Retail Sales API",
         description="API for retail sales time series data",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
 
+    # Database connection helper; picks up a rebuilt database file first
+    def get_db_connection():
+        app.state.db_pool.refresh()
+        return app.state.db_pool.cursor()
+
+    def cached(key, compute):
+        """Response body for `key` at the current data version, computed once per version.
+
+        On a miss compute(con) runs on a pooled cursor and its body is kept
+        under that cursor's version, the data it actually read.
+        """
+        pool = app.state.db_pool
+        pool.refresh()
+        value = app.state.result_cache.get(pool.version_key, key)
+        if value is None:
+            with pool.versioned_cursor() as (version, con):
+                value = compute(con)
+            value = app.state.result_cache.put(version, key, value)
+        return value
+
+    # Counts are keyed on the data version, so a rebuild starts fresh ones
+    @lru_cache(maxsize=256)
+    def count_sales(version, where_clause, params):
+        with get_db_connection() as con:
+            return con.execute(f"SELECT COUNT(*) FROM sales_data{where_clause}", list(params)).fetchone()[0]
+
+    # Whether the database has customer_summary, looked up once per data version
+    @lru_cache(maxsize=8)
+    def summary_table_exists(version):
+        with get_db_connection() as con:
+            return has_customer_summary(con)
+
+    def use_customer_summary():
+        """Whether the customer endpoints can read customer_summary; errors map to 503/500 like queries"""
+        try:
+            return summary_table_exists(app.state.db_pool.refresh())
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    def stream_rows(model, query, params, output_format='ndjson'):
+        """Run `query` and return a generator of its rows shaped like `model` as NDJSON or CSV.
+
+        A stream slot and the cursor are taken and the query started before
+        anything is sent, so too many streams, a busy pool or a failing
+        query is a 503 or 500 rather than an empty 200. Rows are then
+        fetched STREAM_BATCH_ROWS at a time as the generator is consumed.
+        Send it with ClosingStreamingResponse, so that a client going away
+        hands both back at once.
+        """
+        if output_format == 'csv':
+            select = columns_sql(model)
+        else:
+            select = f"{json_object_sql(model)} AS row_json"
+        wrapped = f"SELECT {select} FROM ({query}) AS rows"
+        if not stream_slots.acquire(timeout=pool_timeout):
+            raise HTTPException(status_code=503,
+                                detail=f"All {stream_limit} streams busy after {pool_timeout:g}s")
+        with streams_lock:
+            streams['active'] += 1
+        borrowed = ExitStack()
+        borrowed.callback(release_stream_slot)
+        try:
+            con = borrowed.enter_context(get_db_connection())
+            reader = arrow_reader(con.execute(wrapped, params), STREAM_BATCH_ROWS)
+        except PoolTimeout as e:
+            borrowed.close()
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            borrowed.close()
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+        def batches():
+            # The cursor and slot go back once the last batch is sent, or when the client goes away
+            with borrowed:
+                header = True
+                for batch in reader:
+                    yield csv_bytes(batch, header) if output_format == 'csv' else json_lines(batch)
+                    header = False
+                if output_format == 'csv' and header:
+                    yield csv_bytes(reader.schema.empty_table(), True)
+
+        stream = batches()
+        # A response that is never sent never starts the generator, so never runs the `with`
+        weakref.finalize(stream, borrowed.close)
+        return stream
+
+    def customer_listing(model, select, source, group_by, page_size, cursor, stream, filters):
+        """One page of a customer listing from `source`, continued by X-Next-Cursor, or all of it as NDJSON"""
+        where_conditions, params = filters
+        if cursor:
+            try:
+                after = decode_cursor(cursor, [int, int, str])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            keyset_conditions, keyset_params = keyset_filter(CUSTOMER_KEY, after, descending=False)
+            where_conditions += keyset_conditions
+            params += keyset_params
+        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        query = f"""
+            SELECT {select}
+            FROM {source}{where_clause}
+            {group_by}
+            ORDER BY {', '.join(CUSTOMER_KEY)}
+        """
+        if stream:
+            return ClosingStreamingResponse(stream_rows(model, query, params), media_type="application/x-ndjson")
+
+        try:
+            with get_db_connection() as con:
+                rows = fetch_json_rows(con, model, f"{query} LIMIT {page_size}", params, columns=CUSTOMER_KEY)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        headers = {}
+        if rows.num_rows == page_size:
+            headers['X-Next-Cursor'] = encode_cursor([rows.column(column)[-1].as_py() for column in CUSTOMER_KEY])
+        return Response(json_array(rows), media_type="application/json", headers=headers)
+
     @app.get("/", tags=["Root"])
     def read_root():
         """Redirect to API documentation"""
         return RedirectResponse(url="/docs")
 
-    @app.get("/sales/", response_model=SalesResponse, tags=["Sales"])
+    @app.get("/sales/", response_model=SalesResponse, tags=["Sales"], responses=BINARY_RESPONSES)
     def get_sales(
-        page: int = Query(1, ge=1, description="Page number"),
+        request: Request,
+        page: int = Query(1, ge=1, description="Page number (ignored when a cursor is given)"),
         page_size: int = Query(50, ge=1, le=1000, description="Items per page"),
-        start_date: Optional[str] = Query(None, description="Start date in YYYY-MM-DD format", examples=["2024-01-01"]),
-        end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DD format", examples=["2024-12-31"]),
-        product_id: Optional[str] = Query(None, description="Filter by product ID", examples=["P001"]),
-        customer_number: Optional[int] = Query(None, description="Filter by customer number", examples=[100001]),
-        min_age: Optional[int] = Query(None, ge=18, le=100, description="Minimum customer age", examples=[25]),
-        max_age: Optional[int] = Query(None, ge=18, le=100, description="Maximum customer age", examples=[65])
+        cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+        include_total: bool = Query(True, description="Count the matching records (cached per filter)"),
+        filters: tuple = Depends(sales_filters)
     ):
         """
         Get sales data with pagination and filtering
         
+        Sales come newest first, ordered by (date, receipt_number, product_id).
+        Each page returns a `next_cursor`; passing it back fetches the next
+        page by seeking past that key instead of skipping rows, so a deep
+        page costs the same as the first. `page` still works for offset
+        paging.
+
+        With `Accept: application/vnd.apache.arrow.stream` or
+        `application/x-parquet` the page comes back as an Arrow IPC stream
+        or Parquet file of Sale columns in their database types, with
+        total_records and next_cursor in the X-Total-Records and
+        X-Next-Cursor headers. JSON is the default.
+
         Args:
-            page: Page number (starts from 1)
+            page: Page number (starts from 1), used when no cursor is given
             page_size: Number of items per page (1-1000)
+            cursor: Continuation token from the previous page's next_cursor
+            include_total: Return total_records (counted once per filter, then cached); null if false
             start_date: Start date filter in YYYY-MM-DD format
             end_date: End date filter in YYYY-MM-DD format
             product_id: Filter by specific product ID (P001, P002, etc.)
@@ -109,298 +407,276 @@ def main():
         Returns:
             Paginated sales data with filtering applied
         """
-        # Validate date formats if provided
-        if start_date:
-            try:
-                datetime.strptime(start_date, "%Y-%m-%d")
-            except ValueError:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Invalid start_date format. Please use YYYY-MM-DD format (e.g., 2024-01-01)"
-                )
-        
-        if end_date:
+        if cursor:
             try:
-                datetime.strptime(end_date, "%Y-%m-%d")
-            except ValueError:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Invalid end_date format. Please use YYYY-MM-DD format (e.g., 2024-12-31)"
-                )
-        
+                after = decode_cursor(cursor, [datetime.fromisoformat, int, str])
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e), headers=VARY_ACCEPT)
+
+        media_type = negotiate(request.headers.get('accept'))
         try:
+            where_conditions, params = filters
+            where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+            total_records = (count_sales(app.state.db_pool.refresh(), where_clause, tuple(params))
+                             if include_total else None)
+
+            # Seek past the cursor's key, or fall back to an offset
+            offset = 0 if cursor else (page - 1) * page_size
+            if cursor:
+                keyset_conditions, keyset_params = keyset_filter(['date', 'receipt_number', 'product_id'], after)
+                where_conditions += keyset_conditions
+                params += keyset_params
+            page_where = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+
             with get_db_connection() as con:
-                # Build WHERE clause
-                where_conditions = []
-                if start_date:
-                    where_conditions.append(f"date >= '{start_date}'")
-                if end_date:
-                    where_conditions.append(f"date <= '{end_date}'")
-                if product_id:
-                    where_conditions.append(f"product_id = '{product_id}'")
-                if customer_number:
-                    where_conditions.append(f"customer_number = {customer_number}")
-                if min_age:
-                    where_conditions.append(f"age >= {min_age}")
-                if max_age:
-                    where_conditions.append(f"age <= {max_age}")
-                
-                where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-                
-                # Get total count
-                count_query = f"SELECT COUNT(*) FROM sales_data{where_clause}"
-                total_records = con.execute(count_query).fetchone()[0]
-                
-                # Get paginated data
-                offset = (page - 1) * page_size
-                data_query = f"""
-                    SELECT * FROM sales_data{where_clause}
-                    ORDER BY date DESC
+                data_query = sale_rows_sql(f"""
+                    SELECT * FROM sales_data{page_where}
+                    ORDER BY date DESC, receipt_number DESC, product_id DESC
                     LIMIT {page_size} OFFSET {offset}
-                """
-                
-                df = con.execute(data_query).df()
-                
-                # Convert to list of Sale objects
-                sales = []
-                for _, row in df.iterrows():
-                    sale = Sale(
-                        date=str(row['date']),
-                        customer_number=int(row['customer_number']),
-                        age=int(row['age']),
-                        receipt_number=int(row['receipt_number']),
-                        product_id=row['product_id'],
-                        product_name=row['product_name'],
-                        units_sold=int(row['units_sold']),
-                        unit_price_sgd=float(row['unit_price_sgd']),
-                        total_amount_per_product_sgd=float(row['total_amount_per_product_sgd']),
-                        receipt_total_sgd=float(row['receipt_total_sgd']),
-                        day_of_week=int(row['day_of_week']),
-                        month=int(row['month']),
-                        hour=int(row['hour']),
-                        year=int(row['year']),
-                        day_of_week_text=row['day_of_week_text'],
-                        month_text=row['month_text'],
-                        day_of_week_sin=float(row['day_of_week_sin']),
-                        day_of_week_cos=float(row['day_of_week_cos']),
-                        month_sin=float(row['month_sin']),
-                        month_cos=float(row['month_cos']),
-                        hour_sin=float(row['hour_sin']),
-                        hour_cos=float(row['hour_cos']),
-                        country=row['country']
-                    )
-                    sales.append(sale)
-                
-                return SalesResponse(
-                    total_records=total_records,
-                    page=page,
-                    page_size=page_size,
-                    sales=sales
-                )
+                """)
                 
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    @app.get("/customers/", response_model=List[Customer], tags=["Customers"])
-    def get_customers():
-        """Get list of unique customers"""
-        try:
-            with get_db_connection() as con:
-                # Get unique customers only
-                query = """
-                    SELECT DISTINCT 
-                        customer_number,
-                        age,
-                        country
-                    FROM sales_data 
-                    ORDER BY customer_number
-                """
-                df = con.execute(query).df()
-                customers = []
-                for _, row in df.iterrows():
-                    customer = Customer(
-                        customer_number=int(row['customer_number']),
-                        age=int(row['age']),
-                        country=row['country']
-                    )
-                    customers.append(customer)
-                return customers
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+                if media_type == JSON:
+                    rows = fetch_json_rows(con, Sale, data_query, params,
+                                           columns=['date', 'receipt_number', 'product_id'])
+                else:
+                    rows = fetch_model_columns(con, Sale, data_query, params)
 
-    @app.get("/customers/summary/", response_model=List[CustomerSummary], tags=["Customers"])
-    def get_customers_summary():
-        """Get customer summary with total sales and amount"""
-        try:
-            with get_db_connection() as con:
-                query = """
-                    SELECT 
-                        customer_number,
-                        age,
-                        country,
-                        COUNT(*) as total_sales,
-                        SUM(total_amount_per_product_sgd) as total_amount
-                    FROM sales_data 
-                    GROUP BY customer_number, age, country
-                    ORDER BY customer_number
-                """
-                df = con.execute(query).df()
-                customers = []
-                for _, row in df.iterrows():
-                    customer = CustomerSummary(
-                        customer_number=int(row['customer_number']),
-                        age=int(row['age']),
-                        country=row['country'],
-                        total_sales=int(row['total_sales']),
-                        total_amount=float(row['total_amount'])
-                    )
-                    customers.append(customer)
-                return customers
+            next_cursor = None
+            if rows.num_rows == page_size:
+                next_cursor = encode_cursor([rows.column(column)[-1].as_py()
+                                             for column in ('date', 'receipt_number', 'product_id')])
+
+            if media_type != JSON:
+                headers = dict(VARY_ACCEPT)
+                if total_records is not None:
+                    headers['X-Total-Records'] = str(total_records)
+                if next_cursor:
+                    headers['X-Next-Cursor'] = next_cursor
+                return Response(encode_table(rows, media_type), media_type=media_type, headers=headers)
+
+            return Response(json_document({
+                'total_records': total_records,
+                'page': page,
+                'page_size': page_size,
+                'sales': json_array(rows),
+                'next_cursor': next_cursor
+            }), media_type="application/json", headers=VARY_ACCEPT)
+
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=VARY_ACCEPT)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}", headers=VARY_ACCEPT)
+    @app.get("/sales/export", response_class=StreamingResponse, tags=["Sales"],
+             responses={200: {"content": {"application/x-ndjson": {}, "text/csv": {}}}})
+    def export_sales(
+        output_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$",
+                                   description="ndjson (one Sale object per line) or csv"),
+        filters: tuple = Depends(sales_filters)
+    ):
+        """
+        Stream every sale matching the filters as NDJSON or CSV
+
+        Takes the same filters as /sales/, without paging. DuckDB hands the
+        result over STREAM_BATCH_ROWS rows at a time and each batch is
+        encoded and sent before the next one is fetched, so the server holds
+        one batch however many rows match. Rows come in storage order (day
+        by day for generated databases) rather than newest first, which
+        would take a sort of the whole result. Each row has the Sale fields.
+        """
+        where_conditions, params = filters
+        where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+        rows = stream_rows(Sale, sale_rows_sql(f"SELECT * FROM sales_data{where_clause}"), params, output_format)
+        media_type = "text/csv" if output_format == 'csv' else "application/x-ndjson"
+        disposition = f'attachment; filename="sales.{output_format}"'
+        return ClosingStreamingResponse(rows, media_type=media_type, headers={"Content-Disposition": disposition})
+
+    @app.get("/customers/", response_model=List[Customer], tags=["Customers"], responses=CUSTOMER_RESPONSES)
+    def get_customers(
+        page_size: int = Query(1000, ge=1, le=10000, description="Customers per page"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+        stream: bool = Query(False, description="Stream every matching customer as NDJSON instead of one page"),
+        filters: tuple = Depends(customer_filters)
+    ):
+        """
+        Get unique customers, a page at a time
+
+        Customers are ordered by (customer_number, age, country); a customer
+        appears once per age they shopped at. A full page carries an
+        X-Next-Cursor header to pass back as `cursor` for the next one.
+        With `stream=true` every matching customer is sent as NDJSON in
+        batches instead, so memory per request stays bounded either way.
+        """
+        if use_customer_summary():
+            return customer_listing(Customer, "customer_number, age, country", CUSTOMER_AGES, "",
+                                    page_size, cursor, stream, filters)
+        return customer_listing(Customer, "DISTINCT customer_number, age, country", "sales_data", "",
+                                page_size, cursor, stream, filters)
+
+    @app.get("/customers/summary/", response_model=List[CustomerSummary], tags=["Customers"],
+             responses=CUSTOMER_RESPONSES)
+    def get_customers_summary(
+        page_size: int = Query(1000, ge=1, le=10000, description="Customers per page"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor header of the previous page"),
+        stream: bool = Query(False, description="Stream every matching customer as NDJSON instead of one page"),
+        filters: tuple = Depends(customer_filters)
+    ):
+        """
+        Get customer summary with total sales and amount, paged and filtered like /customers/
+
+        Totals come precomputed from customer_summary when the database has
+        it, so a page costs a range read instead of an aggregate over every sale.
+        """
+        if use_customer_summary():
+            return customer_listing(CustomerSummary, "customer_number, age, country, total_sales, total_amount",
+                                    CUSTOMER_AGES, "", page_size, cursor, stream, filters)
+        select = """customer_number, age, country,
+                   COUNT(*) as total_sales,
+                   SUM(total_amount_per_product_sgd) as total_amount"""
+        return customer_listing(CustomerSummary, select, "sales_data", f"GROUP BY {', '.join(CUSTOMER_KEY)}",
+                                page_size, cursor, stream, filters)
 
     @app.get("/summary/", response_model=SalesSummary, tags=["Analytics"])
     def get_sales_summary():
-        """Get overall sales summary statistics"""
+        """Get overall sales summary statistics (cached per data version)"""
+        def compute(con):
+            # Basic statistics
+            summary_query = """
+                SELECT 
+                    COUNT(*) as total_records,
+                    SUM(total_amount_per_product_sgd) as total_revenue,
+                    COUNT(DISTINCT customer_number) as unique_customers,
+                    COUNT(DISTINCT receipt_number) as unique_receipts,
+                    MIN(date) as date_start,
+                    MAX(date) as date_end
+                FROM sales_data
+            """
+            summary_result = con.execute(summary_query).fetchone()
+
+            # Top products
+            top_products_query = """
+                SELECT 
+                    product_id,
+                    product_name,
+                    SUM(units_sold) as total_units,
+                    SUM(total_amount_per_product_sgd) as total_revenue,
+                    AVG(unit_price_sgd) as avg_price
+                FROM sales_data
+                GROUP BY product_id, product_name
+                ORDER BY total_revenue DESC
+                LIMIT 10
+            """
+            top_products_df = con.execute(top_products_query).df()
+
+            top_products = []
+            for _, row in top_products_df.iterrows():
+                top_products.append({
+                    "product_id": row['product_id'],
+                    "product_name": row['product_name'],
+                    "total_units": int(row['total_units']),
+                    "total_revenue": float(row['total_revenue']),
+                    "avg_price": float(row['avg_price'])
+                })
+
+            return SalesSummary(
+                total_records=int(summary_result[0]),
+                total_revenue=float(summary_result[1]),
+                unique_customers=int(summary_result[2]),
+                unique_receipts=int(summary_result[3]),
+                date_range_start=str(summary_result[4]),
+                date_range_end=str(summary_result[5]),
+                top_products=top_products
+            ).model_dump_json().encode()
+
         try:
-            with get_db_connection() as con:
-                # Basic statistics
-                summary_query = """
-                    SELECT 
-                        COUNT(*) as total_records,
-                        SUM(total_amount_per_product_sgd) as total_revenue,
-                        COUNT(DISTINCT customer_number) as unique_customers,
-                        COUNT(DISTINCT receipt_number) as unique_receipts,
-                        MIN(date) as date_start,
-                        MAX(date) as date_end
-                    FROM sales_data
-                """
-                summary_result = con.execute(summary_query).fetchone()
-                
-                # Top products
-                top_products_query = """
-                    SELECT 
-                        product_id,
-                        product_name,
-                        SUM(units_sold) as total_units,
-                        SUM(total_amount_per_product_sgd) as total_revenue,
-                        AVG(unit_price_sgd) as avg_price
-                    FROM sales_data
-                    GROUP BY product_id, product_name
-                    ORDER BY total_revenue DESC
-                    LIMIT 10
-                """
-                top_products_df = con.execute(top_products_query).df()
-                
-                top_products = []
-                for _, row in top_products_df.iterrows():
-                    top_products.append({
-                        "product_id": row['product_id'],
-                        "product_name": row['product_name'],
-                        "total_units": int(row['total_units']),
-                        "total_revenue": float(row['total_revenue']),
-                        "avg_price": float(row['avg_price'])
-                    })
-                
-                return SalesSummary(
-                    total_records=int(summary_result[0]),
-                    total_revenue=float(summary_result[1]),
-                    unique_customers=int(summary_result[2]),
-                    unique_receipts=int(summary_result[3]),
-                    date_range_start=str(summary_result[4]),
-                    date_range_end=str(summary_result[5]),
-                    top_products=top_products
-                )
-                
+            return Response(cached(('summary',), compute), media_type=JSON)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-    @app.get("/products/", response_model=List[ProductSales], tags=["Products"])
-    def get_product_performance():
-        """Get product performance metrics"""
+    @app.get("/products/", response_model=List[ProductSales], tags=["Products"], responses=BINARY_RESPONSES)
+    def get_product_performance(request: Request):
+        """Get product performance metrics (JSON, or Arrow IPC / Parquet by Accept header; cached per data version)"""
+        media_type = negotiate(request.headers.get('accept'))
+        def compute(con):
+            query = """
+                SELECT 
+                    product_id,
+                    product_name,
+                    SUM(units_sold) as total_units_sold,
+                    SUM(total_amount_per_product_sgd) as total_revenue,
+                    AVG(unit_price_sgd) as avg_price
+                FROM sales_data
+                GROUP BY product_id, product_name
+                ORDER BY total_revenue DESC
+            """
+            if media_type != JSON:
+                return encode_table(fetch_model_columns(con, ProductSales, query), media_type)
+            return json_array(fetch_json_rows(con, ProductSales, query))
+
         try:
-            with get_db_connection() as con:
-                query = """
-                    SELECT 
-                        product_id,
-                        product_name,
-                        SUM(units_sold) as total_units_sold,
-                        SUM(total_amount_per_product_sgd) as total_revenue,
-                        AVG(unit_price_sgd) as avg_price
-                    FROM sales_data
-                    GROUP BY product_id, product_name
-                    ORDER BY total_revenue DESC
-                """
-                df = con.execute(query).df()
-                
-                products = []
-                for _, row in df.iterrows():
-                    product = ProductSales(
-                        product_id=row['product_id'],
-                        product_name=row['product_name'],
-                        total_units_sold=int(row['total_units_sold']),
-                        total_revenue=float(row['total_revenue']),
-                        avg_price=float(row['avg_price'])
-                    )
-                    products.append(product)
-                
-                return products
-                
+            return Response(cached(('products', media_type), compute), media_type=media_type, headers=VARY_ACCEPT)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e), headers=VARY_ACCEPT)
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}", headers=VARY_ACCEPT)
 
     @app.get("/analytics/age-groups/", tags=["Analytics"])
     def get_age_group_analytics():
-        """Get sales analytics by age groups"""
+        """Get sales analytics by age groups (cached per data version)"""
+        def compute(con):
+            query = """
+                SELECT 
+                    CASE 
+                        WHEN age BETWEEN 18 AND 25 THEN '18-25'
+                        WHEN age BETWEEN 26 AND 35 THEN '26-35'
+                        WHEN age BETWEEN 36 AND 45 THEN '36-45'
+                        WHEN age BETWEEN 46 AND 55 THEN '46-55'
+                        WHEN age BETWEEN 56 AND 65 THEN '56-65'
+                        WHEN age > 65 THEN '65+'
+                        ELSE 'Unknown'
+                    END as age_group,
+                    COUNT(*) as transaction_count,
+                    SUM(total_amount_per_product_sgd) as total_revenue,
+                    AVG(total_amount_per_product_sgd) as avg_transaction_value,
+                    COUNT(DISTINCT customer_number) as unique_customers,
+                    AVG(age) as avg_age_in_group
+                FROM sales_data
+                WHERE age IS NOT NULL
+                GROUP BY age_group
+                ORDER BY 
+                    CASE age_group
+                        WHEN '18-25' THEN 1
+                        WHEN '26-35' THEN 2
+                        WHEN '36-45' THEN 3
+                        WHEN '46-55' THEN 4
+                        WHEN '56-65' THEN 5
+                        WHEN '65+' THEN 6
+                        ELSE 7
+                    END
+            """
+            df = con.execute(query).df()
+
+            age_groups = []
+            for _, row in df.iterrows():
+                age_groups.append({
+                    "age_group": row['age_group'],
+                    "transaction_count": int(row['transaction_count']),
+                    "total_revenue": float(row['total_revenue']),
+                    "avg_transaction_value": float(row['avg_transaction_value']),
+                    "unique_customers": int(row['unique_customers']),
+                    "avg_age_in_group": float(row['avg_age_in_group'])
+                })
+
+            return json.dumps({
+                "age_group_analytics": age_groups,
+                "total_customers_analyzed": int(df['unique_customers'].sum())
+            }).encode()
+
         try:
-            with get_db_connection() as con:
-                query = """
-                    SELECT 
-                        CASE 
-                            WHEN age BETWEEN 18 AND 25 THEN '18-25'
-                            WHEN age BETWEEN 26 AND 35 THEN '26-35'
-                            WHEN age BETWEEN 36 AND 45 THEN '36-45'
-                            WHEN age BETWEEN 46 AND 55 THEN '46-55'
-                            WHEN age BETWEEN 56 AND 65 THEN '56-65'
-                            WHEN age > 65 THEN '65+'
-                            ELSE 'Unknown'
-                        END as age_group,
-                        COUNT(*) as transaction_count,
-                        SUM(total_amount_per_product_sgd) as total_revenue,
-                        AVG(total_amount_per_product_sgd) as avg_transaction_value,
-                        COUNT(DISTINCT customer_number) as unique_customers,
-                        AVG(age) as avg_age_in_group
-                    FROM sales_data
-                    WHERE age IS NOT NULL
-                    GROUP BY age_group
-                    ORDER BY 
-                        CASE age_group
-                            WHEN '18-25' THEN 1
-                            WHEN '26-35' THEN 2
-                            WHEN '36-45' THEN 3
-                            WHEN '46-55' THEN 4
-                            WHEN '56-65' THEN 5
-                            WHEN '65+' THEN 6
-                            ELSE 7
-                        END
-                """
-                df = con.execute(query).df()
-                
-                age_groups = []
-                for _, row in df.iterrows():
-                    age_groups.append({
-                        "age_group": row['age_group'],
-                        "transaction_count": int(row['transaction_count']),
-                        "total_revenue": float(row['total_revenue']),
-                        "avg_transaction_value": float(row['avg_transaction_value']),
-                        "unique_customers": int(row['unique_customers']),
-                        "avg_age_in_group": float(row['avg_age_in_group'])
-                    })
-                
-                return {
-                    "age_group_analytics": age_groups,
-                    "total_customers_analyzed": int(df['unique_customers'].sum())
-                }
-                
+            return Response(cached(('age_groups',), compute), media_type=JSON)
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
@@ -426,7 +702,8 @@ def main():
             
         try:
             with get_db_connection() as con:
-                query = """
+                conditions, params = day_filter(target_date)
+                query = f"""
                     SELECT 
                         COUNT(*) as transaction_count,
                         SUM(total_amount_per_product_sgd) as daily_revenue,
@@ -434,9 +711,9 @@ def main():
                         COUNT(DISTINCT receipt_number) as unique_receipts,
                         AVG(receipt_total_sgd) as avg_receipt_value
                     FROM sales_data
-                    WHERE DATE(date) = ?
+                    WHERE {' AND '.join(conditions)}
                 """
-                result = con.execute(query, [target_date]).fetchone()
+                result = con.execute(query, params).fetchone()
                 
                 if result[0] == 0:
                     raise HTTPException(status_code=404, detail=f"No sales found for date {target_date}")
@@ -450,62 +727,84 @@ def main():
                     "avg_receipt_value": float(result[4]) if result[4] else 0
                 }
                 
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
     @app.get("/customers/{customer_number}", tags=["Customers"])
     def get_customer_history(customer_number: int = Path(..., description="Customer number", examples=[100001])):
-        """Get purchase history for a specific customer"""
+        """
+        Get purchase history for a specific customer
+
+        One row of the precomputed customer_summary when the database has
+        it; otherwise aggregated from the customer's sales.
+        """
+        use_summary = use_customer_summary()
         try:
             with get_db_connection() as con:
-                # Customer summary
-                summary_query = """
-                    SELECT 
-                        COUNT(*) as total_transactions,
-                        SUM(total_amount_per_product_sgd) as total_spent,
-                        COUNT(DISTINCT receipt_number) as total_receipts,
-                        MIN(date) as first_purchase,
-                        MAX(date) as last_purchase
-                    FROM sales_data
-                    WHERE customer_number = ?
-                """
-                summary_result = con.execute(summary_query, [customer_number]).fetchone()
-                
-                if summary_result[0] == 0:
-                    raise HTTPException(status_code=404, detail=f"Customer {customer_number} not found")
-                
-                # Recent transactions
-                recent_query = """
-                    SELECT product_name, units_sold, total_amount_per_product_sgd, date
-                    FROM sales_data
-                    WHERE customer_number = ?
-                    ORDER BY date DESC
-                    LIMIT 10
-                """
-                recent_df = con.execute(recent_query, [customer_number]).df()
-                
-                recent_purchases = []
-                for _, row in recent_df.iterrows():
-                    recent_purchases.append({
-                        "product_name": row['product_name'],
-                        "units_sold": int(row['units_sold']),
-                        "amount": float(row['total_amount_per_product_sgd']),
-                        "date": str(row['date'])
-                    })
-                
-                return {
-                    "customer_number": customer_number,
-                    "total_transactions": int(summary_result[0]),
-                    "total_spent": float(summary_result[1]) if summary_result[1] else 0,
-                    "total_receipts": int(summary_result[2]),
-                    "first_purchase": str(summary_result[3]),
-                    "last_purchase": str(summary_result[4]),
-                    "recent_purchases": recent_purchases
-                }
-                
+                if use_summary:
+                    summary_result = con.execute(f"""
+                        SELECT total_transactions, total_spent, total_receipts, first_purchase, last_purchase,
+                               recent_purchases
+                        FROM {CUSTOMER_SUMMARY_TABLE}
+                        WHERE customer_number = ?
+                    """, [customer_number]).fetchone()
+                    recent = summary_result[5] if summary_result else []
+                else:
+                    # Customer summary
+                    summary_query = """
+                        SELECT 
+                            COUNT(*) as total_transactions,
+                            SUM(total_amount_per_product_sgd) as total_spent,
+                            COUNT(DISTINCT receipt_number) as total_receipts,
+                            MIN(date) as first_purchase,
+                            MAX(date) as last_purchase
+                        FROM sales_data
+                        WHERE customer_number = ?
+                    """
+                    summary_result = con.execute(summary_query, [customer_number]).fetchone()
+                    if summary_result[0] == 0:
+                        summary_result = None
+
+                    # Recent transactions
+                    recent_query = """
+                        SELECT product_name, units_sold, total_amount_per_product_sgd as amount, date
+                        FROM sales_data
+                        WHERE customer_number = ?
+                        ORDER BY date DESC
+                        LIMIT 10
+                    """
+                    recent = [dict(zip(('product_name', 'units_sold', 'amount', 'date'), row))
+                              for row in con.execute(recent_query, [customer_number]).fetchall()]
+
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+        if summary_result is None:
+            raise HTTPException(status_code=404, detail=f"Customer {customer_number} not found")
+
+        recent_purchases = []
+        for item in recent:
+            recent_purchases.append({
+                "product_name": item['product_name'],
+                "units_sold": int(item['units_sold']),
+                "amount": float(item['amount']),
+                "date": str(item['date'])
+            })
+
+        return {
+            "customer_number": customer_number,
+            "total_transactions": int(summary_result[0]),
+            "total_spent": float(summary_result[1]) if summary_result[1] else 0,
+            "total_receipts": int(summary_result[2]),
+            "first_purchase": str(summary_result[3]),
+            "last_purchase": str(summary_result[4]),
+            "recent_purchases": recent_purchases
+        }
+
     @app.get("/receipts/{receipt_number}", tags=["Receipts"])
     def get_receipt_details(receipt_number: int = Path(..., description="Receipt number", examples=[200001])):
         """Get all items in a specific receipt"""
@@ -540,9 +839,22 @@ def main():
                     "items": items
                 }
                 
+        except PoolTimeout as e:
+            raise HTTPException(status_code=503, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+    @app.get("/health/pool", tags=["Health"])
+    def get_pool_stats():
+        """Database cursor pool size, free cursors and wait times, and the streams holding cursors"""
+        with streams_lock:
+            return dict(app.state.db_pool.stats(), stream_limit=stream_limit, streams_active=streams['active'])
+
+    @app.get("/health/cache", tags=["Health"])
+    def get_cache_stats():
+        """Aggregate cache size and hit/miss/eviction counts"""
+        return app.state.result_cache.stats()
+
     return app
 
 # Create app instance for uvicorn
@@ -0,0 +1,116 @@
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from profiler import stage_context
+from sales_generator import SALES_DATA_COLUMNS
+
+# DECIMAL columns travel as float64 and are cast by DuckDB on insert
+ARROW_TYPES = {
+    'BIGINT': pa.int64(),
+    'INTEGER': pa.int32(),
+    'SMALLINT': pa.int16(),
+    'USMALLINT': pa.uint16(),
+    'UTINYINT': pa.uint8(),
+    'DOUBLE': pa.float64(),
+    'TIMESTAMP': pa.timestamp('us'),
+}
+
+
+def arrow_type(sql_type):
+    """Map a sales_data SQL column type to the Arrow type used in the sink"""
+    if sql_type.startswith('DECIMAL'):
+        return pa.float64()
+    return ARROW_TYPES[sql_type]
+
+
+class ArrowSink:
+    """Buffers generated columns and inserts them into DuckDB as Arrow record batches.
+
+    Columns are copied into preallocated NumPy buffers of the final Arrow type;
+    every `capacity` rows the buffers are wrapped as a pyarrow.RecordBatch
+    (zero-copy) and handed to DuckDB's Arrow scan. Columns missing from a
+    write are stored as NULL. With a StageProfiler, buffer copies and
+    RecordBatch conversion are timed as 'arrow_build' and the DuckDB insert
+    as 'insert'.
+    """
+
+    def __init__(self, con, table_name='sales_data', columns=SALES_DATA_COLUMNS, capacity=50000, profiler=None):
+        self.con = con
+        self.profiler = profiler
+        self.table_name = table_name
+        self.capacity = capacity
+        self.schema = pa.schema([(name, arrow_type(sql_type)) for name, sql_type in columns])
+        self.buffers = {field.name: np.empty(capacity, dtype=field.type.to_pandas_dtype())
+                        for field in self.schema}
+        self.valid = {field.name: np.zeros(capacity, dtype=bool) for field in self.schema}
+        self.size = 0
+        self.timings = []
+
+    def write(self, columns):
+        """Append a dict of equally sized column arrays, flushing full buffers"""
+        n_rows = len(next(iter(columns.values())))
+        offset = 0
+        while offset < n_rows:
+            take = min(self.capacity - self.size, n_rows - offset)
+            target = slice(self.size, self.size + take)
+            source = slice(offset, offset + take)
+            with stage_context(self.profiler, 'arrow_build'):
+                for name, buffer in self.buffers.items():
+                    values = columns.get(name)
+                    if values is None:
+                        self.valid[name][target] = False
+                    else:
+                        buffer[target] = values[source]
+                        self.valid[name][target] = True
+            self.size += take
+            offset += take
+            if self.size == self.capacity:
+                self.flush()
+
+    def flush(self):
+        """Convert the buffered rows to a RecordBatch and insert them"""
+        if self.size == 0:
+            return
+        started = time.perf_counter()
+        with stage_context(self.profiler, 'arrow_build'):
+            arrays = []
+            for field in self.schema:
+                valid = self.valid[field.name][:self.size]
+                values = self.buffers[field.name][:self.size]
+                if valid.all():
+                    arrays.append(pa.array(values, type=field.type))
+                elif not valid.any():
+                    arrays.append(pa.nulls(self.size, type=field.type))
+                else:
+                    arrays.append(pa.array(values, type=field.type, mask=~valid))
+            batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        converted = time.perf_counter()
+        with stage_context(self.profiler, 'insert'):
+            self.con.from_arrow(batch).insert_into(self.table_name)
+        inserted = time.perf_counter()
+
+        self.timings.append({
+            'rows': self.size,
+            'convert_seconds': converted - started,
+            'insert_seconds': inserted - converted,
+        })
+        self.size = 0
+
+    def close(self):
+        """Flush any remaining rows"""
+        self.flush()
+
+    def report(self):
+        """Print per-batch conversion and insert timings"""
+        if not self.timings:
+            print("🏹 Arrow sink: no batches written")
+            return
+        rows = sum(t['rows'] for t in self.timings)
+        convert = np.array([t['convert_seconds'] for t in self.timings]) * 1000
+        insert = np.array([t['insert_seconds'] for t in self.timings]) * 1000
+        print(f"🏹 Arrow sink: {len(self.timings)} batches, {rows:,} rows")
+        print(f"   Convert ms/batch: avg {convert.mean():.2f}, min {convert.min():.2f}, max {convert.max():.2f}")
+        print(f"   Insert  ms/batch: avg {insert.mean():.2f}, min {insert.min():.2f}, max {insert.max():.2f}")
+        print(f"   Insert throughput: {rows / max(insert.sum() / 1000, 1e-9):,.0f} rows/sec")
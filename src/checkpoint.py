@@ -0,0 +1,108 @@
+import json
+
+CHECKPOINT_TABLE = 'generation_checkpoint'
+
+CHECKPOINT_SCHEMA_SQL = f"""
+CREATE TABLE {CHECKPOINT_TABLE} (
+    chunk_index INTEGER PRIMARY KEY,
+    chunk_start DATE,
+    chunk_end DATE,
+    customer_start INTEGER,
+    receipt_start INTEGER,
+    next_customer INTEGER,
+    next_receipt INTEGER,
+    batches_committed INTEGER,
+    rows_committed BIGINT,
+    rng_state VARCHAR,
+    completed BOOLEAN,
+    run_params VARCHAR,
+    updated_at TIMESTAMP DEFAULT current_timestamp
+)
+"""
+
+
+def create_checkpoints(con, plans, run_params):
+    """Create the checkpoint table with one pending row per planned chunk"""
+    con.execute(f"DROP TABLE IF EXISTS {CHECKPOINT_TABLE}")
+    con.execute(CHECKPOINT_SCHEMA_SQL)
+    params = json.dumps(run_params, sort_keys=True)
+    for plan in plans:
+        dates = plan['dates']
+        con.execute(f"""
+            INSERT INTO {CHECKPOINT_TABLE} (chunk_index, chunk_start, chunk_end, customer_start,
+                receipt_start, next_customer, next_receipt, batches_committed, rows_committed,
+                rng_state, completed, run_params)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, 0, NULL, false, ?)
+        """, [plan['index'], dates[0].date() if len(dates) else None, dates[-1].date() if len(dates) else None,
+              plan['customer_start'], plan['receipt_start'], plan['customer_start'], plan['receipt_start'], params])
+
+
+def load_run_params(con):
+    """Return the parameters of the checkpointed run, or None if there is none"""
+    tables = {row[0] for row in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+    if CHECKPOINT_TABLE not in tables:
+        return None
+    row = con.execute(f"SELECT run_params FROM {CHECKPOINT_TABLE} LIMIT 1").fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def seed_state(seed):
+    """JSON-friendly description of a batch SeedSequence"""
+    if seed is None:
+        return None
+    return {'entropy': seed.entropy, 'spawn_key': list(seed.spawn_key)}
+
+
+def record_batch(con, plan, batch, rows):
+    """Record a committed batch; call inside the transaction that inserted its rows.
+
+    rng_state holds the seed of the chunk's next batch, i.e. where generation
+    continues after this one.
+    """
+    following = None if batch['last_batch'] else plan['batches'][batch['batch'] + 1]['seed']
+    con.execute(f"""
+        UPDATE {CHECKPOINT_TABLE}
+        SET next_customer = ?, next_receipt = ?, batches_committed = ?,
+            rows_committed = rows_committed + ?, rng_state = ?, completed = ?,
+            updated_at = current_timestamp
+        WHERE chunk_index = ?
+    """, [batch['next_customer'], batch['next_receipt'], batch['batch'] + 1, rows,
+          json.dumps(seed_state(following)), batch['last_batch'], plan['index']])
+
+
+def resume_plans(con, plans):
+    """Drop finished chunks and trim partially written ones to their remaining batches.
+
+    The saved ID counters and next-batch seed are checked against the
+    regenerated plan, so a resume never continues a different run.
+    """
+    rows = con.execute(f"""
+        SELECT chunk_index, customer_start, receipt_start, next_customer, next_receipt,
+               batches_committed, rng_state, completed
+        FROM {CHECKPOINT_TABLE}
+        ORDER BY chunk_index
+    """).fetchall()
+    saved = {row[0]: row for row in rows}
+    pending = []
+    for plan in plans:
+        (_, customer_start, receipt_start, next_customer, next_receipt,
+         batches_committed, rng_state, completed) = saved[plan['index']]
+        if (customer_start, receipt_start) != (plan['customer_start'], plan['receipt_start']):
+            raise ValueError(f"Checkpoint for chunk {plan['index']} does not match the planned run")
+        if completed:
+            continue
+        if batches_committed:
+            following = plan['batches'][batches_committed]
+            if ((next_customer, next_receipt) != (following['customer_start'], following['receipt_start'])
+                    or json.loads(rng_state) != seed_state(following['seed'])):
+                raise ValueError(f"Checkpoint for chunk {plan['index']} does not match the planned run")
+            plan = dict(plan, batches=plan['batches'][batches_committed:])
+        pending.append(plan)
+    return pending
+
+
+def incomplete_chunks(con):
+    """Number of checkpointed chunks that have not been fully written"""
+    if load_run_params(con) is None:
+        return 0
+    return con.execute(f"SELECT COUNT(*) FROM {CHECKPOINT_TABLE} WHERE NOT completed").fetchone()[0]
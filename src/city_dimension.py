@@ -0,0 +1,66 @@
+import json
+import os
+from functools import cache
+
+import numpy as np
+import pyarrow as pa
+
+CITIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cities.json')
+
+
+class CityDimension:
+    """Array-backed city/country lookup built once from cities.json.
+
+    A city code is the row position in cities.json; `name`, `country` and
+    `country_id` are parallel arrays indexed by that code, so sampling and
+    decoding are plain NumPy indexing.
+    """
+
+    def __init__(self, cities):
+        self.code = np.arange(len(cities), dtype=np.int32)
+        self.name = np.array([city['name'] for city in cities])
+        self.country = np.array([city['country'] for city in cities])
+        self.country_id = np.array([int(city['country_id']) for city in cities], dtype=np.int32)
+        # Sorted country_id -> country name table for decoding fact columns
+        self._country_ids, first = np.unique(self.country_id, return_index=True)
+        self._country_names = self.country[first]
+
+    def __len__(self):
+        return len(self.code)
+
+    def sample(self, rng, size):
+        """Draw `size` city codes uniformly in one call"""
+        return rng.integers(0, len(self), size=size, dtype=np.int32)
+
+    def city_names(self, codes):
+        """Decode city codes to city names"""
+        return self.name[np.asarray(codes)]
+
+    def country_names(self, country_ids):
+        """Decode country_id values (as stored in sales_data) to country names"""
+        return self._country_names[np.searchsorted(self._country_ids, np.asarray(country_ids))]
+
+    def country_ids_named(self, country):
+        """The country_id values stored for a country name (a name can have more than one)"""
+        return np.unique(self.country_id[self.country == country])
+
+    def to_arrow(self):
+        """Return the dimension as an Arrow table (code, name, country, country_id)"""
+        return pa.table({
+            'code': self.code,
+            'name': self.name,
+            'country': self.country,
+            'country_id': self.country_id,
+        })
+
+    def register(self, con, view_name='city_dim'):
+        """Expose the dimension to a DuckDB connection so reports can JOIN it"""
+        con.register(view_name, self.to_arrow())
+        return view_name
+
+
+@cache
+def load_city_dimension(path=CITIES_PATH):
+    """Parse cities.json once per process and return the shared CityDimension"""
+    with open(path) as f:
+        return CityDimension(json.load(f))
@@ -0,0 +1,212 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import duckdb
+
+# Catalog name the database file is attached under
+ATTACHED_AS = 'sales_db'
+
+
+class PoolTimeout(Exception):
+    """No cursor became free within the pool's timeout"""
+
+
+def file_version(path):
+    """Data-version token of a database file: its identity, size and modification time"""
+    st = os.stat(path)
+    return f"{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+
+class _Generation:
+    """One read-only connection, its cursors and the file version it was opened at.
+
+    `number` counts the connections the pool has opened, so of two
+    generations the later one has the higher number. The file is ATTACHed to a fresh in-memory instance rather than opened
+    with duckdb.connect(path), which hands back the instance this process
+    already has for that path, still reading the replaced file.
+    """
+
+    def __init__(self, db_path, size, number=0):
+        self.number = number
+        self.version = file_version(db_path)
+        self.con = duckdb.connect()
+        quoted = db_path.replace("'", "''")
+        self.con.execute(f"ATTACH '{quoted}' AS {ATTACHED_AS} (READ_ONLY)")
+        self.cursors = queue.Queue(maxsize=size)
+        for _ in range(size):
+            cursor = self.con.cursor()
+            cursor.execute(f"USE {ATTACHED_AS}")
+            self.cursors.put(cursor)
+        self.borrowed = 0
+        self.retired = False
+
+    def close_idle(self):
+        """Close the cursors in the queue, and the connection once none is borrowed"""
+        while True:
+            try:
+                self.cursors.get_nowait().close()
+            except queue.Empty:
+                break
+        if self.borrowed == 0:
+            self.con.close()
+
+
+class CursorPool:
+    """A bounded pool of cursors on one read-only DuckDB connection.
+
+    `open()` connects once and creates `size` cursors up front; each cursor
+    shares the connection's database instance and catalog, so handing one
+    out costs a queue get instead of opening the file and loading the
+    catalog again. `cursor()` lends one for a `with` block, waiting up to
+    `timeout` seconds when all are busy, so at most `size` queries run at
+    once whatever the number of request threads.
+
+    Every wait for a cursor is timed: `stats()` reports the count, total,
+    max and median of the most recent `window` waits.
+
+    `version` is the file_version() the connection was opened at. A
+    rebuild replaces the database file, which the open connection does not
+    see, so `refresh()` compares the file on disk with `version` and, when
+    it changed, opens a new connection and retires the old one; cursors
+    already lent out finish on the old data and are closed as they come
+    back. While the generator still holds the new file the old connection
+    stays in use. File versions have no order, so `version_key` pairs the
+    version with the connection's number: keys of later connections sort
+    after earlier ones. `versioned_cursor()` lends a cursor together with
+    the key of the connection it reads.
+    """
+
+    def __init__(self, db_path, size=8, timeout=30.0, window=1000):
+        if size < 1:
+            raise ValueError("A cursor pool needs at least one cursor")
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.generation = None
+        self.lock = threading.Lock()
+        self.waits = deque(maxlen=window)
+        self.acquired = 0
+        self.timeouts = 0
+        self.reopened = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def version(self):
+        """Data-version token of the database the cursors read"""
+        return self.generation.version
+
+    @property
+    def version_key(self):
+        """(connection number, data version) of the current connection; later connections sort higher"""
+        return self.generation.number, self.generation.version
+
+    def open(self):
+        """Connect and create the cursors"""
+        self.generation = _Generation(self.db_path, self.size)
+        return self
+
+    def refresh(self):
+        """Reopen on the current database file if it was replaced; returns the data version"""
+        generation = self.generation
+        try:
+            if file_version(self.db_path) == generation.version:
+                return generation.version
+            replacement = _Generation(self.db_path, self.size, generation.number + 1)
+        except (OSError, duckdb.Error):
+            # Missing or still locked by the generator: keep serving the old data
+            return generation.version
+        with self.lock:
+            if self.generation is not generation:
+                replacement.close_idle()
+                return self.generation.version
+            self.generation = replacement
+            self.reopened += 1
+            generation.retired = True
+            generation.close_idle()
+        return replacement.version
+
+    def close(self):
+        """Close the cursors that are back in the pool, then the connection"""
+        if self.generation is not None:
+            with self.lock:
+                self.generation.retired = True
+                self.generation.close_idle()
+            self.generation = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def cursor(self):
+        """Borrow a cursor for the duration of a `with` block"""
+        with self._borrow() as (_, cursor):
+            yield cursor
+
+    @contextmanager
+    def versioned_cursor(self):
+        """Borrow a cursor for a `with` block as (version_key of its connection, cursor)"""
+        with self._borrow() as (generation, cursor):
+            yield (generation.number, generation.version), cursor
+
+    @contextmanager
+    def _borrow(self):
+        """Borrow a cursor as (its generation, cursor)"""
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        while True:
+            # Wait in short slices so a reopen moves waiters over to the new connection
+            generation = self.generation
+            try:
+                cursor = generation.cursors.get(timeout=max(0.0, min(0.1, deadline - time.perf_counter())))
+            except queue.Empty:
+                if time.perf_counter() < deadline:
+                    continue
+                with self.lock:
+                    self.timeouts += 1
+                raise PoolTimeout(f"No database cursor free after {self.timeout:g}s") from None
+            with self.lock:
+                if not generation.retired:
+                    generation.borrowed += 1
+                    waited = time.perf_counter() - started
+                    self.acquired += 1
+                    self.wait_seconds += waited
+                    self.max_wait_seconds = max(self.max_wait_seconds, waited)
+                    self.waits.append(waited)
+                    break
+            # Taken just as its connection was retired
+            cursor.close()
+        try:
+            yield generation, cursor
+        finally:
+            with self.lock:
+                generation.borrowed -= 1
+                if generation.retired:
+                    cursor.close()
+                    if generation.borrowed == 0:
+                        generation.con.close()
+                else:
+                    generation.cursors.put(cursor)
+
+    def stats(self):
+        """Pool size, free cursors and cursor wait times in milliseconds"""
+        with self.lock:
+            recent = sorted(self.waits)
+            return {
+                'size': self.size,
+                'available': self.generation.cursors.qsize(),
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'reopened': self.reopened,
+                'version': self.generation.version,
+                'total_wait_ms': self.wait_seconds * 1000,
+                'max_wait_ms': self.max_wait_seconds * 1000,
+                'median_wait_ms': recent[len(recent) // 2] * 1000 if recent else 0.0,
+            }
@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+CUSTOMER_TABLE = 'dim_customer'
+DAYS_PER_YEAR = 365.25
+
+
+def _days(dates):
+    """Dates as datetime64[D]"""
+    return np.asarray(pd.DatetimeIndex(dates).values, dtype='datetime64[D]')
+
+
+class CustomerPool:
+    """Repeat customers held as parallel NumPy arrays.
+
+    Customer `first_number + i` is row i of `age` (at signup), `gender`,
+    `city` (a CityDimension code), `signup_day` and `popularity`: 18 bytes
+    per customer, plus 8 for the float64 running sum of popularity that
+    sampling searches, 26 in all. Customers sign up in number order as store traffic
+    accumulates and stay active for `active_days`, so on any day the
+    customers who can shop form one contiguous range of rows. A receipt
+    picks its customer within that range in proportion to popularity,
+    found by binary search in the running sum of popularity; the Pareto
+    popularity weights give a Zipf-like spread from one-off shoppers to
+    regulars.
+    """
+
+    def __init__(self, first_number, age, gender, city, signup_day, popularity, active_days):
+        self.first_number = int(first_number)
+        self.age = np.asarray(age, dtype=np.int8)
+        self.gender = np.asarray(gender, dtype=np.int8)
+        self.city = np.asarray(city, dtype=np.int32)
+        self.signup_day = np.asarray(signup_day, dtype='datetime64[D]')
+        self.popularity = np.asarray(popularity, dtype=np.float32)
+        self.active_days = int(active_days)
+        self._cumulative = np.concatenate([[0.0], np.cumsum(self.popularity, dtype=np.float64)])
+
+    def __len__(self):
+        return len(self.age)
+
+    @property
+    def next_number(self):
+        """Customer number the next signup gets"""
+        return self.first_number + len(self)
+
+    def numbers(self, positions):
+        """Customer numbers of pool rows"""
+        return self.first_number + np.asarray(positions)
+
+    def rows_from(self, start):
+        """The pool without its first `start` rows"""
+        return CustomerPool(self.first_number + start, self.age[start:], self.gender[start:], self.city[start:],
+                            self.signup_day[start:], self.popularity[start:], self.active_days)
+
+    def active_range(self, days):
+        """[low, high) pool rows of the customers active on each day"""
+        days = np.asarray(days, dtype='datetime64[D]')
+        high = np.searchsorted(self.signup_day, days, side='right')
+        low = np.searchsorted(self.signup_day, days - self.active_days, side='right')
+        # Never leave a day without customers: fall back to the latest signups
+        return np.minimum(low, np.maximum(high - 1, 0)), np.maximum(high, 1)
+
+    def sample(self, rng, days):
+        """Draw one active customer (pool row) per entry of `days`, weighted by popularity"""
+        low, high = self.active_range(days)
+        target = self._cumulative[low] + rng.random(len(low)) * (self._cumulative[high] - self._cumulative[low])
+        positions = np.searchsorted(self._cumulative, target, side='right') - 1
+        return np.clip(positions, low, high - 1)
+
+    def age_on(self, positions, days):
+        """Age of customers on the given days: age at signup plus the years since"""
+        elapsed = (np.asarray(days, dtype='datetime64[D]') - self.signup_day[positions]).astype(np.int64)
+        return self.age[positions] + (elapsed / DAYS_PER_YEAR).astype(np.int64)
+
+    def extend(self, rng, dates, receipt_counts, profile, cities, receipts_per_customer=None):
+        """Return a pool with the customers signing up over `dates` added.
+
+        One customer signs up for every `receipts_per_customer` receipts
+        (default: the profile's), on the day the running receipt count
+        reaches them, so signups follow the store's volume.
+        """
+        receipts_per_customer = receipts_per_customer or profile.receipts_per_customer
+        receipt_counts = np.asarray(receipt_counts, dtype=np.int64)
+        total = int(receipt_counts.sum())
+        n_new = int(np.ceil(total / receipts_per_customer))
+        signup_index = np.searchsorted(np.cumsum(receipt_counts),
+                                       np.arange(n_new) * receipts_per_customer, side='right')
+        age_start = profile.ages.sample(rng, n_new)
+        age = rng.integers(age_start, np.minimum(age_start + profile.age_width, profile.max_age))
+        gender = rng.integers(0, 2, size=n_new)
+        city = cities.sample(rng, n_new)
+        # Pareto(1 / exponent) weights: ranked, they fall off like rank ** -exponent
+        popularity = (1.0 - rng.random(n_new)) ** -profile.popularity_exponent
+        return CustomerPool(
+            self.first_number,
+            np.concatenate([self.age, age]),
+            np.concatenate([self.gender, gender]),
+            np.concatenate([self.city, city]),
+            np.concatenate([self.signup_day, _days(dates)[signup_index]]),
+            np.concatenate([self.popularity, popularity]),
+            self.active_days,
+        )
+
+    @classmethod
+    def empty(cls, first_number, profile):
+        """A pool with no customers yet"""
+        return cls(first_number, [], [], [], [], [], round(profile.active_years * DAYS_PER_YEAR))
+
+    def to_arrow(self, cities, start=0):
+        """Customers from pool row `start` on as an Arrow table (the dim_customer rows)"""
+        rows = slice(start, None)
+        return pa.table({
+            'customer_number': pa.array(self.numbers(np.arange(start, len(self))), pa.int32()),
+            'age': pa.array(self.age[rows], pa.uint8()),
+            'gender': pa.array(self.gender[rows], pa.uint8()),
+            'city_key': pa.array(self.city[rows], pa.uint16()),
+            'country_id': pa.array(cities.country_id[self.city[rows]], pa.int32()),
+            'signup_date': pa.array(self.signup_day[rows]),
+            'popularity': pa.array(self.popularity[rows]),
+        })
+
+    def create_table(self, con, cities, table_name=CUSTOMER_TABLE):
+        """Store the pool in DuckDB, replacing any previous customer table"""
+        con.execute(f"DROP TABLE IF EXISTS {table_name}")
+        con.from_arrow(self.to_arrow(cities)).order('customer_number').create(table_name)
+        return table_name
+
+    def save(self, path):
+        """Write the pool to an .npz file for load()"""
+        np.savez(path, first_number=self.first_number, active_days=self.active_days, age=self.age,
+                 gender=self.gender, city=self.city, signup_day=self.signup_day, popularity=self.popularity)
+
+    @classmethod
+    def load(cls, path):
+        """Read a pool written by save()"""
+        with np.load(path) as pool:
+            return cls(pool['first_number'], pool['age'], pool['gender'], pool['city'], pool['signup_day'],
+                       pool['popularity'], pool['active_days'])
+
+    @classmethod
+    def from_table(cls, con, profile, active_on, table_name=CUSTOMER_TABLE):
+        """Load the stored customers who can still shop on `active_on` and after.
+
+        That is every customer from the first still active on `active_on`
+        (or else the latest signup, as in active_range) on. Returns None if
+        the database has no customer table or it is empty.
+        """
+        exists = con.execute("SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?",
+                             [table_name]).fetchone()[0]
+        if not exists:
+            return None
+        active_days = round(profile.active_years * DAYS_PER_YEAR)
+        cutoff = (pd.Timestamp(active_on) - pd.Timedelta(days=active_days)).date()
+        customers = con.execute(f"""
+            SELECT customer_number, age, gender, city_key, signup_date, popularity
+            FROM {table_name}
+            WHERE customer_number >= (
+                SELECT COALESCE(MIN(customer_number) FILTER (WHERE signup_date > ?), MAX(customer_number))
+                FROM {table_name}
+            )
+            ORDER BY customer_number
+        """, [cutoff]).fetchnumpy()
+        if len(customers['customer_number']) == 0:
+            return None
+        return cls(customers['customer_number'][0], customers['age'], customers['gender'],
+                   customers['city_key'], customers['signup_date'], customers['popularity'], active_days)
+
+
+def last_customer_number(con, table_name=CUSTOMER_TABLE):
+    """Highest customer number stored in the customer table, or None if it has none"""
+    return con.execute(f"SELECT MAX(customer_number) FROM {table_name}").fetchone()[0]
+
+
+class CustomerSignups:
+    """Signs customers up one chunk plan at a time, keeping only those who can still shop.
+
+    `pool_for(plan)` adds the customers signing up over the plan's days and
+    returns the pool rows a batch of the plan can draw from: everyone from
+    the first customer active on the plan's first day on. Customers whose
+    active years ended before that are dropped, so the pool held (and sent
+    to workers) spans `active_years` of signups plus one chunk, however
+    long the run. A scale factor multiplies the receipts per customer along
+    with the store's volume: the same customers shop more often, so the
+    pool (about 1.5 MB at the default profile) does not grow with the scale
+    and memory stays bounded by the batch size. Each plan signs up from its
+    own SeedSequence child, after the chunk seeds, so the customers are
+    fixed by the seed and chunk count and a resumed run signs up the same
+    ones.
+
+    The new customers of a plan wait in `signups` until write_signups()
+    stores them; customers numbered up to `stored_through` (the last one
+    already in the table) are not stored again. Plans must be signed up in
+    order, from the first of the run.
+    """
+
+    def __init__(self, chunks, cities, profile, seed, first_number, pool=None, stored_through=None, scale_factor=1):
+        self.cities = cities
+        self.profile = profile
+        self.receipts_per_customer = max(profile.receipts_per_customer * scale_factor, 1)
+        self.pool = pool if pool is not None else CustomerPool.empty(first_number, profile)
+        self.seeds = np.random.SeedSequence(seed, spawn_key=(chunks,)).spawn(chunks)
+        self.stored_through = self.pool.next_number - 1 if stored_through is None else int(stored_through)
+        self.signups = {}
+
+    def pool_for(self, plan):
+        """Sign up the plan's customers; return the pool its batches sample from"""
+        rng = np.random.default_rng(self.seeds[plan['index']])
+        pool = self.pool.extend(rng, plan['dates'], plan['receipt_counts'], self.profile, self.cities,
+                                self.receipts_per_customer)
+        new = max(len(self.pool), self.stored_through + 1 - pool.first_number)
+        if new < len(pool):
+            self.signups[plan['index']] = pool.to_arrow(self.cities, new)
+            self.stored_through = pool.next_number - 1
+        if len(plan['dates']):
+            low, _ = pool.active_range(_days(plan['dates'][:1]))
+            pool = pool.rows_from(int(low[0]))
+        self.pool = pool
+        return pool
+
+    def skip(self, plans):
+        """Sign up already generated plans, only to move the pool past them"""
+        for plan in plans:
+            self.pool_for(plan)
+            self.signups.pop(plan['index'], None)
+
+    def write_signups(self, con, plan, table_name=CUSTOMER_TABLE):
+        """Insert the plan's new customers into the customer table, once"""
+        signups = self.signups.pop(plan['index'], None)
+        if signups is not None:
+            con.from_arrow(signups).insert_into(table_name)
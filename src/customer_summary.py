@@ -0,0 +1,119 @@
+CUSTOMER_SUMMARY_TABLE = 'customer_summary'
+# Most recent items kept per customer, as /customers/{customer_number} returns them
+RECENT_ITEMS = 10
+
+# Totals, first/last purchase, the RECENT_ITEMS latest items (newest first)
+# and per-(age, country) totals of every customer in the sales_data rows
+# matching `where`. The `ages` entries are what /customers/ and
+# /customers/summary/ list, ordered like them.
+_SUMMARY_SQL = """
+WITH items AS (
+    SELECT customer_number, age, country, receipt_number, date, product_name, units_sold,
+           CAST(total_amount_per_product_sgd AS DOUBLE) AS amount
+    FROM sales_data{where}
+), totals AS (
+    SELECT customer_number,
+           COUNT(*) AS total_transactions,
+           SUM(amount) AS total_spent,
+           COUNT(DISTINCT receipt_number) AS total_receipts,
+           MIN(date) AS first_purchase,
+           MAX(date) AS last_purchase,
+           max_by({{'product_name': product_name, 'units_sold': units_sold, 'amount': amount, 'date': date}},
+                  date, {recent_items}) AS recent_purchases
+    FROM items
+    GROUP BY customer_number
+), ages AS (
+    SELECT customer_number,
+           list({{'age': age, 'country': country, 'total_sales': total_sales, 'total_amount': total_amount}}
+                ORDER BY age, country) AS ages
+    FROM (
+        SELECT customer_number, age, country, COUNT(*) AS total_sales, SUM(amount) AS total_amount
+        FROM items
+        GROUP BY customer_number, age, country
+    )
+    GROUP BY customer_number
+)
+SELECT * FROM totals JOIN ages USING (customer_number)
+"""
+
+
+def summary_sql(where='', recent_items=RECENT_ITEMS):
+    """SELECT building customer_summary rows from the sales_data rows matching `where`"""
+    return _SUMMARY_SQL.format(where=f" WHERE {where}" if where else '', recent_items=int(recent_items))
+
+
+def has_customer_summary(con):
+    """Whether the database has a customer_summary table"""
+    return con.execute("""
+        SELECT COUNT(*) FROM information_schema.tables
+        WHERE table_catalog = current_database() AND table_name = ?
+    """, [CUSTOMER_SUMMARY_TABLE]).fetchone()[0] > 0
+
+
+def create_customer_summary(con, recent_items=RECENT_ITEMS):
+    """(Re)build customer_summary from all of sales_data; returns its customer count.
+
+    Rows are stored in customer_number order, so a lookup or a page of
+    the customer listings reads one row group, found by its zone map.
+    """
+    con.execute(f"CREATE OR REPLACE TABLE {CUSTOMER_SUMMARY_TABLE} AS "
+                f"{summary_sql(recent_items=recent_items)} ORDER BY customer_number")
+    return con.execute(f"SELECT COUNT(*) FROM {CUSTOMER_SUMMARY_TABLE}").fetchone()[0]
+
+
+def refresh_customer_summary(con, since, recent_items=RECENT_ITEMS):
+    """Fold the sales from `since` on into customer_summary; returns the customers updated.
+
+    Only the new rows are aggregated. Customers they touch get their
+    totals added to, their per-(age, country) entries merged and their
+    recent items topped up; everyone else's row is left as it is. The new
+    sales must all be later than the summarized ones (as an append's
+    are), which is what keeps the merged recent items newest first.
+    A database from before customer_summary gets it built in full.
+    """
+    if not has_customer_summary(con):
+        return create_customer_summary(con, recent_items)
+    con.execute(f"CREATE OR REPLACE TEMP TABLE customer_summary_delta AS {summary_sql('date >= ?', recent_items)}",
+                [since])
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE customer_summary_merged AS
+        WITH entries AS (
+            SELECT customer_number, UNNEST(ages, recursive := true)
+            FROM {CUSTOMER_SUMMARY_TABLE}
+            WHERE customer_number IN (SELECT customer_number FROM customer_summary_delta)
+            UNION ALL
+            SELECT customer_number, UNNEST(ages, recursive := true) FROM customer_summary_delta
+        ), ages AS (
+            SELECT customer_number,
+                   list({{'age': age, 'country': country, 'total_sales': total_sales,
+                          'total_amount': total_amount}} ORDER BY age, country) AS ages
+            FROM (
+                SELECT customer_number, age, country,
+                       CAST(SUM(total_sales) AS BIGINT) AS total_sales, SUM(total_amount) AS total_amount
+                FROM entries
+                GROUP BY customer_number, age, country
+            )
+            GROUP BY customer_number
+        )
+        SELECT d.customer_number,
+               COALESCE(s.total_transactions, 0) + d.total_transactions AS total_transactions,
+               COALESCE(s.total_spent, 0) + d.total_spent AS total_spent,
+               COALESCE(s.total_receipts, 0) + d.total_receipts AS total_receipts,
+               COALESCE(s.first_purchase, d.first_purchase) AS first_purchase,
+               d.last_purchase,
+               list_concat(d.recent_purchases, COALESCE(s.recent_purchases, []))[1:{int(recent_items)}]
+                   AS recent_purchases,
+               ages.ages
+        FROM customer_summary_delta AS d
+        LEFT JOIN {CUSTOMER_SUMMARY_TABLE} AS s USING (customer_number)
+        JOIN ages USING (customer_number)
+    """)
+    con.execute(f"""
+        DELETE FROM {CUSTOMER_SUMMARY_TABLE}
+        WHERE customer_number IN (SELECT customer_number FROM customer_summary_merged)
+    """)
+    con.execute(f"INSERT INTO {CUSTOMER_SUMMARY_TABLE} SELECT * FROM customer_summary_merged ORDER BY customer_number")
+    updated = con.execute("SELECT COUNT(*) FROM customer_summary_merged").fetchone()[0]
+    con.execute("DROP TABLE customer_summary_delta")
+    con.execute("DROP TABLE customer_summary_merged")
+    return updated
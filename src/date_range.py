@@ -0,0 +1,43 @@
+from datetime import date, datetime, timedelta
+
+
+def _as_datetime(value):
+    """Midnight of a 'YYYY-MM-DD' string, date or datetime"""
+    if isinstance(value, date):  # also covers datetime
+        return datetime(value.year, value.month, value.day)
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def date_range_filter(start_date=None, end_date=None, column='date'):
+    """Build WHERE conditions selecting whole days on a TIMESTAMP column.
+
+    Both bounds are inclusive days ('YYYY-MM-DD', date or datetime) and either
+    may be None. The result is a half-open range on the raw column,
+    `column >= start AND column < end + 1 day`, with the bounds bound as
+    TIMESTAMP parameters. Comparing the bare column (no DATE() or string
+    cast around it) lets DuckDB check the bounds against each row group's
+    min/max zone map and skip row groups outside the range; because the
+    generator writes the days in order (timestamps only step back within a
+    day split across batches), a date-bounded query only reads the few row
+    groups covering those days.
+
+    Returns (conditions, params): a list of SQL conditions to AND together
+    and the parameters for their placeholders, in order.
+
+        conditions, params = date_range_filter('2024-01-01', '2024-01-31')
+        con.execute(f"SELECT COUNT(*) FROM sales_data WHERE {' AND '.join(conditions)}", params)
+    """
+    conditions = []
+    params = []
+    if start_date is not None:
+        conditions.append(f"{column} >= ?")
+        params.append(_as_datetime(start_date))
+    if end_date is not None:
+        conditions.append(f"{column} < ?")
+        params.append(_as_datetime(end_date) + timedelta(days=1))
+    return conditions, params
+
+
+def day_filter(target_date, column='date'):
+    """WHERE conditions and parameters selecting a single day; see date_range_filter"""
+    return date_range_filter(target_date, target_date, column)
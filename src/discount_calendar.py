@@ -0,0 +1,129 @@
+from functools import cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DAY_NAMES = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
+MONTH_NAMES = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+               'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+
+# Discount period keys; 0 means no discount that day
+DISCOUNT_PERIODS = ['BLACKFRIDAY', 'CYBERMONDAY', 'NEWYEAR', 'CHRISTMAS']
+DISCOUNT_PERCENTAGE = 50
+# Receipts per day are raised by half during discount periods
+DISCOUNT_RECEIPT_MULTIPLIER = 1.5
+DISCOUNT_TRANSACTION = 'Product Sale'
+
+CALENDAR_START = '1900-01-01'
+CALENDAR_END = '2100-12-31'
+
+
+def black_friday(years):
+    """Black Friday (4th Friday in November) for an array of years"""
+    year_start = (np.asarray(years, dtype=np.int64) - 1970).astype('datetime64[Y]')
+    nov_1 = (year_start.astype('datetime64[M]') + 10).astype('datetime64[D]')
+    # datetime64 day 0 (1970-01-01) was a Thursday
+    weekday = (nov_1.astype(np.int64) + 3) % 7
+    return nov_1 + (4 - weekday) % 7 + 21
+
+
+def discount_period_keys(dates):
+    """Discount period key (1-based index into DISCOUNT_PERIODS, 0 = none) for each day.
+
+    Matches the per-date loop in main_backup.py, which only consults the
+    current year's windows: NEWYEAR (Dec 26 of the previous year to Jan 2)
+    therefore covers Jan 1-2, CHRISTMAS covers Dec 1-26, and Dec 27-31 carry
+    no discount. Where windows overlap the earlier period in DISCOUNT_PERIODS
+    wins, so a Cyber Monday on Dec 1 stays CYBERMONDAY.
+    """
+    days = np.asarray(pd.DatetimeIndex(dates).values, dtype='datetime64[D]')
+    dates = pd.DatetimeIndex(days)
+    month = np.asarray(dates.month)
+    day = np.asarray(dates.day)
+    friday = black_friday(np.asarray(dates.year))
+
+    keys = np.zeros(len(days), dtype=np.int8)
+    # Assign in reverse priority so earlier periods overwrite later ones
+    keys[(month == 12) & (day <= 26)] = DISCOUNT_PERIODS.index('CHRISTMAS') + 1
+    keys[(month == 1) & (day <= 2)] = DISCOUNT_PERIODS.index('NEWYEAR') + 1
+    keys[days == friday + 3] = DISCOUNT_PERIODS.index('CYBERMONDAY') + 1
+    keys[days == friday] = DISCOUNT_PERIODS.index('BLACKFRIDAY') + 1
+    return keys
+
+
+def calendar_frame(dates):
+    """One row per day with the calendar and discount attributes the reports group by"""
+    dates = pd.DatetimeIndex(dates)
+    day_of_week = np.asarray(dates.dayofweek)
+    month = np.asarray(dates.month)
+    discount_key = discount_period_keys(dates)
+    discount_period = np.array([None] + DISCOUNT_PERIODS, dtype=object)[discount_key]
+    return pd.DataFrame({
+        'calendar_date': dates.date,
+        'year': np.asarray(dates.year, dtype=np.int16),
+        'month': month.astype(np.int8),
+        'day_of_week': day_of_week.astype(np.int8),
+        'day_of_week_text': np.array(DAY_NAMES)[day_of_week],
+        'month_text': np.array(MONTH_NAMES)[month - 1],
+        'day_of_week_sin': np.sin(2 * np.pi * day_of_week / 7),
+        'day_of_week_cos': np.cos(2 * np.pi * day_of_week / 7),
+        'month_sin': np.sin(2 * np.pi * month / 12),
+        'month_cos': np.cos(2 * np.pi * month / 12),
+        'discount_period_key': discount_key,
+        'discount_period': discount_period,
+        'discount_percentage': np.where(discount_key > 0, DISCOUNT_PERCENTAGE, 0).astype(np.int8),
+    })
+
+
+class DiscountCalendar:
+    """Array-backed discount calendar for every day from CALENDAR_START to CALENDAR_END.
+
+    Days are addressed by their offset from CALENDAR_START, so looking up a
+    batch of dates is one subtraction and one fancy index.
+    """
+
+    def __init__(self, start=CALENDAR_START, end=CALENDAR_END):
+        self.dates = pd.date_range(start=start, end=end, freq='D')
+        self.origin = np.datetime64(self.dates[0].date(), 'D')
+        self.discount_key = discount_period_keys(self.dates)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def offsets(self, dates):
+        """Day offsets of `dates` into the calendar"""
+        offsets = np.asarray(pd.DatetimeIndex(dates).values, dtype='datetime64[D]') - self.origin
+        offsets = offsets.astype(np.int64)
+        if len(offsets) and (offsets.min() < 0 or offsets.max() >= len(self)):
+            raise ValueError(f"Dates outside the discount calendar ({self.dates[0].date()} "
+                             f"to {self.dates[-1].date()})")
+        return offsets
+
+    def period_keys(self, dates):
+        """Discount period key for each date (0 = no discount)"""
+        return self.discount_key[self.offsets(dates)]
+
+    def receipt_multiplier(self, dates):
+        """Daily receipt multiplier: DISCOUNT_RECEIPT_MULTIPLIER on discount days, else 1"""
+        return np.where(self.period_keys(dates) > 0, DISCOUNT_RECEIPT_MULTIPLIER, 1.0)
+
+    def to_frame(self):
+        """Return the full calendar as a DataFrame (the dim_calendar table)"""
+        return calendar_frame(self.dates)
+
+    def to_arrow(self):
+        """Return the full calendar as an Arrow table"""
+        return pa.Table.from_pandas(self.to_frame(), preserve_index=False)
+
+    def create_table(self, con, table_name='dim_calendar'):
+        """Store the calendar in DuckDB so reports can JOIN it on calendar_date"""
+        con.execute(f"DROP TABLE IF EXISTS {table_name}")
+        con.from_arrow(self.to_arrow()).order('calendar_date').create(table_name)
+        return table_name
+
+
+@cache
+def load_discount_calendar():
+    """Build the 1900-2100 discount calendar once per process"""
+    return DiscountCalendar()
@@ -98,7 +98,7 @@ def discount_effectiveness_report():
                 COUNT(DISTINCT customer_number) as discount_customers
             FROM sales_data 
             WHERE transaction_desc = 'Product Sale' AND discount_applied = true
-            AND EXTRACT(year FROM date) >= 2020
+            AND date >= TIMESTAMP '2020-01-01'
             GROUP BY EXTRACT(year FROM date)
             ORDER BY year
         """).df()
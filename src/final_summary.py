@@ -639,7 +639,7 @@ with duckdb.connect('sales_timeseries.db', read_only=True) as con:
             SUM(total_amount_per_product_sgd) as total_sales
         FROM sales_data 
         WHERE transaction_desc = 'Product Sale' 
-        AND EXTRACT(year FROM date) >= 2020
+        AND date >= TIMESTAMP '2020-01-01'
         GROUP BY country, product_name
         ORDER BY total_sales DESC
     """).df()
@@ -0,0 +1,136 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import duckdb
+
+from date_range import day_filter
+
+# (index name, column) per layout; the star layout indexes sales_fact
+SALES_INDEXES = {
+    'flat': ('sales_data', [
+        ('idx_date', 'date'),
+        ('idx_customer', 'customer_number'),
+        ('idx_receipt', 'receipt_number'),
+        ('idx_product', 'product_id'),
+    ]),
+    'star': ('sales_fact', [
+        ('idx_date', 'sold_at'),
+        ('idx_customer', 'customer_number'),
+        ('idx_receipt', 'receipt_number'),
+        ('idx_product', 'product_key'),
+    ]),
+}
+
+# Point lookups the API serves, run against sales_data in either layout.
+# product_id has ~20 distinct values, so it has no point lookup: a
+# product filter reads a twentieth of the table whether indexed or not.
+LOOKUPS = {
+    'customer': lambda key: (["customer_number = ?"], [key['customer_number']]),
+    'receipt': lambda key: (["receipt_number = ?"], [key['receipt_number']]),
+    'day': lambda key: day_filter(key['date']),
+}
+
+
+def create_indexes(con, layout):
+    """Create the four ART indexes for a layout; returns build seconds per index"""
+    table, indexes = SALES_INDEXES[layout]
+    timings = {}
+    for name, column in indexes:
+        started = time.perf_counter()
+        con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})")
+        timings[name] = time.perf_counter() - started
+    return timings
+
+
+def storage_size(con, db_path):
+    """Checkpoint, then return (bytes in used blocks, database file bytes).
+
+    DuckDB never shrinks its file when blocks are freed, so the used-block
+    count is what tells two builds of the same data apart.
+    """
+    con.execute("CHECKPOINT")
+    block_size, used_blocks = con.execute(
+        "SELECT block_size, used_blocks FROM pragma_database_size() WHERE database_name = current_database()"
+    ).fetchone()
+    return block_size * used_blocks, os.path.getsize(db_path)
+
+
+def sample_lookup_keys(con, samples=25, seed=142):
+    """Customer, receipt and day of `samples` reproducibly sampled sales rows"""
+    rows = con.execute(f"""
+        SELECT customer_number, receipt_number, date
+        FROM sales_data USING SAMPLE reservoir({int(samples)} ROWS) REPEATABLE ({int(seed)})
+    """).fetchall()
+    return [dict(zip(('customer_number', 'receipt_number', 'date'), row)) for row in rows]
+
+
+def lookup_latency(con, keys):
+    """Median milliseconds per lookup kind, fetching every matching row"""
+    latency = {}
+    for kind, build in LOOKUPS.items():
+        timings = []
+        for key in keys:
+            conditions, params = build(key)
+            started = time.perf_counter()
+            con.execute(f"SELECT * FROM sales_data WHERE {' AND '.join(conditions)}", params).fetchall()
+            timings.append(time.perf_counter() - started)
+        latency[kind] = 1000 * statistics.median(timings) if timings else 0.0
+    return latency
+
+
+def _measure(con, db_path, keys):
+    used_bytes, file_bytes = storage_size(con, db_path)
+    return {'used_bytes': used_bytes, 'file_bytes': file_bytes, 'lookup_ms': lookup_latency(con, keys)}
+
+
+def compare_indexes(con, db_path, layout, keep_indexes=True, samples=25):
+    """Measure the database without and with its ART indexes.
+
+    Call on a freshly built, unindexed database. Size and point-lookup
+    latency are measured first as they are (zone maps only),
+    then the indexes are built and timed and the same lookups run again.
+    With keep_indexes the indexes are built in `con` and stay; otherwise
+    they are built in a throwaway copy of the file, so the database keeps
+    the size of an unindexed build.
+
+    Returns {'without': ..., 'with': ..., 'index_seconds': {name: seconds}}
+    where each side holds used_bytes, file_bytes and lookup_ms.
+    """
+    keys = sample_lookup_keys(con, samples)
+    without = _measure(con, db_path, keys)
+    if keep_indexes:
+        index_seconds = create_indexes(con, layout)
+        with_indexes = _measure(con, db_path, keys)
+    else:
+        scratch = tempfile.mkdtemp(prefix='index_report_')
+        try:
+            copy_path = os.path.join(scratch, os.path.basename(db_path))
+            shutil.copyfile(db_path, copy_path)
+            copy = duckdb.connect(copy_path)
+            try:
+                index_seconds = create_indexes(copy, layout)
+                with_indexes = _measure(copy, copy_path, keys)
+            finally:
+                copy.close()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return {'without': without, 'with': with_indexes, 'index_seconds': index_seconds}
+
+
+def print_index_report(report):
+    """Print a compare_indexes() result side by side"""
+    without, with_indexes = report['without'], report['with']
+    mb = 1024 * 1024
+    print("🗂️  Index report (zone maps vs ART indexes):")
+    print(f"   {'':<22}{'no indexes':>12}{'indexes':>12}")
+    print(f"   {'Data size (MB)':<22}{without['used_bytes'] / mb:>12,.1f}{with_indexes['used_bytes'] / mb:>12,.1f}")
+    print(f"   {'File size (MB)':<22}{without['file_bytes'] / mb:>12,.1f}{with_indexes['file_bytes'] / mb:>12,.1f}")
+    print(f"   {'Index build (s)':<22}{0:>12.2f}{sum(report['index_seconds'].values()):>12.2f}")
+    for kind in LOOKUPS:
+        label = f"{kind.capitalize()} lookup (ms)"
+        print(f"   {label:<22}{without['lookup_ms'][kind]:>12.2f}{with_indexes['lookup_ms'][kind]:>12.2f}")
+    print("   Build time per index: " + ", ".join(
+        f"{name} {seconds:.2f}s" for name, seconds in report['index_seconds'].items()))
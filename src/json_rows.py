@@ -0,0 +1,97 @@
+import json
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# JSON value types of response model fields, as the SQL they are cast to
+SQL_TYPES = {int: 'BIGINT', float: 'DOUBLE', str: 'VARCHAR'}
+
+
+def json_object_sql(model, alias='rows'):
+    """SQL building one JSON object per row with `model`'s fields, in field order.
+
+    Each field reads the column of the same name from `alias`, cast to the
+    field's JSON type the way the pydantic model would coerce it
+    (timestamps become 'YYYY-MM-DD HH:MM:SS' strings, decimals doubles).
+    """
+    fields = [f"'{name}', {cast}" for name, cast in _field_casts(model, alias)]
+    return f"json_object({', '.join(fields)})"
+
+
+def columns_sql(model, alias='rows', cast=True):
+    """SQL selecting `model`'s fields as plain columns, cast like json_object_sql unless `cast` is False"""
+    if not cast:
+        return ', '.join(f"{alias}.{name}" for name in model.model_fields)
+    return ', '.join(f"{expression} AS {name}" for name, expression in _field_casts(model, alias))
+
+
+def _field_casts(model, alias):
+    return [(name, f"CAST({alias}.{name} AS {SQL_TYPES[field.annotation]})")
+            for name, field in model.model_fields.items()]
+
+
+def fetch_json_rows(con, model, query, params=None, columns=()):
+    """Run `query` and return an Arrow table of its rows as JSON objects shaped like `model`.
+
+    DuckDB encodes the rows itself, so no Python object is made per row:
+    the table's `row_json` column holds one encoded object per row, in the
+    query's order, followed by any `columns` of the query kept as they are
+    (e.g. the sort key of the last row for a continuation token).
+    """
+    kept = ''.join(f", rows.{column}" for column in columns)
+    wrapped = f"SELECT {json_object_sql(model)} AS row_json{kept} FROM ({query}) AS rows"
+    return arrow_table(con.execute(wrapped, params or []))
+
+
+def fetch_model_columns(con, model, query, params=None):
+    """Run `query` and return `model`'s fields as an Arrow table, in DuckDB's own column types"""
+    wrapped = f"SELECT {columns_sql(model, cast=False)} FROM ({query}) AS rows"
+    return arrow_table(con.execute(wrapped, params or []))
+
+
+def arrow_table(result):
+    """The rest of a DuckDB result as an Arrow table (to_arrow_table() from DuckDB 1.4 on)"""
+    return result.to_arrow_table() if hasattr(result, 'to_arrow_table') else result.fetch_arrow_table()
+
+
+def arrow_reader(result, batch_rows):
+    """The rest of a DuckDB result as a RecordBatchReader of about `batch_rows` rows per batch.
+
+    Batches are fetched as the reader is consumed, so only one is in
+    memory at a time (to_arrow_reader() from DuckDB 1.4 on, fetch_record_batch() before).
+    """
+    if hasattr(result, 'to_arrow_reader'):
+        return result.to_arrow_reader(batch_rows)
+    return result.fetch_record_batch(batch_rows)
+
+
+def json_array(table, column='row_json'):
+    """Join a column of encoded JSON objects into one JSON array, as bytes"""
+    return b''.join([b'[', _join(table.column(column), ','), b']'])
+
+
+def json_lines(batch, column='row_json'):
+    """A table or record batch's encoded JSON objects as newline-delimited JSON bytes"""
+    if batch.num_rows == 0:
+        return b''
+    return b''.join([_join(batch.column(column), '\n'), b'\n'])
+
+
+def _join(values, separator):
+    """Concatenate a string column with `separator` between values, without a Python object per value"""
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    values = values.cast(pa.large_string())
+    if len(values) == 0:
+        return b''
+    single_list = pa.LargeListArray.from_arrays(pa.array([0, len(values)], pa.int64()), values)
+    return pc.binary_join(single_list, pa.scalar(separator, pa.large_string()))[0].as_buffer()
+
+
+def json_document(fields):
+    """Encode a dict as a JSON object; bytes values are spliced in as already-encoded JSON"""
+    parts = []
+    for key, value in fields.items():
+        encoded = value if isinstance(value, bytes) else json.dumps(value).encode()
+        parts.append(json.dumps(key).encode() + b':' + encoded)
+    return b'{' + b','.join(parts) + b'}'
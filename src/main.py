@@ -1,233 +1,656 @@
+import argparse
 import json
+import os
+import shutil
+import sys
+import time
 import pandas as pd
 import numpy as np
 import duckdb
-from datetime import datetime, timedelta
+from datetime import timedelta
 from tqdm import tqdm
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from arrow_sink import ArrowSink
+from checkpoint import create_checkpoints, incomplete_chunks, load_run_params, record_batch, resume_plans
+from customer_pool import CustomerPool, CustomerSignups, last_customer_number
+from customer_summary import create_customer_summary, refresh_customer_summary
+from city_dimension import CITIES_PATH, load_city_dimension
+from discount_calendar import (
+    CALENDAR_END, CALENDAR_START, DISCOUNT_PERCENTAGE, DISCOUNT_RECEIPT_MULTIPLIER, DISCOUNT_TRANSACTION,
+    load_discount_calendar,
+)
+from index_report import compare_indexes, create_indexes, print_index_report
+from parquet_sink import ParquetSink
+from pipeline import BatchPipeline
+from profiler import StageProfiler, stage_context
+from star_schema import (
+    SALES_FACT_COLUMNS, create_sales_data_view, create_star_schema, drop_sales_objects, existing_layout,
+)
+from sales_generator import (
+    GENDERS, PRODUCTS, TRANSACTION_TYPES, plan_chunks, receipt_range, receipt_totals, sales_data_schema_sql,
+    transaction_positions,
+)
+from store_profile import PROFILE_PATH, StoreProfile, load_store_profile
 
 def main():
     generate_initial_data()
 
-def generate_initial_data(chunks=10):
+def generate_initial_data(chunks=10, engine='vectorized', start_date='1900-01-01', end_date='2025-09-02',
+                          db_path='sales_timeseries.db', batch_rows=50000, workers=1, layout='flat',
+                          scale_factor=1, queue_size=4, parquet_dir=None, row_group_size=122880, indexes=True,
+                          index_report=False, store_profile=PROFILE_PATH, profile_output=None):
+    """Rebuild the sales database with every day from `start_date` to `end_date`.
+
+    The options are described with the command line in parse_args. Each
+    batch commits together with a checkpoint row, so an interrupted
+    rebuild can be finished by resume_generation().
+    """
     print("🏪 Retail Sales Database Generator")
     print("=" * 40)
 
-    # Set a random seed for reproducibility
-    np.random.seed(142)
+    if engine not in ('vectorized', 'legacy'):
+        raise ValueError(f"Unknown engine: {engine}")
+    if layout not in ('flat', 'star'):
+        raise ValueError(f"Unknown layout: {layout}")
+    if engine == 'legacy' and (workers > 1 or layout == 'star' or parquet_dir or profile_output):
+        raise ValueError("The legacy engine only writes the flat layout, serially, without Parquet or profiling")
+    if scale_factor <= 0:
+        raise ValueError("scale_factor must be positive")
+    if pd.Timestamp(start_date) < pd.Timestamp(CALENDAR_START) or pd.Timestamp(end_date) > pd.Timestamp(CALENDAR_END):
+        raise ValueError(f"Dates must fall within the discount calendar ({CALENDAR_START} to {CALENDAR_END})")
+    workers = _profiled_workers(workers, profile_output)
 
-    # Create a date range with daily frequency (split into chunks)
-    start_date = '1900-01-01'
-    end_date = '2025-09-02'
-    
-    # Calculate full date range first to get total days
+    profile = load_store_profile(store_profile)
+    cities = load_city_dimension()
     full_range = pd.date_range(start=start_date, end=end_date, freq='D')
-    total_days = len(full_range)
-    chunk_size = total_days // chunks
-    
-    print(f"📅 Date range: {total_days} days (processing in {chunks} chunks)")
+    run = {
+        'chunks': chunks,
+        'start_date': str(full_range[0].date()),
+        'end_date': str(full_range[-1].date()),
+        'layout': layout,
+        'batch_rows': batch_rows,
+        'scale_factor': scale_factor,
+        'store_profile': profile.config,
+        'parquet_dir': os.path.abspath(parquet_dir) if parquet_dir else None,
+    }
+    print(f"📅 Date range: {len(full_range)} days (processing in {chunks} chunks, {engine} engine)")
 
-    # Load dependencies
-    with open('src/cities.json') as f:
-        cities = json.load(f)
-    
-    # Product catalog and other static data definitions remain the same
-    genders = [{"F":0},{"M": 1}]
-    products = [
-        {'product_id': 100, 'product_name': 'iPhone 13', 'unit_price': 999.00},
-        {'product_id': 200, 'product_name': 'Samsung Galaxy S21', 'unit_price': 899.00},
-        {'product_id': 300, 'product_name': 'Google Pixel 6', 'unit_price': 599.00},
-        {'product_id': 400, 'product_name': 'OnePlus 9', 'unit_price': 729.00},
-        {'product_id': 500, 'product_name': 'Xiaomi Mi 11', 'unit_price': 749.00},
-        {'product_id': 600, 'product_name': 'Sony Xperia 5', 'unit_price': 899.00},
-        {'product_id': 700, 'product_name': 'Oppo Find X3', 'unit_price': 1149.00},
-        {'product_id': 800, 'product_name': 'Nokia 8.3', 'unit_price': 699.00},
-        {'product_id': 900, 'product_name': 'Realme GT', 'unit_price': 599.00},
-        {'product_id': 1000, 'product_name': 'Water', 'unit_price': 2.00},
-        {'product_id': 1100, 'product_name': 'Sparkling Water', 'unit_price': 2.50},
-        {'product_id': 1200, 'product_name': 'Iced Tea', 'unit_price': 3.00},
-        {'product_id': 1300, 'product_name': 'MacBook Pro', 'unit_price': 2399.00},
-        {'product_id': 1400, 'product_name': 'Dell XPS 13', 'unit_price': 1499.00},
-        {'product_id': 1500, 'product_name': 'HP Spectre x360', 'unit_price': 1699.00},
-        {'product_id': 1600, 'product_name': 'Lenovo ThinkPad X1', 'unit_price': 1899.00},
-        {'product_id': 1700, 'product_name': 'iPad Pro', 'unit_price': 1099.00},
-        {'product_id': 1800, 'product_name': 'Samsung Galaxy Tab S7', 'unit_price': 849.00},
-        {'product_id': 1900, 'product_name': 'Microsoft Surface Pro 7', 'unit_price': 999.00},
-        {'product_id': 2000, 'product_name': 'Amazon Kindle', 'unit_price': 89.00}
-    ]
-    transaction_types = [{'transaction_type_id':100,'transaction_type':'Sales','transaction_desc':'Product Sale'},
-                         {'transaction_type_id':200,'transaction_type':'Refund','transaction_desc':'Product Refund'},
-                         {'transaction_type_id':300,'transaction_type':'Exchange','transaction_desc':'Product Exchange'}
-                        ]
-    
-    # Initialize database
-    con = duckdb.connect(database='sales_timeseries.db', read_only=False)
-    con.execute("DROP TABLE IF EXISTS sales_data")
-    print("💾 Database initialized")
-    
-    # Create table schema first
-    schema_sql = """
-    CREATE TABLE sales_data (
-        date INTEGER,
-        transaction_id INTEGER,
-        transaction_desc INTEGER,
-        customer_number INTEGER,
-        age INTEGER,
-        gender INTEGER,
-        receipt_number INTEGER,
-        product_id INTEGER,
-        product_name INTEGER,
-        units_sold INTEGER,
-        unit_price_sgd DECIMAL(10,2),
-        total_amount_per_product_sgd DECIMAL(10,2),
-        receipt_total_sgd DECIMAL(10,2),
-        country_id INTEGER,
-        country INTEGER,
-        city INTEGER,
-        discount_period INTEGER,
-        discount_percentage INTEGER,
-        discount_applied INTEGER
-    )
+    with duckdb.connect(database=db_path, read_only=False) as con:
+        drop_sales_objects(con)
+        print(f"💾 Database initialized ({layout} layout)")
+        if layout == 'star':
+            create_star_schema(con, cities)
+        else:
+            con.execute(sales_data_schema_sql())
+        load_discount_calendar().create_table(con)
+
+        profiler = StageProfiler().start() if profile_output else None
+        sink = _sales_sink(con, layout, batch_rows, profiler)
+        started = time.perf_counter()
+        if engine == 'legacy':
+            _generate_legacy(con, full_range, chunks, scale_factor, profile)
+        else:
+            plans = _plan_run(full_range, chunks, workers, 142, 100001, 200001, batch_rows, scale_factor, profile)
+            customers = CustomerSignups(chunks, cities, profile, 142, 100001, scale_factor=scale_factor)
+            # Customers are stored chunk by chunk, with each chunk's first batch
+            customers.pool.create_table(con, cities)
+            create_checkpoints(con, plans, run)
+            parquet_sink = ParquetSink(parquet_dir, row_group_size=row_group_size) if parquet_dir else None
+            _write_batches(con, sink, plans, customers, profile, workers, queue_size, profiler,
+                           parquet_sink=parquet_sink)
+        elapsed = time.perf_counter() - started
+
+        _finish_rebuild(con, db_path, layout, indexes, index_report, profiler)
+        _report(con, elapsed, 0, profiler, profile_output,
+                dict(run, db_path=db_path, store_profile=profile.name, mode='rebuild'))
+
+
+def append_sales(db_path='sales_timeseries.db', end_date='2025-09-02', chunks=10, batch_rows=50000, scale_factor=1,
+                 workers=1, queue_size=4, store_profile=None, profile_output=None, in_place=False):
+    """Extend the database with the days after its last sale up to `end_date`, in one transaction.
+
+    Customer and receipt numbers continue where the database left off; its
+    indexes and customer_summary are updated along with the new rows.
+    The new days are drawn with the store profile the database was built
+    with, as recorded in its run parameters; a `store_profile` file that
+    differs from it is refused.
+    The append runs on a copy of the file that then replaces it, which is
+    what lets it run while the API serves the database: the API's
+    read-only attach holds DuckDB's file lock, and CursorPool.refresh()
+    reopens on the replaced file. `in_place` skips the copy (and the disk
+    space it takes) but needs the API stopped.
     """
-    con.execute(schema_sql)
-    
-    # Process in chunks
+    print("🏪 Retail Sales Database Generator")
+    print("=" * 40)
+
+    if scale_factor <= 0:
+        raise ValueError("scale_factor must be positive")
+    if pd.Timestamp(end_date) > pd.Timestamp(CALENDAR_END):
+        raise ValueError(f"Dates must fall within the discount calendar ({CALENDAR_START} to {CALENDAR_END})")
+    if not os.path.exists(db_path):
+        raise ValueError(f"No sales data in {db_path} to append to")
+    workers = _profiled_workers(workers, profile_output)
+
+    # A running API holds DuckDB's lock on db_path: unless in_place, write to a copy that then replaces it
+    work_path = db_path if in_place else _copy_database(db_path, f"{db_path}.append")
+    try:
+        with duckdb.connect(database=work_path, read_only=False) as con:
+            appended = _append(con, db_path, end_date, chunks, batch_rows, scale_factor, workers, queue_size,
+                               store_profile, profile_output)
+        if appended and not in_place:
+            os.replace(work_path, db_path)
+            print(f"🔁 {db_path} replaced; a running API reopens on the new file")
+    finally:
+        if not in_place:
+            _remove_database(work_path)
+
+
+def _append(con, db_path, end_date, chunks, batch_rows, scale_factor, workers, queue_size, store_profile,
+            profile_output):
+    """Append to the open database `con`; returns False when it is already up to date"""
+    if incomplete_chunks(con):
+        raise ValueError(f"{db_path} has an unfinished rebuild; complete it with --resume first")
+    layout = existing_layout(con)
+    if layout is None:
+        raise ValueError(f"No sales data in {db_path} to append to")
+    last_day, customer_start, receipt_start = _read_append_state(con, layout)
+    existing_rows = con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
+    start_date = last_day + pd.Timedelta(days=1)
+    print(f"➕ Appending to {db_path} ({layout} layout) after {last_day.date()}")
+    if start_date > pd.Timestamp(end_date):
+        print(f"✅ Already up to date through {end_date}")
+        return False
+
+    profile = _append_profile(con, db_path, store_profile)
+    cities = load_city_dimension()
+    full_range = pd.date_range(start=start_date, end=end_date, freq='D')
+    print(f"📅 Date range: {len(full_range)} days (processing in {chunks} chunks, vectorized engine)")
+    # Seeded from the first new day so re-running the same extension is reproducible
+    seed = [142, start_date.toordinal()]
+    plans = _plan_run(full_range, chunks, workers, seed, customer_start, receipt_start, batch_rows,
+                      scale_factor, profile)
+
+    # Everything below commits or rolls back as one unit
+    con.begin()
+    profiler = StageProfiler().start() if profile_output else None
+    started = time.perf_counter()
+    try:
+        # Databases from before the 1900-2100 discount calendar get it here
+        load_discount_calendar().create_table(con)
+        existing_customers = CustomerPool.from_table(con, profile, active_on=start_date)
+        customers = CustomerSignups(chunks, cities, profile, seed, customer_start, existing_customers,
+                                    scale_factor=scale_factor)
+        if existing_customers is None:
+            customers.pool.create_table(con, cities)
+        sink = _sales_sink(con, layout, batch_rows, profiler)
+        _write_batches(con, sink, plans, customers, profile, workers, queue_size, profiler,
+                       checkpointed=False)
+        with stage_context(profiler, 'customer_summary'):
+            updated = refresh_customer_summary(con, since=start_date)
+        print(f"👥 Customer summary: {updated:,} customers updated")
+    except BaseException:
+        con.rollback()
+        print("↩️  Append rolled back, database unchanged")
+        raise
+    con.commit()
+    elapsed = time.perf_counter() - started
+
+    print("\n📊 Existing indexes were maintained during the append")
+    _report(con, elapsed, existing_rows, profiler, profile_output, {
+        'db_path': db_path, 'layout': layout, 'start_date': str(full_range[0].date()),
+        'end_date': str(full_range[-1].date()), 'chunks': chunks, 'batch_rows': batch_rows,
+        'scale_factor': scale_factor, 'store_profile': profile.name, 'mode': 'append',
+    })
+
+    return True
+
+def resume_generation(db_path='sales_timeseries.db', workers=1, queue_size=4, indexes=True, index_report=False,
+                      profile_output=None):
+    """Finish an interrupted rebuild with the parameters it was started with.
+
+    Finished chunks are skipped and a partly written chunk restarts after
+    its last committed batch, so the result matches an uninterrupted run.
+    A Parquet dataset the rebuild was also writing cannot be continued, so
+    it is removed rather than left half-written.
+    """
+    print("🏪 Retail Sales Database Generator")
+    print("=" * 40)
+    workers = _profiled_workers(workers, profile_output)
+
+    with duckdb.connect(database=db_path, read_only=False) as con:
+        run = load_run_params(con)
+        if run is None:
+            raise ValueError(f"No generation checkpoint in {db_path} to resume")
+        chunks, layout = run['chunks'], run['layout']
+        profile = StoreProfile(run['store_profile']) if 'store_profile' in run else load_store_profile()
+        cities = load_city_dimension()
+        full_range = pd.date_range(start=run['start_date'], end=run['end_date'], freq='D')
+        print(f"⏯️  Resuming {db_path}: {run['start_date']} to {run['end_date']}, {chunks} chunks, {layout} layout")
+        if run.get('parquet_dir'):
+            _remove_incomplete_dataset(run['parquet_dir'])
+
+        plans = _plan_run(full_range, chunks, workers, 142, 100001, 200001, run['batch_rows'],
+                          run.get('scale_factor', 1), profile)
+        # Customers of the finished chunks are signed up again (not stored) to get the pool where it was
+        customers = CustomerSignups(chunks, cities, profile, 142, 100001, stored_through=last_customer_number(con),
+                                    scale_factor=run.get('scale_factor', 1))
+        pending = resume_plans(con, plans)
+        customers.skip(plans[:pending[0]['index']] if pending else plans)
+        plans = pending
+        print(f"⏭️  {chunks - len(plans)} chunk(s) already complete, {len(plans)} to generate")
+
+        profiler = StageProfiler().start() if profile_output else None
+        sink = _sales_sink(con, layout, run['batch_rows'], profiler)
+        existing_rows = con.execute(f"SELECT COUNT(*) FROM {sink.table_name}").fetchone()[0]
+        started = time.perf_counter()
+        _write_batches(con, sink, plans, customers, profile, workers, queue_size, profiler)
+        elapsed = time.perf_counter() - started
+
+        _finish_rebuild(con, db_path, layout, indexes, index_report, profiler)
+        _report(con, elapsed, existing_rows, profiler, profile_output,
+                dict(run, db_path=db_path, store_profile=profile.name, mode='resume'))
+
+
+def _append_profile(con, db_path, store_profile):
+    """The store profile to append with: the one the database was built with, which `store_profile` must match"""
+    run = load_run_params(con)
+    built_with = run.get('store_profile') if run else None
+    if store_profile is None:
+        return StoreProfile(built_with) if built_with else load_store_profile()
+    profile = load_store_profile(store_profile)
+    if built_with and profile.config != built_with:
+        raise ValueError(f"{db_path} was built with a different store profile than {store_profile}; "
+                         "append without --store-profile to use the one it was built with")
+    return profile
+
+
+def _remove_incomplete_dataset(parquet_dir):
+    """Delete the Parquet dataset an interrupted rebuild left without a manifest; resuming cannot continue it"""
+    if os.path.isdir(parquet_dir):
+        shutil.rmtree(parquet_dir)
+        print(f"🗑️  Removed the incomplete Parquet dataset in {parquet_dir}: a resume finishes only the "
+              "database, rebuild with --parquet-dir for a dataset")
+
+
+def _profiled_workers(workers, profile_output):
+    """Profiling generates serially, so it runs with one worker whatever was asked for"""
+    if profile_output and workers > 1:
+        print(f"⏱️  Profiling generates serially; ignoring workers={workers}")
+        return 1
+    return workers
+
+
+def _plan_run(full_range, chunks, workers, seed, customer_start, receipt_start, batch_rows, scale_factor, profile):
+    """Chunk plans for a run; seeds and ID ranges are fixed per chunk before any work is scheduled"""
+    if workers > chunks:
+        print(f"⚠️  Only {chunks} chunks for {workers} workers; raise --chunks to use them all")
+    return plan_chunks(full_range, chunks, seed=seed, customer_start=customer_start, receipt_start=receipt_start,
+                       batch_rows=batch_rows, scale_factor=scale_factor, profile=profile)
+
+
+def _sales_sink(con, layout, batch_rows, profiler):
+    """ArrowSink writing generated columns to the layout's table"""
+    if layout == 'star':
+        return ArrowSink(con, table_name='sales_fact', columns=SALES_FACT_COLUMNS, capacity=batch_rows,
+                         profiler=profiler)
+    return ArrowSink(con, capacity=batch_rows, profiler=profiler)
+
+
+def _write_batches(con, sink, plans, customers, profile, workers, queue_size, profiler, parquet_sink=None,
+                   checkpointed=True):
+    """Generate the planned batches on the batch pipeline and write each one to `sink` (and `parquet_sink`).
+
+    Each chunk's new customers go into dim_customer with its first batch.
+    When `checkpointed`, every batch commits together with its checkpoint
+    row; otherwise the batches go into the caller's open transaction.
+    """
+    chunks = plans[-1]['index'] + 1 if plans else 0
+    print(f"⚙️  Generating with {workers} worker process(es), store profile '{profile.name}'")
+    pipeline = BatchPipeline(plans, load_city_dimension(), workers, 0 if profiler else queue_size, profile,
+                             customers, profiler)
+    try:
+        progress = tqdm(total=sum(len(plan['batches']) for plan in plans), desc="Writing batches")
+        with pipeline:
+            for plan, batch, columns in pipeline:
+                progress.set_description(f"Writing chunk {plan['index']+1}/{chunks}")
+                if checkpointed:
+                    # The batch and its checkpoint row become visible together
+                    con.begin()
+                    customers.write_signups(con, plan)
+                    sink.write(columns)
+                    sink.flush()
+                    record_batch(con, plan, batch, len(columns['receipt_number']))
+                    con.commit()
+                else:
+                    customers.write_signups(con, plan)
+                    sink.write(columns)
+                if parquet_sink:
+                    with stage_context(profiler, 'parquet'):
+                        parquet_sink.write(columns)
+                progress.update()
+                if batch['last_batch']:
+                    progress.write(f"✅ Chunk {plan['index']+1}/{chunks} completed ({len(plan['dates'])} days)")
+            sink.close()
+        progress.close()
+        if parquet_sink:
+            with stage_context(profiler, 'parquet'):
+                parquet_sink.close()
+    except BaseException:
+        # Committed batches stay for resume_generation()
+        if profiler:
+            profiler.stop()
+        raise
+    if profiler:
+        # What follows (indexes, customer_summary) belongs to no chunk
+        profiler.chunk = None
+    sink.report()
+    if parquet_sink:
+        parquet_sink.report()
+    pipeline.report()
+
+
+def _generate_legacy(con, full_range, chunks, scale_factor, profile):
+    """Run the original per-row loop chunk by chunk, every receipt a new customer"""
+    np.random.seed(142)
+    with open(CITIES_PATH) as f:
+        city_records = json.load(f)
+    chunk_size = len(full_range) // chunks
     customer_id = 100001
     receipt_id = 200001
-    customer_ages = {}
-    
-    # Process data in chunks
     for chunk_idx in range(chunks):
         chunk_start = chunk_idx * chunk_size
-        chunk_end = (chunk_idx + 1) * chunk_size if chunk_idx < chunks - 1 else total_days
-        
+        chunk_end = (chunk_idx + 1) * chunk_size if chunk_idx < chunks - 1 else len(full_range)
+
         # Get date range for this chunk
         date_chunk = full_range[chunk_start:chunk_end]
-        
+
         print(f"\n🔄 Processing chunk {chunk_idx+1}/{chunks} ({len(date_chunk)} days)")
+        customer_id, receipt_id = _generate_legacy_chunk(
+            con, date_chunk, city_records, customer_id, receipt_id, f"Chunk {chunk_idx+1}/{chunks}",
+            scale_factor, profile
+        )
+        print(f"✅ Chunk {chunk_idx+1}/{chunks} completed")
+
+
+def _finish_rebuild(con, db_path, layout, indexes, index_report, profiler):
+    """Once every row of a rebuild is in: the star view, the indexes and customer_summary"""
+    if layout == 'star':
+        create_sales_data_view(con)
+    if index_report:
+        print("\n🗂️  Measuring the database without and with indexes...")
+        with stage_context(profiler, 'index_build'):
+            report = compare_indexes(con, db_path, layout, keep_indexes=indexes)
+        print_index_report(report)
+    elif indexes:
+        print("\n📊 Creating indexes...")
+        with stage_context(profiler, 'index_build'):
+            index_seconds = create_indexes(con, layout)
+        print(f"   Built {len(index_seconds)} indexes in {sum(index_seconds.values()):.2f}s")
+    else:
+        # Days are written in order and every batch holds a contiguous range of
+        # receipt numbers (sorted by time within it), so each row group's zone
+        # map covers a few days and receipts. A repeat customer's sales span
+        # years, so customer lookups scan most row groups without idx_customer.
+        print("\n📊 Skipping indexes: date and receipt lookups rely on zone maps")
+    with stage_context(profiler, 'customer_summary'):
+        summarized = create_customer_summary(con)
+    print(f"👥 Customer summary: {summarized:,} customers")
+
+
+def _report(con, elapsed, existing_rows, profiler, profile_output, run):
+    """Print the database statistics and, when profiling, write the profile with the `run` details"""
+    print("\n📈 Database statistics:")
+    record_count = con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
+    revenue = con.execute("SELECT SUM(total_amount_per_product_sgd) FROM sales_data").fetchone()[0]
+    unique_customers = con.execute("SELECT COUNT(DISTINCT customer_number) FROM sales_data").fetchone()[0]
+    unique_receipts = con.execute("SELECT COUNT(DISTINCT receipt_number) FROM sales_data").fetchone()[0]
+    rows = record_count - existing_rows
+
+    print(f"\n✅ Data saved to {run['db_path']} database file")
+    print(f"📊 Total records: {record_count:,}")
+    print(f"💰 Total revenue: SGD ${revenue:,.2f}")
+    print(f"👥 Unique customers: {unique_customers:,}")
+    print(f"🧾 Unique receipts: {unique_receipts:,}")
+    if run['mode'] != 'rebuild':
+        print(f"➕ {'Appended' if run['mode'] == 'append' else 'Resumed'} records: {rows:,}")
+    print(f"⚡ Generation speed: {rows / max(elapsed, 1e-9):,.0f} rows/sec")
+    if resource is not None:
+        print(f"🧠 Peak memory: {_peak_rss_mb():,.0f} MB (workers: {_peak_rss_mb(children=True):,.0f} MB)")
+    if profiler:
+        profiler.stop()
+        profiler.report()
+        profiler.write_json(
+            profile_output, **run, rows=rows, rows_per_second=rows / max(elapsed, 1e-9),
+            peak_rss_mb=_peak_rss_mb() if resource is not None else None,
+        )
+        print(f"   Summary written to {profile_output}")
+    print("🎉 Database creation complete!")
+
+
+def _peak_rss_mb(children=False):
+    """Peak resident set size of this process (or its largest finished child) in MB"""
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    # ru_maxrss is reported in KB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def _copy_database(source, target):
+    """Copy a DuckDB file (and its write-ahead log, if any) to `target`; returns `target`"""
+    _remove_database(target)
+    shutil.copyfile(source, target)
+    if os.path.exists(f"{source}.wal"):
+        shutil.copyfile(f"{source}.wal", f"{target}.wal")
+    return target
+
+
+def _remove_database(path):
+    """Delete a DuckDB file and its write-ahead log, whichever exist"""
+    for name in (path, f"{path}.wal"):
+        if os.path.exists(name):
+            os.remove(name)
+
+
+def _read_append_state(con, layout):
+    """Return the last generated day and the next customer/receipt numbers"""
+    table, date_column = ('sales_fact', 'sold_at') if layout == 'star' else ('sales_data', 'date')
+    last_sale, max_customer, max_receipt = con.execute(f"""
+        SELECT MAX({date_column}), MAX(customer_number), MAX(receipt_number) FROM {table}
+    """).fetchone()
+    return pd.Timestamp(last_sale).normalize(), max_customer + 1, max_receipt + 1
+
+
+def _generate_legacy_chunk(con, date_chunk, cities, customer_id, receipt_id, desc, scale_factor=1, profile=None):
+    """Original per-row generation loop, kept for comparison with the vectorized engine"""
+    transactions = []
+    amounts = []  # Unrounded item amounts, summed into receipt totals when saving
+    discount_keys = load_discount_calendar().period_keys(date_chunk)
+    profile = profile or load_store_profile()
+    transaction_types = [TRANSACTION_TYPES[i] for i in transaction_positions(profile)]
+    
+    for date, discount_key in zip(tqdm(date_chunk, desc=desc), discount_keys):
+        # Number of receipts per day
+        low, high = receipt_range(date.weekday() >= 5, scale_factor, profile)
+        num_receipts = np.random.randint(low, high)
         
-        # Generate transactions for this chunk
-        transactions = []
+        # Seasonality, and increased activity during discount periods
+        multiplier = (DISCOUNT_RECEIPT_MULTIPLIER if discount_key else 1.0) * profile.seasonality[date.month - 1]
+        num_receipts = int(num_receipts * multiplier)
         
-        for date in tqdm(date_chunk, desc=f"Chunk {chunk_idx+1}/{chunks}"):
-            year = date.year * 1000
-            month = date.month * 100
-            day = date.day * 10
+        for receipt in range(num_receipts):
+            # Every receipt is a new customer: draw their attributes
+            # Realistic age distribution: more customers in 25-45 range
+            age_range_start = np.random.choice(profile.ages.values, p=profile.ages.probabilities)
+            customer_age = np.random.randint(
+                age_range_start, min(age_range_start + profile.age_width, profile.max_age))
+            city = np.random.choice([city['name'] for city in cities])
+            city_code = next(idx for idx, item in enumerate(cities) if item['name'] == city)
+            country_id = int(cities[city_code]['country_id'])
+            transaction_type = transaction_types[
+                np.random.choice(len(transaction_types), p=profile.transactions.probabilities)]
             
-            # Number of receipts per day
-            day_of_week = date.weekday()
-            if day_of_week >= 5:  # Weekend
-                num_receipts = np.random.randint(20, 40)
-            else:  # Weekday
-                num_receipts = np.random.randint(30, 60)
+            # Number of items per receipt
+            items_per_receipt = np.random.choice(profile.items.values, p=profile.items.probabilities)
+            selected_products = np.random.choice(len(PRODUCTS), size=items_per_receipt, replace=False)
             
-            # Generate receipts logic (same as before)
-            for receipt in range(num_receipts):
-                # Assign age to customer if not already assigned
-                if customer_id not in customer_ages:
-                    # Realistic age distribution: more customers in 25-45 range
-                    age_ranges = [18, 25, 35, 45, 55, 65, 75]
-                    age_weights = [0.05, 0.20, 0.25, 0.25, 0.15, 0.08, 0.02]
-                    age_range_start = np.random.choice(age_ranges, p=age_weights)
-                    customer_ages[customer_id] = np.random.randint(age_range_start, min(age_range_start + 10, 80))
-                    city = np.random.choice([city['name'] for city in cities])
-                    selected_city = next(item for item in cities if item['name'] == city)
-                    country_id = selected_city['country_id']
-                    country = selected_city['country']
-                    transaction_type = transaction_types[np.random.choice([0,1,2], p=[0.95,0.025,0.025])]
+            for product_idx in selected_products:
+                product = PRODUCTS[product_idx]
+                units_sold = np.random.randint(1, 4)  # 1-3 units per item
                 
-                # Number of items per receipt
-                items_per_receipt = np.random.choice([1, 2, 3, 4], p=[0.4, 0.3, 0.2, 0.1])
-                selected_products = np.random.choice(len(products), size=items_per_receipt, replace=False)
+                # Add some price variation (±10%)
+                unit_price = product['unit_price'] * np.random.uniform(0.9, 1.1)
                 
-                receipt_total = 0
+                # Apply discount if in discount period
+                discount_applied = bool(discount_key) and transaction_type['transaction_desc'] == DISCOUNT_TRANSACTION
+                if discount_applied:
+                    unit_price = unit_price * (1 - DISCOUNT_PERCENTAGE / 100)
                 
-                for product_idx in selected_products:
-                    product = products[product_idx]
-                    units_sold = np.random.randint(1, 4)  # 1-3 units per item
-                    
-                    # Add some price variation (±10%)
-                    unit_price = product['unit_price'] * np.random.uniform(0.9, 1.1)
-                    
-                    total_amount_per_product = units_sold * unit_price
-                    receipt_total += total_amount_per_product
-                    
-                    # Add hour variation throughout the day
-                    hour = np.random.randint(6, 22)  # Store hours 6 AM to 10 PM
-                    transaction_datetime = date + timedelta(hours=hour, minutes=np.random.randint(0, 60))
-                    
-                    transactions.append({
-                        'date': int(f'{transaction_datetime.year}{transaction_datetime.month:02d}{transaction_datetime.day:02d}{transaction_datetime.hour:02d}{transaction_datetime.minute:02d}'),
-                        'transaction_id': transaction_type['transaction_type_id'],
-                        'transaction_desc': transaction_type['transaction_type_id'],
-                        'customer_number': customer_id,
-                        'age': customer_ages[customer_id],
-                        'gender': np.random.choice(genders),
-                        'receipt_number': receipt_id,
-                        'product_id': product['product_id'],
-                        'product_name': product['product_id'],
-                        'units_sold': units_sold,
-                        'unit_price_sgd': round(unit_price, 2),
-                        'total_amount_per_product_sgd': round(total_amount_per_product, 2),
-                        'receipt_total_sgd': 0,  # Will be filled later
-                        'country_id': country_id,
-                        'country': country,
-                        'city': city,
-                        'discount_period': None,
-                        'discount_percentage': None,
-                        'discount_applied': None
-                    })
+                total_amount_per_product = units_sold * unit_price
+                amounts.append(total_amount_per_product)
                 
-                # Update receipt total for all items in this receipt
-                receipt_start_idx = len(transactions) - items_per_receipt
-                for i in range(receipt_start_idx, len(transactions)):
-                    transactions[i]['receipt_total_sgd'] = round(receipt_total, 2)
+                # Add hour variation throughout the day
+                hour = int(np.random.choice(profile.hours.values, p=profile.hours.probabilities))
+                transaction_datetime = date + timedelta(hours=hour, minutes=np.random.randint(0, 60))
                 
-                customer_id += 1
-                receipt_id += 1
+                transactions.append({
+                    'date': transaction_datetime,
+                    'transaction_id': transaction_type['transaction_type_id'],
+                    'transaction_desc': transaction_type['transaction_type_id'],
+                    'customer_number': customer_id,
+                    'age': customer_age,
+                    'gender': list(GENDERS[np.random.randint(0, len(GENDERS))].values())[0],
+                    'receipt_number': receipt_id,
+                    'product_id': product['product_id'],
+                    'product_name': product['product_id'],
+                    'units_sold': units_sold,
+                    'unit_price_sgd': round(unit_price, 2),
+                    'total_amount_per_product_sgd': round(total_amount_per_product, 2),
+                    'receipt_total_sgd': 0,  # Filled in per batch when saving
+                    'country_id': country_id,
+                    'country': country_id,
+                    'city': city_code,
+                    'discount_period': int(discount_key) if discount_applied else 0,
+                    'discount_percentage': DISCOUNT_PERCENTAGE if discount_applied else 0,
+                    'discount_applied': int(discount_applied)
+                })
             
-            # After every 10 days, save to database to avoid memory issues
-            if len(transactions) > 50000 or date == date_chunk[-1]:
-                print(f"Saving {len(transactions)}, records to database...")
-                df_chunk = pd.DataFrame(transactions)
-                con.register('df_view', df_chunk)
-                con.execute("INSERT INTO sales_data SELECT * FROM df_view")
-                transactions = []  # Clear for next batch
+            customer_id += 1
+            receipt_id += 1
         
-        print(f"✅ Chunk {chunk_idx+1}/{chunks} completed")
-    
-    # Create indexes after all data is inserted
-    print("\n📊 Creating indexes...")
-    con.execute("CREATE INDEX idx_date ON sales_data (date)")
-    con.execute("CREATE INDEX idx_customer ON sales_data (customer_number)")
-    con.execute("CREATE INDEX idx_receipt ON sales_data (receipt_number)")
-    con.execute("CREATE INDEX idx_product ON sales_data (product_id)")
-    
-    # Get statistics about the table
-    print("\n📈 Database statistics:")
-    record_count = con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
-    revenue = con.execute("SELECT SUM(total_amount_per_product_sgd) FROM sales_data").fetchone()[0]
-    unique_customers = con.execute("SELECT COUNT(DISTINCT customer_number) FROM sales_data").fetchone()[0]
-    unique_receipts = con.execute("SELECT COUNT(DISTINCT receipt_number) FROM sales_data").fetchone()[0]
-    
-    con.close()
+        # After every 10 days, save to database to avoid memory issues
+        if transactions and (len(transactions) > 50000 or date == date_chunk[-1]):
+            print(f"Saving {len(transactions)}, records to database...")
+            df_chunk = pd.DataFrame(transactions)
+            # Receipts are numbered consecutively, so the offset from the first one is the segment id
+            receipts = df_chunk['receipt_number'].to_numpy()
+            df_chunk['receipt_total_sgd'] = receipt_totals(receipts - receipts[0], amounts)
+            df_chunk = df_chunk.sort_values('date', kind='stable')
+            con.register('df_view', df_chunk)
+            con.execute("INSERT INTO sales_data SELECT * FROM df_view")
+            transactions = []  # Clear for next batch
+            amounts = []
     
-    print("\n✅ Data saved to sales_timeseries.db database file")
-    print(f"📊 Total records: {record_count:,}")
-    print(f"💰 Total revenue: SGD ${revenue:,.2f}")
-    print(f"👥 Unique customers: {unique_customers:,}")
-    print(f"🧾 Unique receipts: {unique_receipts:,}")
-    print("🎉 Database creation complete!")
+    return customer_id, receipt_id
+
+
+def parse_args(argv=None):
+    """Parse the generator command line options"""
+    parser = argparse.ArgumentParser(description="Retail TimeSeries Database Generator")
+    parser.add_argument('--menu', action='store_true', help="Launch the retail menu directly")
+    engine = parser.add_argument('--engine', choices=['vectorized', 'legacy'], default='vectorized',
+                                 help="Generation engine (legacy keeps the original per-row loop)")
+    chunks = parser.add_argument('--chunks', type=int, default=10,
+                                 help="Number of date-range chunks; each gets its own seed and ID range")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes generating chunks in parallel")
+    layout = parser.add_argument('--layout', choices=['flat', 'star'], default='flat',
+                                 help="Storage layout: wide sales_data table, or fact + dimension tables behind a "
+                                      "sales_data view")
+    end_date = parser.add_argument('--end-date', default='2025-09-02',
+                                   help="Last day to generate (YYYY-MM-DD)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--append', action='store_true',
+                      help="Extend the existing database up to --end-date instead of rebuilding it")
+    mode.add_argument('--resume', action='store_true',
+                      help="Continue an interrupted rebuild from its last committed batch")
+    in_place = parser.add_argument('--in-place', action='store_true',
+                                   help="With --append, write to the database file itself instead of a copy that "
+                                        "replaces it (saves the copy, but the API must be stopped)")
+    scale_factor = parser.add_argument('--scale-factor', type=float, default=1,
+                                       help="Multiply the daily receipt volume (e.g. 10, 100, 1000); customers shop "
+                                            "that much more often, so the customer pool stays the same size")
+    batch_rows = parser.add_argument('--batch-rows', type=int, default=50000,
+                                     help="Rows generated and inserted per batch; bounds peak memory")
+    parquet_dir = parser.add_argument('--parquet-dir',
+                                      help="Also write a year=/country= partitioned Parquet dataset to this directory")
+    row_group_size = parser.add_argument('--row-group-size', type=int, default=122880,
+                                         help="Rows per Parquet row group")
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help="Generated batches allowed to wait for the database writer")
+    no_indexes = parser.add_argument('--no-indexes', dest='indexes', action='store_false',
+                                     help="Skip the ART indexes; zone maps still prune date and receipt lookups, "
+                                          "not customer ones")
+    store_profile = parser.add_argument('--store-profile',
+                                        help="JSON file with the volume, seasonality and sampling distributions "
+                                             "(default: store_profile.json; --append uses the database's own)")
+    parser.add_argument('--profile', dest='profile_output', nargs='?', const='generation_profile.json',
+                        help="Profile each stage per chunk and write a JSON summary (default: generation_profile.json)")
+    index_report = parser.add_argument('--index-report', action='store_true',
+                                       help="Compare file size, index build time and lookup latency with and without "
+                                            "indexes")
+    args = parser.parse_args(argv)
+
+    # --append keeps the database as it was built and --resume the run as it
+    # was started, so options they would drop are refused instead
+    if args.append:
+        ignored, used_with = [engine, layout, parquet_dir, row_group_size, no_indexes, index_report], '--append'
+    elif args.resume:
+        ignored, used_with = [engine, layout, chunks, end_date, scale_factor, batch_rows, parquet_dir,
+                              row_group_size, store_profile, in_place], '--resume'
+    else:
+        ignored, used_with = [in_place], 'a rebuild'
+    # Parsed again without their defaults, the ignored options show up only if given
+    for action in ignored:
+        action.default = argparse.SUPPRESS
+    given = vars(parser.parse_args(argv))
+    refused = [action.option_strings[0] for action in ignored if action.dest in given]
+    if refused:
+        parser.error(f"{', '.join(refused)} cannot be used with {used_with}")
+    return args
+
+
+def generate_from_args(args):
+    """Rebuild, append to or resume the database as the parsed command line asks"""
+    run = dict(workers=args.workers, queue_size=args.queue_size, profile_output=args.profile_output)
+    if args.append:
+        return append_sales(end_date=args.end_date, chunks=args.chunks, batch_rows=args.batch_rows,
+                            scale_factor=args.scale_factor, store_profile=args.store_profile,
+                            in_place=args.in_place, **run)
+    if args.resume:
+        return resume_generation(indexes=args.indexes, index_report=args.index_report, **run)
+    return generate_initial_data(chunks=args.chunks, engine=args.engine, end_date=args.end_date,
+                                 batch_rows=args.batch_rows, layout=args.layout, scale_factor=args.scale_factor,
+                                 parquet_dir=args.parquet_dir, row_group_size=args.row_group_size,
+                                 indexes=args.indexes, index_report=args.index_report,
+                                 store_profile=args.store_profile or PROFILE_PATH, **run)
 
 
 if __name__ == "__main__":
-    import sys
-    import os
+    args = parse_args()
     
     print("🏪 Retail TimeSeries Database Generator")
     print("=" * 40)
     
+    # Extend or finish an existing database without prompting
+    if args.append or args.resume:
+        generate_from_args(args)
+        sys.exit(0)
+    
     # Check if we should launch the menu directly
-    if len(sys.argv) > 1 and sys.argv[1] == "--menu":
+    if args.menu:
         try:
             from retail_menu import RetailMenu
             menu = RetailMenu()
@@ -235,7 +658,7 @@ if __name__ == "__main__":
         except ImportError:
             print("❌ retail_menu.py not found. Creating database only...")
             if not os.path.exists("sales_timeseries.db"):
-                generate_initial_data()
+                generate_from_args(args)
         sys.exit(0)
     
     if os.path.exists("sales_timeseries.db"):
@@ -251,7 +674,7 @@ if __name__ == "__main__":
             os.remove("sales_timeseries.db")
             print("🗑️  Deleted existing database")
             print("⚡ Generating new database...")
-            generate_initial_data()
+            generate_from_args(args)
             print("✅ Database recreation complete!")
         elif choice == '2':
             try:
@@ -265,7 +688,7 @@ if __name__ == "__main__":
             sys.exit(0)
     else:
         print("⚡ Generating comprehensive retail database...")
-        generate_initial_data()
+        generate_from_args(args)
         print("✅ Database generation complete!")
         print("📁 Check 'sales_timeseries.db' for your data")
         
@@ -0,0 +1,195 @@
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from arrow_sink import arrow_type
+from sales_generator import SALES_DATA_COLUMNS
+
+# Leading underscore: dataset readers (pyarrow, Spark) skip it when listing files
+MANIFEST_NAME = '_manifest.json'
+PARTITION_COLUMNS = ['year', 'country']
+
+
+def parquet_type(sql_type):
+    """Map a sales_data SQL column type to the Arrow type stored in Parquet"""
+    match = re.fullmatch(r'DECIMAL\((\d+),\s*(\d+)\)', sql_type)
+    if match:
+        return pa.decimal128(int(match.group(1)), int(match.group(2)))
+    return arrow_type(sql_type)
+
+
+def _json_value(value):
+    """Make a Parquet statistics value JSON serialisable"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if hasattr(value, 'is_finite'):  # Decimal
+        return float(value)
+    return value
+
+
+def file_stats(path):
+    """Row count, row-group count and per-column min/max read back from a Parquet footer"""
+    metadata = pq.read_metadata(path)
+    stats = {}
+    for rg in range(metadata.num_row_groups):
+        row_group = metadata.row_group(rg)
+        for col in range(row_group.num_columns):
+            column = row_group.column(col)
+            if column.statistics is None or not column.statistics.has_min_max:
+                continue
+            low, high = column.statistics.min, column.statistics.max
+            name = column.path_in_schema
+            if name in stats:
+                low = min(low, stats[name][0])
+                high = max(high, stats[name][1])
+            stats[name] = (low, high)
+    return {
+        'rows': metadata.num_rows,
+        'row_groups': metadata.num_row_groups,
+        'stats': {name: {'min': _json_value(low), 'max': _json_value(high)}
+                  for name, (low, high) in stats.items()},
+    }
+
+
+class ParquetSink:
+    """Writes generated columns as a Hive-partitioned Parquet dataset.
+
+    Rows are split into `year=YYYY/country=<code>/part-0.parquet` files
+    (country is the sales_data.country code; the partition columns live in
+    the directory names, not in the files). Each partition buffers rows until
+    it has `row_group_size` of them, so row groups have the configured size
+    whatever the batch size. Batches arrive in date order, so once a batch
+    starts in a later year every earlier year's files are finished and
+    handed to a small thread pool for their final write and close; only the
+    current years' writers stay open.
+    `close()` writes _manifest.json with the row count and per-column min/max
+    of every file.
+    """
+
+    def __init__(self, root, columns=SALES_DATA_COLUMNS, row_group_size=122880, compression='zstd'):
+        self.root = root
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = pa.schema([(name, parquet_type(sql_type)) for name, sql_type in columns
+                                 if name not in PARTITION_COLUMNS])
+        self.writers = {}
+        self.buffers = {}
+        self.files = []
+        # Finished partitions are written and closed in the background
+        self.pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.pending = []
+        self.write_seconds = 0.0
+        self.rows = 0
+        if os.path.isdir(root) and os.listdir(root):
+            if not os.path.exists(os.path.join(root, MANIFEST_NAME)):
+                raise ValueError(f"{root} is not empty and holds no Parquet dataset manifest")
+            shutil.rmtree(root)
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, columns):
+        """Split a dict of column arrays by (year, country) and buffer each part"""
+        started = time.perf_counter()
+        dates = np.asarray(columns['date'], dtype='datetime64[us]')
+        year = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+        country = np.asarray(columns['country'], dtype=np.int64)
+
+        # Finished years can be closed: batches never go back in time
+        if len(year):
+            for key in [key for key in self._open_partitions() if key[0] < year.min()]:
+                self._close_partition(key)
+
+        # One Arrow table per batch, reordered so each partition is a zero-copy slice
+        key = year * 1_000_000 + country
+        order = np.argsort(key, kind='stable')
+        table = pa.Table.from_arrays(
+            [pc.cast(pa.array(np.asarray(columns[field.name])), field.type) if field.name in columns
+             else pa.nulls(len(dates), field.type) for field in self.schema],
+            schema=self.schema,
+        ).take(order)
+        key = key[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(key)]):
+            partition = (int(key[start] // 1_000_000), int(key[start] % 1_000_000))
+            self.buffers.setdefault(partition, []).append(table.slice(start, end - start))
+            self._flush_partition(partition)
+        self.rows += len(dates)
+        self.write_seconds += time.perf_counter() - started
+
+    def _open_writer(self, key):
+        directory = os.path.join(self.root, f"year={key[0]}", f"country={key[1]}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'part-0.parquet')
+        return path, pq.ParquetWriter(path, self.schema, compression=self.compression)
+
+    def _flush_partition(self, key):
+        """Write the whole row groups buffered for a partition, keeping the remainder"""
+        table = pa.concat_tables(self.buffers[key])
+        cut = (table.num_rows // self.row_group_size) * self.row_group_size
+        if cut:
+            if key not in self.writers:
+                self.writers[key] = self._open_writer(key)
+            self.writers[key][1].write_table(table.slice(0, cut), row_group_size=self.row_group_size)
+        self.buffers[key] = [table.slice(cut)]
+
+    def _open_partitions(self):
+        return set(self.writers) | set(self.buffers)
+
+    def _close_partition(self, key):
+        """Hand a finished partition to the background pool for its last write and footer"""
+        buffered = self.buffers.pop(key, [])
+        path, writer = self.writers.pop(key, (None, None))
+        self.pending.append(self.pool.submit(self._finish_partition, key, path, writer, buffered))
+
+    def _finish_partition(self, key, path, writer, buffered):
+        remainder = pa.concat_tables(buffered) if buffered else None
+        if remainder is not None and remainder.num_rows:
+            if writer is None:
+                path, writer = self._open_writer(key)
+            writer.write_table(remainder, row_group_size=self.row_group_size)
+        if writer is None:
+            return None
+        writer.close()
+        entry = {'file': os.path.relpath(path, self.root), 'partition': {'year': key[0], 'country': key[1]}}
+        entry.update(file_stats(path))
+        return entry
+
+    def close(self):
+        """Flush and close every partition, then write the manifest"""
+        started = time.perf_counter()
+        for key in self._open_partitions():
+            self._close_partition(key)
+        self.files = sorted((entry for entry in (future.result() for future in self.pending) if entry),
+                            key=lambda entry: (entry['partition']['year'], entry['partition']['country']))
+        self.pool.shutdown()
+        manifest = {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'format': 'parquet',
+            'compression': self.compression,
+            'row_group_size': self.row_group_size,
+            'partitioning': PARTITION_COLUMNS,
+            'total_rows': self.rows,
+            'files': self.files,
+        }
+        with open(os.path.join(self.root, MANIFEST_NAME), 'w') as f:
+            # json.dumps uses the C encoder; json.dump(manifest, f) does not
+            f.write(json.dumps(manifest))
+        self.write_seconds += time.perf_counter() - started
+        return manifest
+
+    def report(self):
+        """Print the dataset size and write time"""
+        total_bytes = sum(os.path.getsize(os.path.join(self.root, entry['file'])) for entry in self.files)
+        print(f"🧱 Parquet dataset: {self.root} ({len(self.files):,} files, {self.rows:,} rows, "
+              f"{total_bytes / 1024 / 1024:,.1f} MB {self.compression})")
+        print(f"   Write time: {self.write_seconds:.2f}s, manifest: {os.path.join(self.root, MANIFEST_NAME)}")
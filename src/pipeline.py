@@ -0,0 +1,138 @@
+import queue
+import threading
+import time
+
+from sales_generator import iter_generated_batches
+
+_DONE = object()
+
+
+class BatchPipeline:
+    """Overlaps batch generation with the DuckDB writer through a bounded queue.
+
+    A producer thread generates batches (itself, or by driving the worker
+    pool when workers > 1) and puts them on a queue of `queue_size` batches;
+    iterating the pipeline inside its `with` block drains that queue on the
+    caller's thread, which stays the only DuckDB writer. A full queue blocks
+    the producer, so at most `queue_size` finished batches wait in memory.
+    Batches come out in plan order.
+
+    Time is split per stage: the producer is either generating or blocked on
+    a full queue, the writer either handling a batch or waiting on an empty
+    one. `report()` prints the resulting utilisation.
+
+    With queue_size=0 there is no producer thread: each batch is generated
+    on the caller's thread right before it is handed out, which is what a
+    StageProfiler needs to attribute time and allocations to one stage.
+    """
+
+    def __init__(self, plans, cities, workers=1, queue_size=4, profile=None, customers=None, profiler=None):
+        self.plans = plans
+        self.cities = cities
+        self.profile = profile
+        self.customers = customers
+        self.profiler = profiler
+        self.workers = workers
+        self.serial = queue_size == 0
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop = threading.Event()
+        self.stats = {
+            'generate_seconds': 0.0,
+            'producer_blocked_seconds': 0.0,
+            'write_seconds': 0.0,
+            'writer_wait_seconds': 0.0,
+            'batches': 0,
+        }
+
+    def _put(self, item):
+        started = time.perf_counter()
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.stats['producer_blocked_seconds'] += time.perf_counter() - started
+
+    def _produce(self):
+        batches = self._batches()
+        try:
+            while not self.stop.is_set():
+                started = time.perf_counter()
+                item = next(batches, _DONE)
+                self.stats['generate_seconds'] += time.perf_counter() - started
+                self._put(item)
+                if item is _DONE:
+                    break
+        except BaseException as exc:
+            self._put(exc)
+        finally:
+            batches.close()
+
+    def _batches(self):
+        return iter_generated_batches(self.plans, self.cities, self.workers, self.profile, self.customers,
+                                      self.profiler)
+
+    def __enter__(self):
+        if not self.serial:
+            self.producer = threading.Thread(target=self._produce, name='batch-producer', daemon=True)
+            self.producer.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        # Unblocks and stops the producer if the writer bailed out early
+        self.stop.set()
+        if not self.serial:
+            self.producer.join()
+
+    def __iter__(self):
+        if self.serial:
+            yield from self._iter_serial()
+            return
+        while True:
+            started = time.perf_counter()
+            item = self.queue.get()
+            self.stats['writer_wait_seconds'] += time.perf_counter() - started
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            started = time.perf_counter()
+            yield item
+            self.stats['write_seconds'] += time.perf_counter() - started
+            self.stats['batches'] += 1
+
+    def _iter_serial(self):
+        batches = self._batches()
+        try:
+            while True:
+                started = time.perf_counter()
+                item = next(batches, _DONE)
+                self.stats['generate_seconds'] += time.perf_counter() - started
+                if item is _DONE:
+                    return
+                started = time.perf_counter()
+                yield item
+                self.stats['write_seconds'] += time.perf_counter() - started
+                self.stats['batches'] += 1
+        finally:
+            batches.close()
+
+    def report(self):
+        """Print how busy each side of the pipeline was"""
+        stats = self.stats
+        if self.serial:
+            print(f"🔀 Pipeline: {stats['batches']} batches generated and written in turn")
+            print(f"   Generating {stats['generate_seconds']:.2f}s, writing {stats['write_seconds']:.2f}s")
+            return
+        producer_total = max(stats['generate_seconds'] + stats['producer_blocked_seconds'], 1e-9)
+        writer_total = max(stats['write_seconds'] + stats['writer_wait_seconds'], 1e-9)
+        generate = 100 * stats['generate_seconds'] / producer_total
+        write = 100 * stats['write_seconds'] / writer_total
+        print(f"🔀 Pipeline: {stats['batches']} batches through a {self.queue.maxsize}-batch queue")
+        print(f"   Producer: generating {generate:.0f}%, blocked on full queue {100 - generate:.0f}% "
+              f"({stats['generate_seconds']:.2f}s / {stats['producer_blocked_seconds']:.2f}s)")
+        print(f"   Writer:   inserting {write:.0f}%, waiting for batches {100 - write:.0f}% "
+              f"({stats['write_seconds']:.2f}s / {stats['writer_wait_seconds']:.2f}s)")
+        bottleneck = 'writer (DuckDB inserts)' if write >= generate else 'generation'
+        print(f"   Bottleneck: {bottleneck}")
@@ -0,0 +1,110 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+# Stages in pipeline order, for reports
+STAGES = ['sampling', 'row_assembly', 'arrow_build', 'insert', 'parquet', 'index_build', 'customer_summary']
+
+
+def stage_context(profiler, name):
+    """`profiler.stage(name)`, or a no-op context when not profiling"""
+    return profiler.stage(name) if profiler is not None else nullcontext()
+
+
+class StageProfiler:
+    """Wall time, CPU time and memory allocations per chunk and stage.
+
+    Code under measurement runs inside `with profiler.stage(name):` blocks;
+    `chunk` is the chunk the current work belongs to (None for whole-run
+    stages such as the index build). CPU time is process time, so it
+    includes DuckDB's own threads and can exceed wall time. Allocations
+    are traced with tracemalloc, which sees Python objects and NumPy
+    arrays but not DuckDB's internal buffers: `allocated_bytes` sums what
+    each call left allocated, `peak_bytes` is the largest rise during one
+    call. Stages must not nest, and the numbers are only per stage when
+    one thread does the work, so profiled runs generate serially.
+    """
+
+    def __init__(self):
+        self.chunk = None
+        self.stats = {}
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def start(self):
+        """Start tracing allocations and the whole-run clocks"""
+        tracemalloc.start()
+        self._started = (time.perf_counter(), time.process_time())
+        return self
+
+    def stop(self):
+        """Stop tracing and record the whole-run wall and CPU time"""
+        self.wall_seconds = time.perf_counter() - self._started[0]
+        self.cpu_seconds = time.process_time() - self._started[1]
+        tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            current, peak = tracemalloc.get_traced_memory()
+            entry = self.stats.setdefault((self.chunk, name), {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'allocated_bytes': 0, 'peak_bytes': 0,
+            })
+            entry['calls'] += 1
+            entry['wall_seconds'] += wall
+            entry['cpu_seconds'] += cpu
+            entry['allocated_bytes'] += current - before
+            entry['peak_bytes'] = max(entry['peak_bytes'], peak - before)
+
+    def totals(self):
+        """Stage totals over all chunks, in pipeline order"""
+        totals = {}
+        for (_, name), entry in self.stats.items():
+            total = totals.setdefault(name, dict.fromkeys(entry, 0))
+            for key, value in entry.items():
+                total[key] = max(total[key], value) if key == 'peak_bytes' else total[key] + value
+        return {name: totals[name] for name in sorted(totals, key=_stage_order)}
+
+    def summary(self, **run):
+        """Machine-readable summary: run details, whole-run and per-stage totals, and per-chunk stages"""
+        chunks = sorted({chunk for chunk, _ in self.stats if chunk is not None})
+        return {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'run': run,
+            'wall_seconds': self.wall_seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'stages': self.totals(),
+            'chunks': [{
+                'chunk': chunk,
+                'stages': {name: entry for (owner, name), entry in sorted(
+                    self.stats.items(), key=lambda item: _stage_order(item[0][1])) if owner == chunk},
+            } for chunk in chunks],
+        }
+
+    def write_json(self, path, **run):
+        """Write summary(**run) to `path`"""
+        summary = self.summary(**run)
+        with open(path, 'w') as f:
+            f.write(json.dumps(summary, indent=2))
+        return summary
+
+    def report(self):
+        """Print the per-stage totals"""
+        print(f"⏱️  Profile: {self.wall_seconds:.2f}s wall, {self.cpu_seconds:.2f}s CPU")
+        print(f"   {'Stage':<14}{'wall s':>9}{'CPU s':>9}{'alloc MB':>10}{'peak MB':>9}")
+        for name, entry in self.totals().items():
+            print(f"   {name:<14}{entry['wall_seconds']:>9.2f}{entry['cpu_seconds']:>9.2f}"
+                  f"{entry['allocated_bytes'] / 1024 / 1024:>10.1f}{entry['peak_bytes'] / 1024 / 1024:>9.1f}")
+
+
+def _stage_order(name):
+    return STAGES.index(name) if name in STAGES else len(STAGES)
@@ -0,0 +1,49 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+JSON = 'application/json'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+PARQUET = 'application/x-parquet'
+
+# OpenAPI `responses` entry for endpoints that also answer in the binary formats
+BINARY_RESPONSES = {200: {"content": {ARROW_STREAM: {}, PARQUET: {}}}}
+
+# Headers of every response whose format follows the Accept header, so caches key on it
+VARY_ACCEPT = {'Vary': 'Accept'}
+
+
+def negotiate(accept):
+    """Media type to answer an Accept header with: JSON, ARROW_STREAM or PARQUET.
+
+    Picks the supported type with the highest q-value; ties, wildcards,
+    unsupported types and a missing header all get JSON, the default.
+    """
+    best, best_q = JSON, 0.0
+    for entry in (accept or '').split(','):
+        media_type, *options = [part.strip() for part in entry.split(';')]
+        q = 1.0
+        for option in options:
+            name, _, value = option.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in (ARROW_STREAM, PARQUET) and q > best_q:
+            best, best_q = media_type, q
+        elif media_type in (JSON, 'application/*', '*/*') and q >= best_q:
+            best, best_q = JSON, q
+    return best
+
+
+def encode_table(table, media_type):
+    """Encode an Arrow table as an Arrow IPC stream or a zstd Parquet file, as bytes"""
+    sink = pa.BufferOutputStream()
+    if media_type == ARROW_STREAM:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif media_type == PARQUET:
+        pq.write_table(table, sink, compression='zstd')
+    else:
+        raise ValueError(f"Cannot encode a table as {media_type}")
+    return sink.getvalue().to_pybytes()
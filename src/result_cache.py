@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """LRU cache of encoded responses, keyed on a data version, capped in bytes.
+
+    Values are response bodies (bytes), so a hit returns without touching
+    the database or re-encoding anything. Keys are (version, ...) tuples
+    and versions must be ordered: the cache only moves forward, dropping
+    every entry the first time it sees a newer version, so a rebuilt
+    database never serves stale results. A request still reading an older
+    version (one that started before the rebuild) misses and its value is
+    not kept, rather than clearing the newer entries. Least recently used
+    entries are evicted while the total size is over `max_bytes`; values
+    larger than `max_bytes` are not kept.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.version = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, version, key):
+        """The cached value for (version, key), or None"""
+        full_key = (version, *key)
+        with self.lock:
+            self._advance(version)
+            value = self.entries.get(full_key)
+            if value is not None:
+                self.entries.move_to_end(full_key)
+                self.hits += 1
+                return value
+            self.misses += 1
+        return None
+
+    def put(self, version, key, value):
+        """Keep `value` under (version, key) unless a newer version has been seen; returns `value`.
+
+        Two concurrent misses both compute and put; the last one is kept.
+        """
+        full_key = (version, *key)
+        with self.lock:
+            self._advance(version)
+            if version != self.version or len(value) > self.max_bytes:
+                return value
+            previous = self.entries.pop(full_key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[full_key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+        return value
+
+    def _advance(self, version):
+        """Move to `version` if it is newer, dropping the older entries"""
+        if self.version is None or version > self.version:
+            self._clear()
+            self.version = version
+
+    def _clear(self):
+        self.evictions += len(self.entries)
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        """Entry count, bytes held and hit/miss/eviction counters"""
+        with self.lock:
+            return {
+                'version': self.version,
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,385 @@
+import multiprocessing
+import os
+import tempfile
+from collections import deque
+from functools import partial
+
+import numpy as np
+
+from customer_pool import CustomerPool
+from discount_calendar import DISCOUNT_PERCENTAGE, DISCOUNT_TRANSACTION, load_discount_calendar
+from profiler import stage_context
+from store_profile import load_store_profile
+
+# Static catalog shared by the vectorized and legacy generation engines
+GENDERS = [{"F": 0}, {"M": 1}]
+PRODUCTS = [
+    {'product_id': 100, 'product_name': 'iPhone 13', 'unit_price': 999.00},
+    {'product_id': 200, 'product_name': 'Samsung Galaxy S21', 'unit_price': 899.00},
+    {'product_id': 300, 'product_name': 'Google Pixel 6', 'unit_price': 599.00},
+    {'product_id': 400, 'product_name': 'OnePlus 9', 'unit_price': 729.00},
+    {'product_id': 500, 'product_name': 'Xiaomi Mi 11', 'unit_price': 749.00},
+    {'product_id': 600, 'product_name': 'Sony Xperia 5', 'unit_price': 899.00},
+    {'product_id': 700, 'product_name': 'Oppo Find X3', 'unit_price': 1149.00},
+    {'product_id': 800, 'product_name': 'Nokia 8.3', 'unit_price': 699.00},
+    {'product_id': 900, 'product_name': 'Realme GT', 'unit_price': 599.00},
+    {'product_id': 1000, 'product_name': 'Water', 'unit_price': 2.00},
+    {'product_id': 1100, 'product_name': 'Sparkling Water', 'unit_price': 2.50},
+    {'product_id': 1200, 'product_name': 'Iced Tea', 'unit_price': 3.00},
+    {'product_id': 1300, 'product_name': 'MacBook Pro', 'unit_price': 2399.00},
+    {'product_id': 1400, 'product_name': 'Dell XPS 13', 'unit_price': 1499.00},
+    {'product_id': 1500, 'product_name': 'HP Spectre x360', 'unit_price': 1699.00},
+    {'product_id': 1600, 'product_name': 'Lenovo ThinkPad X1', 'unit_price': 1899.00},
+    {'product_id': 1700, 'product_name': 'iPad Pro', 'unit_price': 1099.00},
+    {'product_id': 1800, 'product_name': 'Samsung Galaxy Tab S7', 'unit_price': 849.00},
+    {'product_id': 1900, 'product_name': 'Microsoft Surface Pro 7', 'unit_price': 999.00},
+    {'product_id': 2000, 'product_name': 'Amazon Kindle', 'unit_price': 89.00}
+]
+TRANSACTION_TYPES = [{'transaction_type_id': 100, 'transaction_type': 'Sales', 'transaction_desc': 'Product Sale'},
+                     {'transaction_type_id': 200, 'transaction_type': 'Refund', 'transaction_desc': 'Product Refund'},
+                     {'transaction_type_id': 300, 'transaction_type': 'Exchange', 'transaction_desc': 'Product Exchange'}
+                    ]
+# Only this transaction type is discounted on discount-calendar days
+DISCOUNTED_TRANSACTION_IDX = next(i for i, t in enumerate(TRANSACTION_TYPES)
+                                  if t['transaction_desc'] == DISCOUNT_TRANSACTION)
+
+# Column layout of the sales_data table, in insert order
+SALES_DATA_COLUMNS = [
+    ('date', 'TIMESTAMP'),
+    ('transaction_id', 'INTEGER'),
+    ('transaction_desc', 'INTEGER'),
+    ('customer_number', 'INTEGER'),
+    ('age', 'INTEGER'),
+    ('gender', 'INTEGER'),
+    ('receipt_number', 'INTEGER'),
+    ('product_id', 'INTEGER'),
+    ('product_name', 'INTEGER'),
+    ('units_sold', 'INTEGER'),
+    ('unit_price_sgd', 'DECIMAL(10,2)'),
+    ('total_amount_per_product_sgd', 'DECIMAL(10,2)'),
+    ('receipt_total_sgd', 'DECIMAL(10,2)'),
+    ('country_id', 'INTEGER'),
+    ('country', 'INTEGER'),
+    ('city', 'INTEGER'),
+    ('discount_period', 'INTEGER'),
+    ('discount_percentage', 'INTEGER'),
+    ('discount_applied', 'INTEGER'),
+]
+
+
+def sales_data_schema_sql(table_name='sales_data'):
+    """Build the CREATE TABLE statement for the sales_data layout"""
+    columns = ",\n        ".join(f"{name} {sql_type}" for name, sql_type in SALES_DATA_COLUMNS)
+    return f"CREATE TABLE {table_name} (\n        {columns}\n    )"
+
+
+def round_cents(values):
+    """Round amounts to 2 decimals with exactly the result of Python's round(x, 2).
+
+    np.round(x, 2) rounds x * 100, which is itself rounded, so a value just
+    below a half cent can come out a cent high. Away from half cents
+    rint(x * 100) / 100 is exact; the few values within a hair of one go
+    through round() itself.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 100
+    result = np.rint(scaled) / 100
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        result[near_half] = [round(value, 2) for value in values[near_half].tolist()]
+    return result
+
+
+def receipt_totals(row_receipt, amounts):
+    """Each row's receipt total, rounded like round(x, 2), for a whole batch at once.
+
+    `row_receipt` numbers every row's receipt from 0. The totals are one
+    segmented sum over the unrounded item amounts, broadcast back to the
+    rows. bincount adds each receipt's items one after another, as the
+    legacy loop's running total did; np.add.reduceat groups the additions
+    differently and changes the last bit of about one total in seven.
+    """
+    row_receipt = np.asarray(row_receipt)
+    return round_cents(np.bincount(row_receipt, weights=amounts))[row_receipt]
+
+
+def transaction_positions(profile):
+    """Map the profile's transaction types to their positions in TRANSACTION_TYPES"""
+    positions = {t['transaction_desc']: i for i, t in enumerate(TRANSACTION_TYPES)}
+    unknown = [desc for desc in profile.transaction_descs if desc not in positions]
+    if unknown:
+        raise ValueError(f"Unknown transaction types in store profile: {unknown}")
+    return np.array([positions[desc] for desc in profile.transaction_descs])
+
+
+def receipt_range(weekend, scale_factor=1, profile=None):
+    """Daily receipt count bounds [low, high) for weekend flags, scaled by `scale_factor`"""
+    low, high = (profile or load_store_profile()).receipt_range(weekend)
+    if scale_factor != 1:
+        low = np.maximum(1, np.rint(low * scale_factor)).astype(np.int64)
+        high = np.maximum(low + 1, np.rint(high * scale_factor)).astype(np.int64)
+    return low, high
+
+
+def draw_receipt_counts(rng, dates, scale_factor=1, profile=None):
+    """Draw the number of receipts for every day in one call, scaled by season and discount days"""
+    profile = profile or load_store_profile()
+    low, high = receipt_range(np.asarray(dates.weekday) >= 5, scale_factor, profile)
+    counts = rng.integers(low, high)
+    multiplier = load_discount_calendar().receipt_multiplier(dates) * profile.season_multiplier(dates)
+    return (counts * multiplier).astype(np.int64)
+
+
+def generate_rows(rng, dates, receipt_counts, customer_start, receipt_start, cities, profile=None,
+                  customers=None, profiler=None):
+    """Generate all sales_data columns for a block of days as NumPy arrays.
+
+    `cities` is a CityDimension; customers are assigned cities by code.
+    With a CustomerPool as `customers`, each receipt is made by a returning
+    customer drawn from the pool, with that customer's age, gender and home
+    city. Without one every receipt belongs to a new customer, matching the
+    legacy engine: customer and receipt numbers both advance by one per
+    receipt. Receipt numbers always start at `receipt_start`. Product
+    sales on discount-calendar days are sold at DISCOUNT_PERCENTAGE off;
+    extra keys for the star-schema layout are ignored by the flat one.
+    Ages, items per receipt, transaction types and hours are drawn from the
+    StoreProfile's alias tables (default: store_profile.json). All random
+    draws happen in the 'sampling' stage and the column arithmetic in
+    'row_assembly', as timed by an optional StageProfiler.
+    Returns the column dict and the number of receipts generated.
+    """
+    receipt_counts = np.asarray(receipt_counts, dtype=np.int64)
+    n_receipts = int(receipt_counts.sum())
+    receipt_day = np.repeat(np.arange(len(dates)), receipt_counts)
+
+    profile = profile or load_store_profile()
+    max_items = int(profile.items.values.max())
+    if max_items > len(PRODUCTS):
+        raise ValueError(f"items_per_receipt allows {max_items} items but there are {len(PRODUCTS)} products")
+
+    with stage_context(profiler, 'sampling'):
+        # Per-receipt (per-customer) attributes
+        if customers is None:
+            age_start = profile.ages.sample(rng, n_receipts)
+            age = rng.integers(age_start, np.minimum(age_start + profile.age_width, profile.max_age))
+            gender = rng.integers(0, len(GENDERS), size=n_receipts)
+            city_code = cities.sample(rng, n_receipts)
+            customer_number = customer_start + np.arange(n_receipts)
+        else:
+            receipt_dates = np.asarray(dates.values, dtype='datetime64[D]')[receipt_day]
+            pool_row = customers.sample(rng, receipt_dates)
+            age = customers.age_on(pool_row, receipt_dates)
+            gender = customers.gender[pool_row]
+            city_code = customers.city[pool_row]
+            customer_number = customers.numbers(pool_row)
+        transaction_idx = transaction_positions(profile)[profile.transactions.sample_index(rng, n_receipts)]
+        items = profile.items.sample(rng, n_receipts)
+
+        # Distinct products per receipt: random keys, ranked below
+        product_keys = rng.random((n_receipts, len(PRODUCTS)))
+        row_receipt = np.repeat(np.arange(n_receipts), items)
+        n_rows = len(row_receipt)
+
+        # Per-item draws
+        units_sold = rng.integers(1, 4, size=n_rows)  # 1-3 units per item
+        price_variation = rng.uniform(0.9, 1.1, size=n_rows)
+        # Hour-of-day curve from the profile (default: store hours 6 AM to 10 PM)
+        hour = profile.hours.sample(rng, n_rows)
+        minute = rng.integers(0, 60, size=n_rows)
+
+    with stage_context(profiler, 'row_assembly'):
+        # Keep the first `items` ranked products of each receipt
+        ranked = np.argsort(product_keys, axis=1)[:, :max_items]
+        receipt_offsets = np.cumsum(items) - items
+        position = np.arange(n_rows) - receipt_offsets[row_receipt]
+        product_idx = ranked[row_receipt, position]
+
+        # Per-item measures
+        base_price = np.array([p['unit_price'] for p in PRODUCTS])
+        unit_price = base_price[product_idx] * price_variation
+        row_day = receipt_day[row_receipt]
+        discount_key = load_discount_calendar().period_keys(dates)[row_day]
+        discounted = (discount_key > 0) & (transaction_idx[row_receipt] == DISCOUNTED_TRANSACTION_IDX)
+        unit_price = np.where(discounted, unit_price * (1 - DISCOUNT_PERCENTAGE / 100), unit_price)
+        total_amount = units_sold * unit_price
+        sold_at = (np.asarray(dates.values, dtype='datetime64[us]')[row_day]
+                   + ((hour * 60 + minute) * 60_000_000).astype('timedelta64[us]'))
+
+        product_ids = np.array([p['product_id'] for p in PRODUCTS])
+        transaction_ids = np.array([t['transaction_type_id'] for t in TRANSACTION_TYPES])
+
+        columns = {
+            'date': sold_at,
+            'transaction_id': transaction_ids[transaction_idx][row_receipt],
+            'transaction_desc': transaction_ids[transaction_idx][row_receipt],
+            'customer_number': customer_number[row_receipt],
+            'age': age[row_receipt],
+            'gender': gender[row_receipt],
+            'receipt_number': receipt_start + row_receipt,
+            'product_id': product_ids[product_idx],
+            'product_name': product_ids[product_idx],
+            'units_sold': units_sold,
+            'unit_price_sgd': round_cents(unit_price),
+            'total_amount_per_product_sgd': round_cents(total_amount),
+            'receipt_total_sgd': receipt_totals(row_receipt, total_amount),
+            'country_id': cities.country_id[city_code][row_receipt],
+            'country': cities.country_id[city_code][row_receipt],
+            'city': city_code[row_receipt],
+            'discount_period': np.where(discounted, discount_key, 0),
+            'discount_percentage': np.where(discounted, DISCOUNT_PERCENTAGE, 0),
+            'discount_applied': discounted.astype(np.int8),
+            # Dimension keys and timestamp used by the star-schema layout
+            'sold_at': sold_at,
+            'product_key': product_idx,
+            'city_key': city_code[row_receipt],
+            'transaction_type_key': transaction_idx[row_receipt],
+        }
+        # Rows leave in timestamp order so each row group covers a narrow time
+        # range and DuckDB's zone maps can skip it for date-bounded queries
+        order = np.argsort(sold_at, kind='stable')
+        return {name: values[order] for name, values in columns.items()}, n_receipts
+
+
+def split_receipts(receipt_counts, batch_receipts):
+    """Cut a run of days into batches of at most `batch_receipts` receipts.
+
+    Returns (day_indices, receipt_counts, first_receipt) per batch. A day
+    with more receipts than fit in one batch is spread over several batches,
+    so batch size, not daily volume, bounds the rows held in memory.
+    """
+    ends = np.cumsum(receipt_counts)
+    starts = ends - receipt_counts
+    total = int(ends[-1]) if len(ends) else 0
+    batches = []
+    for low in range(0, total, batch_receipts):
+        high = min(low + batch_receipts, total)
+        days = np.arange(np.searchsorted(ends, low, side='right'),
+                         np.searchsorted(ends, high - 1, side='right') + 1)
+        counts = np.minimum(ends[days], high) - np.maximum(starts[days], low)
+        batches.append((days, counts, low))
+    return batches
+
+
+def plan_chunks(full_range, chunks, seed=142, customer_start=100001, receipt_start=200001,
+                batch_rows=50000, scale_factor=1, profile=None):
+    """Split the date range into chunks and batches with their own seeds and ID ranges.
+
+    Each chunk gets a SeedSequence.spawn child, split again into a stream for
+    daily receipt counts and a parent for the batch seeds. Counts are drawn
+    here, up front, so every batch knows its days, its customer/receipt number
+    range and its seed before any work runs: batches can be generated in any
+    order and the output does not depend on how they are scheduled.
+    """
+    profile = profile or load_store_profile()
+    mean_items = profile.items.mean()
+    batch_receipts = max(1, int(batch_rows / mean_items))
+    total_days = len(full_range)
+    chunk_size = total_days // chunks
+    plans = []
+    for chunk_idx, chunk_seed in enumerate(np.random.SeedSequence(seed).spawn(chunks)):
+        start = chunk_idx * chunk_size
+        end = (chunk_idx + 1) * chunk_size if chunk_idx < chunks - 1 else total_days
+        dates = full_range[start:end]
+        counts_seed, rows_seed = chunk_seed.spawn(2)
+        receipt_counts = draw_receipt_counts(np.random.default_rng(counts_seed), dates, scale_factor, profile)
+        splits = split_receipts(receipt_counts, batch_receipts)
+        batches = []
+        for batch_idx, ((days, counts, first), batch_seed) in enumerate(zip(splits, rows_seed.spawn(len(splits)))):
+            n_receipts = int(counts.sum())
+            batches.append({
+                'chunk': chunk_idx,
+                'batch': batch_idx,
+                'last_batch': batch_idx == len(splits) - 1,
+                'dates': dates[days],
+                'receipt_counts': counts,
+                'seed': batch_seed,
+                'customer_start': customer_start + first,
+                'receipt_start': receipt_start + first,
+                'next_customer': customer_start + first + n_receipts,
+                'next_receipt': receipt_start + first + n_receipts,
+            })
+        plans.append({
+            'index': chunk_idx,
+            'dates': dates,
+            'receipt_counts': receipt_counts,
+            'customer_start': customer_start,
+            'receipt_start': receipt_start,
+            'batches': batches,
+        })
+        n_receipts = int(receipt_counts.sum())
+        customer_start += n_receipts
+        receipt_start += n_receipts
+    return plans
+
+
+def generate_batch(batch, cities, profile=None, customers=None, profiler=None):
+    """Generate the columns of one planned batch (runs inside worker processes)"""
+    if profiler is not None:
+        profiler.chunk = batch['chunk']
+    rng = np.random.default_rng(batch['seed'])
+    columns, _ = generate_rows(rng, batch['dates'], batch['receipt_counts'], batch['customer_start'],
+                               batch['receipt_start'], cities, profile, customers, profiler)
+    return columns
+
+
+# Shared inputs of a worker process, installed once by the pool initializer,
+# plus the customer pool of the plan it last worked on and that pool's path
+_worker_inputs = {}
+
+
+def _init_worker(**inputs):
+    _worker_inputs.update(inputs)
+
+
+def _generate_in_worker(batch, pool_path=None):
+    if pool_path is not None and _worker_inputs.get('pool_path') != pool_path:
+        _worker_inputs.update(customers=CustomerPool.load(pool_path), pool_path=pool_path)
+    customers = _worker_inputs.get('customers') if pool_path is not None else None
+    return generate_batch(batch, _worker_inputs['cities'], _worker_inputs['profile'], customers)
+
+
+def iter_generated_batches(plans, cities, workers=1, profile=None, customers=None, profiler=None):
+    """Yield (plan, batch, columns) in plan order, generating on a process pool when workers > 1.
+
+    At most 2 * workers batches are in flight, so memory stays bounded by the
+    batch size however large the run is. The cities and profile are sent to
+    each worker once. With CustomerSignups as `customers`, each plan's
+    customers are signed up just before its batches are scheduled; workers
+    read that plan's pool from a temporary file once each, not with every
+    batch. A profiler only sees work done in this process, so it requires
+    workers=1.
+    """
+    if workers <= 1:
+        for plan in plans:
+            pool = customers.pool_for(plan) if customers is not None else None
+            for batch in plan['batches']:
+                yield plan, batch, generate_batch(batch, cities, profile, pool, profiler)
+        return
+    if profiler is not None:
+        raise ValueError("Profiling requires workers=1")
+
+    # spawn keeps workers independent of the parent's open DuckDB connection
+    initializer = partial(_init_worker, cities=cities, profile=profile)
+    with tempfile.TemporaryDirectory(prefix='customer_pools_') as pool_dir, \
+            multiprocessing.get_context('spawn').Pool(workers, initializer=initializer) as pool:
+        pending = deque()
+
+        def finished():
+            plan, batch, result, pool_path = pending.popleft()
+            columns = result.get()
+            if batch['last_batch'] and pool_path is not None:
+                # Every batch of the plan is done; workers keep their loaded copy
+                os.remove(pool_path)
+            return plan, batch, columns
+
+        for plan in plans:
+            pool_path = None
+            if customers is not None:
+                pool_path = os.path.join(pool_dir, f"chunk_{plan['index']}.npz")
+                customers.pool_for(plan).save(pool_path)
+            for batch in plan['batches']:
+                pending.append((plan, batch, pool.apply_async(_generate_in_worker, (batch, pool_path)), pool_path))
+                if len(pending) >= 2 * workers:
+                    yield finished()
+        while pending:
+            yield finished()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Compare the per-row pydantic path with the columnar JSON path of the API's list endpoints.
+
+For each endpoint query this times the old way (DataFrame, iterrows, one
+model per row, FastAPI-style encoding) against fetch_json_rows/json_array,
+checks both produce the same JSON, and prints the medians:
+
+    python serialization_benchmark.py [db_path] [--repeat 5]
+"""
+import argparse
+import json
+import time
+from typing import List
+
+import duckdb
+from pydantic import TypeAdapter
+
+from app import Customer, CustomerSummary, ProductSales, Sale, sale_rows_sql
+from json_rows import fetch_json_rows, json_array
+
+BENCHMARKS = {
+    '/sales/ (1000 rows)': (Sale, sale_rows_sql("""
+        SELECT * FROM sales_data
+        ORDER BY date DESC, receipt_number DESC, product_id DESC
+        LIMIT 1000
+    """)),
+    '/customers/': (Customer, """
+        SELECT DISTINCT customer_number, age, country
+        FROM sales_data
+        ORDER BY customer_number
+    """),
+    '/customers/summary/': (CustomerSummary, """
+        SELECT customer_number, age, country,
+               COUNT(*) as total_sales, SUM(total_amount_per_product_sgd) as total_amount
+        FROM sales_data
+        GROUP BY customer_number, age, country
+        ORDER BY customer_number
+    """),
+    '/products/': (ProductSales, """
+        SELECT product_id, product_name,
+               SUM(units_sold) as total_units_sold,
+               SUM(total_amount_per_product_sgd) as total_revenue,
+               AVG(unit_price_sgd) as avg_price
+        FROM sales_data
+        GROUP BY product_id, product_name
+        ORDER BY total_revenue DESC
+    """),
+}
+
+
+def per_row_json(con, model, query):
+    """The previous path: one pydantic model per DataFrame row, encoded like a JSONResponse"""
+    df = con.execute(query).df()
+    fields = model.model_fields
+    rows = [model(**{name: field.annotation(row[name]) for name, field in fields.items()})
+            for _, row in df.iterrows()]
+    content = TypeAdapter(List[model]).dump_python(rows, mode='json')
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+def columnar_json(con, model, query):
+    """The new path: DuckDB encodes each row, Arrow joins them into one array"""
+    return json_array(fetch_json_rows(con, model, query))
+
+
+def _median_seconds(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return sorted(times)[repeat // 2], result
+
+
+def run_benchmark(db_path, repeat=5):
+    """Time both paths per endpoint; returns {endpoint: {'rows', 'per_row_s', 'columnar_s', 'bytes'}}"""
+    results = {}
+    with duckdb.connect(db_path, read_only=True) as con:
+        for endpoint, (model, query) in BENCHMARKS.items():
+            old_seconds, old = _median_seconds(lambda: per_row_json(con, model, query), repeat)
+            new_seconds, new = _median_seconds(lambda: columnar_json(con, model, query), repeat)
+            old_rows, new_rows = json.loads(old), json.loads(new)
+            if old_rows != new_rows:
+                raise AssertionError(f"{endpoint}: columnar JSON differs from the per-row JSON")
+            results[endpoint] = {
+                'rows': len(new_rows), 'per_row_s': old_seconds, 'columnar_s': new_seconds, 'bytes': len(new),
+            }
+    return results
+
+
+def print_benchmark(results):
+    print(f"{'Endpoint':<22}{'rows':>10}{'per-row s':>12}{'columnar s':>12}{'speedup':>9}")
+    for endpoint, result in results.items():
+        speedup = result['per_row_s'] / max(result['columnar_s'], 1e-9)
+        print(f"{endpoint:<22}{result['rows']:>10,}{result['per_row_s']:>12.3f}"
+              f"{result['columnar_s']:>12.3f}{speedup:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API list serialization paths")
+    parser.add_argument('db_path', nargs='?', default='sales_timeseries.db')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print_benchmark(run_benchmark(args.db_path, args.repeat))
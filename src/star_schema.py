@@ -0,0 +1,143 @@
+import pyarrow as pa
+
+from discount_calendar import DAY_NAMES, DISCOUNT_TRANSACTION, MONTH_NAMES
+from sales_generator import PRODUCTS, TRANSACTION_TYPES
+
+# Narrow fact table: dimension keys, measures and the transaction timestamp
+SALES_FACT_COLUMNS = [
+    ('sold_at', 'TIMESTAMP'),
+    ('customer_number', 'INTEGER'),
+    ('receipt_number', 'INTEGER'),
+    ('age', 'UTINYINT'),
+    ('gender', 'UTINYINT'),
+    ('product_key', 'UTINYINT'),
+    ('city_key', 'USMALLINT'),
+    ('transaction_type_key', 'UTINYINT'),
+    ('units_sold', 'UTINYINT'),
+    ('unit_price_sgd', 'DECIMAL(10,2)'),
+    ('total_amount_per_product_sgd', 'DECIMAL(10,2)'),
+    ('receipt_total_sgd', 'DECIMAL(10,2)'),
+]
+
+# Calendar attributes of a timestamp, as the sales_data columns the reports
+# and the API's Sale rows expect; `{column}` is the timestamp expression
+CALENDAR_COLUMNS = [
+    ('day_of_week', "CAST(isodow({column}) - 1 AS INTEGER)"),
+    ('month', "CAST(month({column}) AS INTEGER)"),
+    ('hour', "CAST(hour({column}) AS INTEGER)"),
+    ('year', "CAST(year({column}) AS INTEGER)"),
+    ('day_of_week_text', f"{DAY_NAMES}[isodow({{column}})]"),
+    ('month_text', f"{MONTH_NAMES}[month({{column}})]"),
+    ('day_of_week_sin', "sin(2 * pi() * (isodow({column}) - 1) / 7)"),
+    ('day_of_week_cos', "cos(2 * pi() * (isodow({column}) - 1) / 7)"),
+    ('month_sin', "sin(2 * pi() * month({column}) / 12)"),
+    ('month_cos', "cos(2 * pi() * month({column}) / 12)"),
+    ('hour_sin', "sin(2 * pi() * hour({column}) / 24)"),
+    ('hour_cos', "cos(2 * pi() * hour({column}) / 24)"),
+]
+
+
+def calendar_columns_sql(column):
+    """SELECT list of the CALENDAR_COLUMNS derived from the timestamp `column`"""
+    return ',\n    '.join(f"{expression.format(column=column)} AS {name}" for name, expression in CALENDAR_COLUMNS)
+
+
+# Compatibility view exposing the original wide sales_data column names and
+# types (text labels, DOUBLE amounts) that the reports were written against.
+# Calendar attributes are derived from sold_at rather than joined from
+# dim_calendar: DuckDB only evaluates them when a query selects them. The
+# discount columns come from the discount calendar, joined on the sale day,
+# instead of being stored on every fact row.
+SALES_DATA_VIEW_SQL = """
+CREATE OR REPLACE VIEW sales_data AS
+SELECT
+    f.sold_at AS date,
+    t.transaction_type AS transaction_id,
+    t.transaction_desc,
+    f.customer_number,
+    f.age,
+    CASE f.gender WHEN 1 THEN 'M' ELSE 'F' END AS gender,
+    f.receipt_number,
+    CAST(p.product_id AS VARCHAR) AS product_id,
+    p.product_name,
+    f.units_sold,
+    CAST(f.unit_price_sgd AS DOUBLE) AS unit_price_sgd,
+    CAST(f.total_amount_per_product_sgd AS DOUBLE) AS total_amount_per_product_sgd,
+    CAST(f.receipt_total_sgd AS DOUBLE) AS receipt_total_sgd,
+    c.country_id,
+    c.country,
+    c.city,
+    CASE WHEN t.transaction_desc = '{discount_transaction}' THEN d.discount_period END AS discount_period,
+    CAST(CASE WHEN t.transaction_desc = '{discount_transaction}' THEN d.discount_percentage ELSE 0 END
+         AS INTEGER) AS discount_percentage,
+    COALESCE(t.transaction_desc = '{discount_transaction}' AND d.discount_period IS NOT NULL, false)
+        AS discount_applied,
+    {calendar_columns}
+FROM sales_fact f
+JOIN dim_product p ON p.product_key = f.product_key
+JOIN dim_city c ON c.city_key = f.city_key
+JOIN dim_transaction_type t ON t.transaction_type_key = f.transaction_type_key
+LEFT JOIN dim_calendar d ON d.calendar_date = CAST(f.sold_at AS DATE)
+""".format(calendar_columns=calendar_columns_sql('f.sold_at'), discount_transaction=DISCOUNT_TRANSACTION)
+
+
+def fact_schema_sql(table_name='sales_fact'):
+    """Build the CREATE TABLE statement for the narrow fact table"""
+    columns = ",\n        ".join(f"{name} {sql_type}" for name, sql_type in SALES_FACT_COLUMNS)
+    return f"CREATE TABLE {table_name} (\n        {columns}\n    )"
+
+
+def existing_layout(con):
+    """Return 'star' or 'flat' for an existing database, or None if it has no sales data"""
+    tables = {row[0] for row in con.execute("SELECT table_name FROM information_schema.tables").fetchall()}
+    if 'sales_fact' in tables:
+        return 'star'
+    if 'sales_data' in tables:
+        return 'flat'
+    return None
+
+
+def drop_sales_objects(con):
+    """Drop sales_data (table or view), the star-schema tables and customer_summary"""
+    existing = dict(con.execute("""
+        SELECT table_name, table_type FROM information_schema.tables
+        WHERE table_name = 'sales_data'
+    """).fetchall())
+    if existing.get('sales_data') == 'VIEW':
+        con.execute("DROP VIEW sales_data")
+    con.execute("DROP TABLE IF EXISTS sales_data")
+    for table in ('sales_fact', 'dim_product', 'dim_city', 'dim_transaction_type', 'dim_calendar', 'dim_customer',
+                  'customer_summary'):
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def create_star_schema(con, cities):
+    """Create the fact table and load the product, city and transaction-type dimensions"""
+    dim_product = pa.table({
+        'product_key': pa.array(range(len(PRODUCTS)), pa.uint8()),
+        'product_id': [p['product_id'] for p in PRODUCTS],
+        'product_name': [p['product_name'] for p in PRODUCTS],
+        'unit_price': [p['unit_price'] for p in PRODUCTS],
+    })
+    dim_city = pa.table({
+        'city_key': pa.array(cities.code, pa.uint16()),
+        'city': cities.name,
+        'country_id': cities.country_id,
+        'country': cities.country,
+    })
+    dim_transaction_type = pa.table({
+        'transaction_type_key': pa.array(range(len(TRANSACTION_TYPES)), pa.uint8()),
+        'transaction_type_id': [t['transaction_type_id'] for t in TRANSACTION_TYPES],
+        'transaction_type': [t['transaction_type'] for t in TRANSACTION_TYPES],
+        'transaction_desc': [t['transaction_desc'] for t in TRANSACTION_TYPES],
+    })
+
+    con.from_arrow(dim_product).create('dim_product')
+    con.from_arrow(dim_city).create('dim_city')
+    con.from_arrow(dim_transaction_type).create('dim_transaction_type')
+    con.execute(fact_schema_sql())
+
+
+def create_sales_data_view(con):
+    """Create the sales_data compatibility view over the star schema"""
+    con.execute(SALES_DATA_VIEW_SQL)
@@ -0,0 +1,134 @@
+import json
+import os
+from functools import cache
+
+import numpy as np
+import pandas as pd
+
+from discount_calendar import MONTH_NAMES
+
+PROFILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'store_profile.json')
+
+
+class AliasTable:
+    """Discrete distribution compiled for O(1) draws (Vose's alias method).
+
+    Each of the n slots holds a probability and an alias: a draw picks a
+    slot uniformly and keeps it with that probability, else takes its
+    alias. Building the table is O(n) once; a draw costs one uniform number
+    and two array lookups however many values there are, where
+    `rng.choice(p=...)` rebuilds and searches a CDF on every call.
+    """
+
+    def __init__(self, values, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) == 0 or len(weights) != len(values):
+            raise ValueError("A distribution needs one weight per value")
+        if (weights < 0).any() or weights.sum() <= 0:
+            raise ValueError("Distribution weights must be non-negative and not all zero")
+        self.values = np.asarray(values)
+        self.weights = weights
+        self.probabilities = weights / weights.sum()
+
+        n = len(weights)
+        scaled = self.probabilities * n
+        self.accept = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            low, high = small.pop(), large.pop()
+            self.accept[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+        # Leftovers are 1 up to rounding error and keep their own slot
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample_index(self, rng, size):
+        """Draw `size` positions into `values`"""
+        # One uniform per draw: the integer part picks the slot, the rest is the coin
+        scaled = rng.random(size) * len(self)
+        slot = np.minimum(scaled.astype(np.int64), len(self) - 1)
+        return np.where(scaled - slot < self.accept[slot], slot, self.alias[slot])
+
+    def sample(self, rng, size):
+        """Draw `size` values"""
+        return self.values[self.sample_index(rng, size)]
+
+    def mean(self):
+        """Expected value of a draw"""
+        return float(np.dot(self.values, self.weights) / self.weights.sum())
+
+
+class StoreProfile:
+    """The generator's distributions, read from a store profile JSON file.
+
+    Daily receipt volume is a uniform [low, high) range for weekdays and
+    weekends, multiplied by the month's `seasonality` factor. Hour of day,
+    age band, items per receipt and transaction type are discrete
+    distributions (weights need not sum to 1), each compiled once into an
+    AliasTable. `customers` sizes the repeat-customer pool: one customer
+    signs up per `receipts_per_customer` receipts (times the run's scale
+    factor, see CustomerSignups), stays active for
+    `active_years`, and has a Zipf-like popularity with exponent
+    `popularity_exponent` (see CustomerPool). `config` keeps the parsed file so a run can record the
+    exact profile it used.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config.get('name', 'custom')
+        volume = config['receipts_per_day']
+        self.weekday_receipts = tuple(int(bound) for bound in volume['weekday'])
+        self.weekend_receipts = tuple(int(bound) for bound in volume['weekend'])
+        for low, high in (self.weekday_receipts, self.weekend_receipts):
+            if not 0 <= low < high:
+                raise ValueError(f"receipts_per_day needs 0 <= low < high, got [{low}, {high}]")
+        seasonality = config.get('seasonality', {})
+        self.seasonality = np.array([float(seasonality.get(month, 1.0)) for month in MONTH_NAMES])
+        if (self.seasonality < 0).any():
+            raise ValueError("seasonality factors must be non-negative")
+
+        self.hours = AliasTable(**config['hour_of_day'])
+        if self.hours.values.min() < 0 or self.hours.values.max() > 23:
+            raise ValueError("hour_of_day values must be hours 0-23")
+        ages = config['age_bands']
+        self.ages = AliasTable(ages['values'], ages['weights'])
+        self.age_width = int(ages.get('width', 10))
+        self.max_age = int(ages.get('max_age', 80))
+        if self.ages.values.max() >= self.max_age:
+            raise ValueError("age_bands values must start below max_age")
+        self.items = AliasTable(**config['items_per_receipt'])
+        if self.items.values.min() < 1:
+            raise ValueError("items_per_receipt values must be at least 1")
+        customers = config.get('customers', {})
+        self.receipts_per_customer = float(customers.get('receipts_per_customer', 10))
+        self.active_years = float(customers.get('active_years', 25))
+        self.popularity_exponent = float(customers.get('popularity_exponent', 0.5))
+        if self.receipts_per_customer < 1 or self.active_years <= 0 or not 0 <= self.popularity_exponent < 1:
+            raise ValueError("customers needs receipts_per_customer >= 1, active_years > 0 "
+                             "and 0 <= popularity_exponent < 1")
+        # Sorted, so a profile round-tripped through sorted-key JSON samples the same way
+        self.transaction_descs = sorted(config['transaction_types'])
+        self.transactions = AliasTable(np.arange(len(self.transaction_descs)),
+                                       [config['transaction_types'][desc] for desc in self.transaction_descs])
+
+    def receipt_range(self, weekend):
+        """Daily receipt count bounds [low, high) for weekend flags"""
+        low = np.where(weekend, self.weekend_receipts[0], self.weekday_receipts[0])
+        high = np.where(weekend, self.weekend_receipts[1], self.weekday_receipts[1])
+        return low, high
+
+    def season_multiplier(self, dates):
+        """Seasonality factor of each date's month"""
+        return self.seasonality[np.asarray(pd.DatetimeIndex(dates).month) - 1]
+
+
+@cache
+def load_store_profile(path=PROFILE_PATH):
+    """Parse a store profile once per process and compile its alias tables"""
+    with open(path) as f:
+        return StoreProfile(json.load(f))
@@ -0,0 +1,424 @@
+import csv
+import io
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+
+import anyio
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from datetime import datetime
+from fastapi.testclient import TestClient
+
+from app import main
+from city_dimension import load_city_dimension
+from connection_pool import CursorPool, PoolTimeout
+from discount_calendar import DAY_NAMES, MONTH_NAMES
+from main import generate_initial_data
+from response_formats import ARROW_STREAM, JSON, PARQUET, negotiate
+from result_cache import ResultCache
+from serialization_benchmark import run_benchmark
+
+
+@pytest.fixture(scope='module')
+def db_path(tmp_path_factory):
+    # The API reads the decoded sales_data view of the star layout
+    path = str(tmp_path_factory.mktemp('api') / 'api.db')
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-03-31', db_path=path, layout='star')
+    return path
+
+
+@pytest.fixture(scope='module')
+def flat_db_path(tmp_path_factory):
+    # The generator's default layout: one wide sales_data table without the calendar columns
+    path = str(tmp_path_factory.mktemp('api_flat') / 'flat.db')
+    generate_initial_data(chunks=1, start_date='2024-01-01', end_date='2024-01-31', db_path=path)
+    return path
+
+
+def test_requests_share_pooled_cursors(db_path):
+    """Requests borrow cursors from the pool opened at startup and give them back"""
+    with duckdb.connect(db_path, read_only=True) as con:
+        receipts = [row[0] for row in con.execute(
+            "SELECT DISTINCT receipt_number FROM sales_data ORDER BY receipt_number LIMIT 5").fetchall()]
+
+    with TestClient(main(db_path, pool_size=2)) as client:
+        for receipt_number in receipts:
+            response = client.get(f"/receipts/{receipt_number}")
+            assert response.status_code == 200
+            assert response.json()['receipt_number'] == receipt_number
+        assert client.get("/summary/").status_code == 200
+
+        stats = client.get("/health/pool").json()
+        assert stats['size'] == 2
+        assert stats['available'] == 2
+        assert stats['acquired'] == len(receipts) + 1
+        assert stats['timeouts'] == 0
+        assert 0 <= stats['median_wait_ms'] <= stats['max_wait_ms']
+
+
+def test_pool_is_bounded(db_path):
+    """With every cursor lent out, a borrower times out and the wait is counted"""
+    with CursorPool(db_path, size=1, timeout=0.05) as pool:
+        with pool.cursor() as cursor:
+            assert cursor.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0] > 0
+            with pytest.raises(PoolTimeout):
+                with pool.cursor():
+                    pass
+        with pool.cursor():
+            pass
+        stats = pool.stats()
+        assert stats['acquired'] == 2
+        assert stats['timeouts'] == 1
+        assert stats['available'] == 1
+
+
+def test_sales_cursor_pages_match_offset_pages(db_path):
+    """Following next_cursor visits the same rows as offset paging, in a total order"""
+    with TestClient(main(db_path)) as client:
+        by_offset, by_cursor = [], []
+        cursor = None
+        for page in range(1, 4):
+            offset_page = client.get("/sales/", params={'page': page, 'page_size': 7, 'start_date': '2024-02-01'})
+            params = {'page_size': 7, 'start_date': '2024-02-01', 'include_total': False}
+            if cursor:
+                params['cursor'] = cursor
+            cursor_page = client.get("/sales/", params=params).json()
+            by_offset += offset_page.json()['sales']
+            by_cursor += cursor_page['sales']
+            assert cursor_page['total_records'] is None
+            cursor = cursor_page['next_cursor']
+        assert by_cursor == by_offset
+        keys = [(sale['date'], sale['receipt_number'], sale['product_id']) for sale in by_cursor]
+        assert keys == sorted(keys, reverse=True) and len(set(keys)) == len(keys)
+
+        with duckdb.connect(db_path, read_only=True) as con:
+            expected = con.execute("SELECT COUNT(*) FROM sales_data WHERE date >= '2024-02-01'").fetchone()[0]
+        assert offset_page.json()['total_records'] == expected
+
+        last = client.get("/sales/", params={'page_size': 1000, 'start_date': '2024-03-31'}).json()
+        assert len(last['sales']) < 1000 and last['next_cursor'] is None
+        assert client.get("/sales/", params={'cursor': 'not-a-cursor'}).status_code == 400
+
+
+def test_columnar_json_matches_per_row_models(db_path):
+    """List endpoints encode in DuckDB but keep the JSON and OpenAPI schema of their models"""
+    results = run_benchmark(db_path, repeat=1)  # raises if the two paths disagree
+    assert all(result['rows'] > 0 for result in results.values())
+
+    paths = main(db_path).openapi()['paths']
+    for path, model in [('/customers/', 'Customer'), ('/customers/summary/', 'CustomerSummary'),
+                        ('/products/', 'ProductSales')]:
+        schema = paths[path]['get']['responses']['200']['content']['application/json']['schema']
+        assert schema['items']['$ref'] == f'#/components/schemas/{model}'
+    schema = paths['/sales/']['get']['responses']['200']['content']['application/json']['schema']
+    assert schema['$ref'] == '#/components/schemas/SalesResponse'
+
+
+def test_sales_export_streams_all_matching_rows(db_path):
+    """/sales/export streams every filtered row as NDJSON or CSV, the same rows /sales/ pages through"""
+    params = {'start_date': '2024-03-01', 'min_age': 30}
+    with duckdb.connect(db_path, read_only=True) as con:
+        expected = con.execute(
+            "SELECT COUNT(*) FROM sales_data WHERE date >= '2024-03-01' AND age >= 30").fetchone()[0]
+
+    with TestClient(main(db_path)) as client:
+        response = client.get("/sales/export", params=params)
+        assert response.headers['content-type'] == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert len(rows) == expected > 1000
+        page = client.get("/sales/", params={**params, 'page_size': 5}).json()['sales']
+        assert all(sale in rows for sale in page)
+
+        response = client.get("/sales/export", params={**params, 'format': 'csv'})
+        assert response.headers['content-type'].startswith('text/csv')
+        csv_rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(csv_rows) == expected
+        assert list(csv_rows[0]) == list(rows[0])
+        assert {int(row['receipt_number']) for row in csv_rows} == {row['receipt_number'] for row in rows}
+
+        empty = client.get("/sales/export", params={'format': 'csv', 'start_date': '2030-01-01'})
+        assert empty.text.splitlines() == [','.join(f'"{name}"' for name in rows[0])]
+        assert client.get("/sales/export", params={'format': 'xml'}).status_code == 422
+
+
+def test_sales_on_flat_layout(db_path, flat_db_path):
+    """/sales/ and /sales/export serve the flat layout too, deriving the calendar fields like the star view"""
+    params = {'start_date': '2024-01-10', 'end_date': '2024-01-12', 'page_size': 1000}
+    with TestClient(main(flat_db_path)) as client:
+        response = client.get("/sales/", params=params)
+        assert response.status_code == 200
+        page = response.json()['sales']
+        assert len(page) == response.json()['total_records'] > 0
+        export = client.get("/sales/export", params=params)
+        assert export.status_code == 200
+        exported = [json.loads(line) for line in export.text.splitlines()]
+        assert sorted(map(json.dumps, page)) == sorted(map(json.dumps, exported))
+        arrow = client.get("/sales/", params=params, headers={'Accept': ARROW_STREAM})
+        assert pa.ipc.open_stream(arrow.content).read_all().column_names == list(page[0])
+
+    with TestClient(main(db_path)) as client:
+        star_page = client.get("/sales/", params=params).json()['sales']
+    assert list(page[0]) == list(star_page[0])
+    for sale in page:
+        timestamp = datetime.fromisoformat(sale['date'])
+        assert (sale['day_of_week'], sale['month'], sale['hour'], sale['year']) == (
+            timestamp.weekday(), timestamp.month, timestamp.hour, timestamp.year)
+        assert (sale['day_of_week_text'], sale['month_text']) == (
+            DAY_NAMES[timestamp.weekday()], MONTH_NAMES[timestamp.month - 1])
+        assert sale['hour_sin'] == pytest.approx(math.sin(2 * math.pi * timestamp.hour / 24))
+
+
+def test_streams_fail_before_the_response_starts(db_path):
+    """A stream that cannot get a cursor is a 503, not an empty 200, and a finished stream returns its cursor"""
+    with TestClient(main(db_path, pool_size=1, pool_timeout=0.05)) as client:
+        pool = client.app.state.db_pool
+        with pool.cursor():
+            assert client.get("/sales/export").status_code == 503
+            assert client.get("/customers/summary/", params={'stream': True}).status_code == 503
+            # Looking up customer_summary at a new data version needs a cursor too
+            assert client.get("/customers/").status_code == 503
+            assert client.get("/customers/100001").status_code == 503
+        assert client.get("/sales/export", params={'start_date': '2024-03-31'}).status_code == 200
+        assert client.get("/customers/", params={'stream': True}).status_code == 200
+        assert pool.stats()['available'] == 1
+
+
+def hold_stream(client, path):
+    """Start a GET of `path` whose client stops reading at the first chunk until `release` is set, then leaves.
+
+    TestClient reads a whole streamed body before returning, so the request
+    is sent to the app directly. Returns (started, release, finished).
+    """
+    started, release = threading.Event(), threading.Event()
+    requested = []
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await anyio.to_thread.run_sync(release.wait)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.body' and message.get('body'):
+            started.set()
+            await anyio.to_thread.run_sync(release.wait)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '', 'headers': [],
+             'client': ('testclient', 50000), 'server': ('testserver', 80)}
+    finished = client.portal.start_task_soon(client.app, scope, receive, send)
+    return started, release, finished
+
+
+def test_slow_streams_leave_cursors_for_other_requests(db_path):
+    """Streams beyond stream_limit get a 503 while other endpoints still get cursors; a gone client frees its slot"""
+    with TestClient(main(db_path, pool_size=3, pool_timeout=0.05, stream_limit=1)) as client:
+        started, release, finished = hold_stream(client, "/sales/export")
+        try:
+            assert started.wait(10)
+            assert client.get("/health/pool").json()['streams_active'] == 1
+            response = client.get("/sales/export")
+            assert response.status_code == 503
+            assert 'streams busy' in response.json()['detail']
+            assert client.get("/summary/").status_code == 200
+        finally:
+            release.set()
+        finished.result(timeout=10)
+        # Released when the client leaves, not when the generator is collected
+        stats = client.get("/health/pool").json()
+        assert stats['streams_active'] == 0
+        assert stats['available'] == 3
+        assert client.get("/sales/export", params={'start_date': '2024-03-31'}).status_code == 200
+
+
+def test_sales_and_products_negotiate_arrow_and_parquet(db_path):
+    """Accept picks an Arrow IPC stream or Parquet body with the same rows as the JSON default"""
+    assert negotiate(None) == negotiate('*/*') == negotiate('text/html') == JSON
+    assert negotiate(f'{ARROW_STREAM}') == ARROW_STREAM
+    assert negotiate(f'{JSON}, {PARQUET}') == JSON
+    assert negotiate(f'{JSON};q=0.5, {PARQUET};q=0.9') == PARQUET
+
+    params = {'page_size': 20, 'start_date': '2024-02-01'}
+    with TestClient(main(db_path)) as client:
+        json_response = client.get("/sales/", params=params)
+        page = json_response.json()
+        response = client.get("/sales/", params=params, headers={'Accept': ARROW_STREAM})
+        assert response.headers['content-type'] == ARROW_STREAM
+        # Caches must key both bodies on the Accept header
+        assert json_response.headers['vary'] == response.headers['vary'] == 'Accept'
+        assert client.get("/sales/", params={'cursor': 'bad'}).headers['vary'] == 'Accept'
+        assert response.headers['x-next-cursor'] == page['next_cursor']
+        assert int(response.headers['x-total-records']) == page['total_records']
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column_names == list(page['sales'][0])
+        assert table.column('receipt_number').to_pylist() == [sale['receipt_number'] for sale in page['sales']]
+        assert [str(value) for value in table.column('date').to_pylist()] == [sale['date'] for sale in page['sales']]
+
+        json_response = client.get("/products/")
+        products = json_response.json()
+        response = client.get("/products/", headers={'Accept': PARQUET})
+        assert response.headers['content-type'] == PARQUET
+        assert json_response.headers['vary'] == response.headers['vary'] == 'Accept'
+        table = pq.read_table(io.BytesIO(response.content))
+        assert table.to_pylist() == products
+
+
+def test_aggregates_cached_until_database_rebuilt(db_path, tmp_path):
+    """Aggregate endpoints are answered from the cache until the database file is replaced"""
+    live_path = str(tmp_path / 'live.db')
+    shutil.copy(db_path, live_path)
+    with TestClient(main(live_path)) as client:
+        first = client.get("/summary/").json()
+        assert client.get("/summary/").json() == first
+        client.get("/analytics/age-groups/")
+        client.get("/products/")
+        client.get("/products/", headers={'Accept': PARQUET})
+        stats = client.get("/health/cache").json()
+        assert (stats['entries'], stats['hits'], stats['misses']) == (4, 1, 4)
+
+        # Rebuild: a different database replaces the file while the app runs
+        rebuilt_path = str(tmp_path / 'rebuilt.db')
+        generate_initial_data(chunks=1, start_date='2024-01-01', end_date='2024-01-31', db_path=rebuilt_path,
+                              layout='star')
+        os.replace(rebuilt_path, live_path)
+        second = client.get("/summary/").json()
+        assert second['total_records'] < first['total_records']
+        assert second['date_range_end'].startswith('2024-01-31')
+        stats = client.get("/health/cache").json()
+        assert (stats['entries'], stats['misses']) == (1, 5)
+        assert client.get("/health/pool").json()['reopened'] == 1
+        assert client.get("/sales/", params={'page_size': 1}).json()['total_records'] == second['total_records']
+
+
+def test_result_cache_never_goes_back_a_version(db_path, tmp_path):
+    """A body computed on a cursor from before a rebuild neither clears nor joins the newer entries"""
+    live_path = str(tmp_path / 'live.db')
+    shutil.copy(db_path, live_path)
+    cache = ResultCache()
+    with CursorPool(live_path, size=2) as pool:
+        with pool.versioned_cursor() as (old_version, con):
+            old_count = con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
+            rebuilt_path = str(tmp_path / 'rebuilt.db')
+            generate_initial_data(chunks=1, start_date='2024-01-01', end_date='2024-01-31', db_path=rebuilt_path)
+            os.replace(rebuilt_path, live_path)
+            pool.refresh()
+            assert pool.version_key > old_version
+            with pool.versioned_cursor() as (new_version, new_con):
+                assert new_version == pool.version_key
+                new_count = new_con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0]
+            cache.put(new_version, ('count',), str(new_count).encode())
+            # The slow request on the old cursor finishes last
+            assert cache.get(old_version, ('count',)) is None
+            cache.put(old_version, ('count',), str(old_count).encode())
+    assert cache.get(new_version, ('count',)) == str(new_count).encode()
+    stats = cache.stats()
+    assert (stats['entries'], stats['evictions']) == (1, 0)
+
+
+def test_append_while_api_serves_database(db_path, tmp_path):
+    """An append from another process replaces the file the API holds open, and the API reopens on it"""
+    live_path = str(tmp_path / 'live.db')
+    shutil.copy(db_path, live_path)
+    append = f"from main import append_sales; append_sales(db_path={live_path!r}, end_date='2024-04-30', chunks=1{{}})"
+
+    def run_append(options=''):
+        return subprocess.run([sys.executable, '-c', append.format(options)], cwd=os.path.dirname(__file__),
+                              capture_output=True, text=True, check=False)
+
+    with TestClient(main(live_path)) as client:
+        before = client.get("/summary/").json()
+        # In place, the append cannot take the lock held by the API's read-only attach
+        in_place = run_append(', in_place=True')
+        assert in_place.returncode != 0 and 'lock' in in_place.stderr
+        assert run_append().returncode == 0
+        after = client.get("/summary/").json()
+        assert client.get("/health/pool").json()['reopened'] == 1
+    assert after['total_records'] > before['total_records']
+    assert after['date_range_end'].startswith('2024-04-30')
+    assert not os.path.exists(f"{live_path}.append")
+
+
+def test_customer_listings_page_and_stream(db_path):
+    """Customer listings page by cursor with filters, and stream the same rows as NDJSON"""
+    filters = {'min_age': 30, 'max_age': 50}
+    with duckdb.connect(db_path, read_only=True) as con:
+        expected = con.execute("""
+            SELECT customer_number, age, country, COUNT(*), SUM(total_amount_per_product_sgd)
+            FROM sales_data WHERE age BETWEEN 30 AND 50
+            GROUP BY ALL ORDER BY customer_number, age, country
+        """).fetchall()
+        country = con.execute("SELECT country FROM sales_data LIMIT 1").fetchone()[0]
+
+    with TestClient(main(db_path)) as client:
+        pages, cursor = [], None
+        while True:
+            params = {**filters, 'page_size': 40, **({'cursor': cursor} if cursor else {})}
+            response = client.get("/customers/summary/", params=params)
+            pages += response.json()
+            cursor = response.headers.get('x-next-cursor')
+            if cursor is None:
+                break
+        assert [(row['customer_number'], row['age'], row['country'], row['total_sales']) for row in pages] == \
+            [row[:4] for row in expected]
+        assert [row['total_amount'] for row in pages] == pytest.approx([float(row[4]) for row in expected])
+
+        streamed = client.get("/customers/summary/", params={**filters, 'stream': True})
+        assert streamed.headers['content-type'] == 'application/x-ndjson'
+        streamed_rows = [json.loads(line) for line in streamed.text.splitlines()]
+        # Float sums may differ in the last digit between runs of the aggregate
+        assert [{**row, 'total_amount': pytest.approx(row['total_amount'])} for row in streamed_rows] == pages
+
+        customers = client.get("/customers/", params={'country': country, 'page_size': 10000}).json()
+        assert customers and all(customer['country'] == country for customer in customers)
+        assert client.get("/customers/", params={'cursor': 'bad'}).status_code == 400
+
+
+def test_customer_endpoints_match_without_summary_table(db_path, tmp_path):
+    """customer_summary answers the customer endpoints exactly as the sales_data aggregates do"""
+    fallback_path = str(tmp_path / 'no_summary.db')
+    shutil.copy(db_path, fallback_path)
+    with duckdb.connect(fallback_path) as con:
+        con.execute("DROP TABLE customer_summary")
+        numbers = [row[0] for row in con.execute("""
+            SELECT customer_number FROM sales_data GROUP BY ALL ORDER BY COUNT(*) DESC, customer_number LIMIT 3
+        """).fetchall()]
+
+    def responses(path):
+        with TestClient(main(path)) as client:
+            history = [client.get(f"/customers/{number}").json() for number in numbers]
+            listing = client.get("/customers/summary/", params={'page_size': 10000}).json()
+            customers = client.get("/customers/", params={'page_size': 10000}).json()
+            assert client.get("/customers/1").status_code == 404
+        return history, listing, customers
+
+    history, listing, customers = responses(db_path)
+    expected_history, expected_listing, expected_customers = responses(fallback_path)
+    assert customers == expected_customers
+    assert [{**row, 'total_amount': pytest.approx(row['total_amount'])} for row in listing] == expected_listing
+    for summary, expected in zip(history, expected_history):
+        recent, expected_recent = summary.pop('recent_purchases'), expected.pop('recent_purchases')
+        assert {**summary, 'total_spent': pytest.approx(summary['total_spent'])} == expected
+        # Items sold at the same minute may come in either order
+        assert [item['date'] for item in recent] == [item['date'] for item in expected_recent]
+        assert len(recent) == 10
+
+
+def test_country_filter_on_both_layouts(db_path, flat_db_path):
+    """?country= takes a name whether the database stores names (star) or country_ids (flat)"""
+    flat_path = flat_db_path
+    singapore = [str(country_id) for country_id in load_city_dimension().country_ids_named('Singapore')]
+    for path, stored in ((db_path, ['Singapore']), (flat_path, singapore)):
+        with TestClient(main(path)) as client:
+            customers = client.get("/customers/", params={'country': 'Singapore', 'page_size': 10000}).json()
+            summary = client.get("/customers/summary/", params={'country': 'Singapore', 'stream': True})
+            assert customers and {customer['country'] for customer in customers} <= set(stored)
+            assert len(summary.text.splitlines()) == len(customers)
+            assert client.get("/customers/", params={'country': 'Atlantis'}).json() == []
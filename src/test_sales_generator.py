@@ -0,0 +1,612 @@
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from arrow_sink import ArrowSink
+from city_dimension import load_city_dimension
+from customer_pool import CustomerSignups
+from customer_summary import summary_sql
+from date_range import date_range_filter, day_filter
+from discount_calendar import DISCOUNT_PERIODS, load_discount_calendar
+from index_report import compare_indexes, create_indexes
+import main
+from main import append_sales, generate_initial_data, resume_generation
+from pipeline import BatchPipeline
+from sales_generator import (
+    SALES_DATA_COLUMNS, draw_receipt_counts, generate_rows, plan_chunks, receipt_totals, round_cents, split_receipts,
+)
+from store_profile import PROFILE_PATH, AliasTable, load_store_profile
+
+
+def test_vectorized_rows():
+    """Vectorized engine produces consistent receipts for a block of days"""
+    cities = load_city_dimension()
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(start='2024-01-01', end='2024-01-14', freq='D')
+
+    counts = draw_receipt_counts(rng, dates)
+    columns, n_receipts = generate_rows(rng, dates, counts, 100001, 200001, cities)
+    df = pd.DataFrame(columns)
+
+    assert n_receipts == counts.sum()
+    assert df['receipt_number'].nunique() == n_receipts
+    assert df['age'].between(18, 79).all()
+    assert df['units_sold'].between(1, 3).all()
+    # Products are distinct within a receipt
+    assert not df.duplicated(['receipt_number', 'product_id']).any()
+    # Receipt totals agree with their line items
+    sums = df.groupby('receipt_number')['total_amount_per_product_sgd'].sum()
+    totals = df.groupby('receipt_number')['receipt_total_sgd'].first()
+    assert np.allclose(sums, totals, atol=0.05)
+    # Country follows the customer's city
+    assert (cities.country_id[df['city']] == df['country']).all()
+
+
+def test_alias_tables_follow_store_profile(tmp_path):
+    """Alias-table draws match their weights; a custom profile reshapes the generated data"""
+    table = AliasTable([10, 20, 30, 40], [0.4, 0.3, 0.2, 0.1])
+    draws = table.sample(np.random.default_rng(3), 200_000)
+    shares = [(draws == value).mean() for value in (10, 20, 30, 40)]
+    assert np.allclose(shares, [0.4, 0.3, 0.2, 0.1], atol=0.005)
+    assert table.mean() == pytest.approx(20.0)
+
+    with open(PROFILE_PATH) as f:
+        config = json.load(f)
+    config['seasonality']['FEB'] = 0
+    config['hour_of_day'] = {'values': [9, 17], 'weights': [3, 1]}
+    config['items_per_receipt'] = {'values': [2], 'weights': [1]}
+    config['transaction_types'] = {'Product Sale': 1}
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(config))
+    profile = load_store_profile(str(path))
+
+    rng = np.random.default_rng(7)
+    dates = pd.date_range(start='2024-01-30', end='2024-03-02', freq='D')
+    counts = draw_receipt_counts(rng, dates, profile=profile)
+    assert (counts[dates.month == 2] == 0).all() and (counts[dates.month != 2] > 0).all()
+    columns, n_receipts = generate_rows(rng, dates, counts, 100001, 200001, load_city_dimension(), profile)
+    df = pd.DataFrame(columns)
+    assert len(df) == 2 * n_receipts
+    assert set(df['date'].dt.hour) == {9, 17}
+    assert (df['date'].dt.hour == 9).mean() > 0.6
+    assert (df['transaction_id'] == 100).all()
+
+
+def test_receipt_totals_match_legacy_rounding():
+    """Bulk receipt totals equal the legacy running sum rounded with round(x, 2), bit for bit"""
+    rng = np.random.default_rng(11)
+    items = rng.integers(1, 5, size=20_000)
+    amounts = rng.integers(1, 4, size=items.sum()) * rng.uniform(1.8, 2640, size=items.sum())
+    amounts[::7] *= 0.5
+    row_receipt = np.repeat(np.arange(len(items)), items)
+
+    expected = []
+    offset = 0
+    for count in items:
+        receipt_total = 0
+        for amount in amounts[offset:offset + count].tolist():
+            receipt_total += amount
+        expected.extend([round(receipt_total, 2)] * count)
+        offset += count
+    assert receipt_totals(row_receipt, amounts).tolist() == expected
+
+    # Values just below a half cent, exact binary ties and plain random amounts
+    values = np.concatenate([[2.675, 1.005, 0.125, 0.375, 6110.495, 2695.045, 0.0],
+                             np.round(rng.uniform(0, 20000, 100_000), 3), rng.uniform(0, 20000, 100_000)])
+    assert round_cents(values).tolist() == [round(value, 2) for value in values.tolist()]
+
+
+def test_scale_factor_batches_stay_bounded():
+    """Scaled runs multiply daily volume but keep every batch within the batch size"""
+    dates = pd.date_range(start='2024-01-01', end='2024-01-31', freq='D')
+    base = plan_chunks(dates, 1)[0]
+    scaled = plan_chunks(dates, 1, batch_rows=10000, scale_factor=100)[0]
+
+    assert 90 * base['receipt_counts'].sum() < scaled['receipt_counts'].sum()
+    assert all(batch['receipt_counts'].sum() <= 5000 for batch in scaled['batches'])
+    # Batches tile the receipt numbers without gaps, splitting busy days
+    starts = [batch['receipt_start'] for batch in scaled['batches']]
+    ends = [batch['next_receipt'] for batch in scaled['batches']]
+    assert starts[1:] == ends[:-1]
+    assert ends[-1] - starts[0] == scaled['receipt_counts'].sum()
+
+    days, counts, first = split_receipts(np.array([3, 10, 2]), 4)[1]
+    assert list(days) == [1] and list(counts) == [4] and first == 4
+
+
+def test_discount_calendar_matches_per_date_rules():
+    """The precomputed calendar gives the same period as main_backup.py's per-date loop"""
+    def get_discount_periods(year):
+        nov_1 = datetime(year, 11, 1)
+        black_friday = nov_1 + timedelta(days=(4 - nov_1.weekday()) % 7, weeks=3)
+        return {
+            'BLACKFRIDAY': (black_friday, black_friday),
+            'CYBERMONDAY': (black_friday + timedelta(days=3), black_friday + timedelta(days=3)),
+            'NEWYEAR': (datetime(year - 1, 12, 26), datetime(year, 1, 2)),
+            'CHRISTMAS': (datetime(year, 12, 1), datetime(year, 12, 26)),
+        }
+
+    def is_discount_period(date, discount_periods):
+        for period_name, (start_date, end_date) in discount_periods.items():
+            if start_date <= date <= end_date:
+                return period_name
+        return None
+
+    calendar = load_discount_calendar()
+    frame = calendar.to_frame()
+    assert frame['calendar_date'].iloc[0].isoformat() == '1900-01-01'
+    assert frame['calendar_date'].iloc[-1].isoformat() == '2100-12-31'
+
+    periods = {year: get_discount_periods(year) for year in range(1900, 2101)}
+    expected = [is_discount_period(date.to_pydatetime(), periods[date.year]) for date in calendar.dates]
+    labels = [None if key == 0 else DISCOUNT_PERIODS[key - 1] for key in calendar.discount_key]
+    assert labels == expected
+    assert [p if isinstance(p, str) else None for p in frame['discount_period']] == expected
+
+
+def test_discounts_applied_to_product_sales(tmp_path):
+    """Product sales on discount days are half price and days are busier"""
+    db_path = str(tmp_path / "discounts.db")
+    generate_initial_data(chunks=1, start_date='2023-11-01', end_date='2023-12-31', db_path=db_path, layout='star')
+    with duckdb.connect(db_path, read_only=True) as con:
+        applied = con.execute("""
+            SELECT DISTINCT transaction_desc, discount_period, discount_percentage FROM sales_data
+            WHERE discount_applied ORDER BY discount_period
+        """).fetchall()
+        assert applied == [('Product Sale', 'BLACKFRIDAY', 50), ('Product Sale', 'CHRISTMAS', 50),
+                           ('Product Sale', 'CYBERMONDAY', 50)]
+        # Catalogue price within +-10%, halved on discount days
+        ratio = con.execute("""
+            SELECT MAX(s.unit_price_sgd / p.unit_price) FROM sales_data s
+            JOIN dim_product p ON CAST(p.product_id AS VARCHAR) = s.product_id
+            WHERE s.discount_applied
+        """).fetchone()[0]
+        assert ratio <= 0.551
+        busy = con.execute("""
+            SELECT AVG(receipts) FILTER (WHERE discount), AVG(receipts) FILTER (WHERE NOT discount)
+            FROM (SELECT CAST(s.date AS DATE) AS day, COUNT(DISTINCT receipt_number) AS receipts,
+                         bool_or(c.discount_period IS NOT NULL) AS discount
+                  FROM sales_data s JOIN dim_calendar c ON c.calendar_date = CAST(s.date AS DATE)
+                  GROUP BY 1)
+        """).fetchone()
+        assert busy[0] > 1.3 * busy[1]
+
+
+def test_city_dimension_decoding():
+    """City dimension decodes codes back to names, in NumPy and through DuckDB"""
+    cities = load_city_dimension()
+    assert load_city_dimension() is cities
+    assert cities.city_names([0])[0] == 'New York'
+    assert list(cities.country_names([99002, 99001])) == ['Japan', 'United States']
+
+    with duckdb.connect() as con:
+        cities.register(con)
+        name = con.execute("SELECT country FROM city_dim WHERE country_id = 99003").fetchone()[0]
+        assert name == 'France'
+
+
+def test_engines_share_schema(tmp_path):
+    """Both engines write the same sales_data schema"""
+    schemas = {}
+    for engine in ('vectorized', 'legacy'):
+        db_path = str(tmp_path / f"{engine}.db")
+        generate_initial_data(chunks=2, engine=engine, start_date='2024-01-01',
+                              end_date='2024-01-10', db_path=db_path)
+        with duckdb.connect(db_path, read_only=True) as con:
+            schemas[engine] = con.execute("DESCRIBE sales_data").fetchall()
+            assert con.execute("SELECT COUNT(*) FROM sales_data").fetchone()[0] > 0
+
+    assert schemas['vectorized'] == schemas['legacy']
+    assert [row[0] for row in schemas['vectorized']] == [name for name, _ in SALES_DATA_COLUMNS]
+
+
+def test_output_independent_of_workers(tmp_path):
+    """Parallel generation writes byte-identical rows for any worker count"""
+    tables = {}
+    for workers in (1, 3):
+        db_path = str(tmp_path / f"workers_{workers}.db")
+        generate_initial_data(chunks=4, start_date='2024-01-01', end_date='2024-02-29',
+                              db_path=db_path, workers=workers)
+        with duckdb.connect(db_path, read_only=True) as con:
+            tables[workers] = (con.execute("SELECT * FROM sales_data").fetchall(),
+                               con.execute("SELECT * FROM dim_customer ORDER BY customer_number").fetchall())
+
+    assert tables[1] == tables[3]
+
+
+def test_star_layout_matches_flat(tmp_path):
+    """Star layout stores the same sales behind a sales_data compatibility view"""
+    totals = {}
+    for layout in ('flat', 'star'):
+        db_path = str(tmp_path / f"{layout}.db")
+        generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-01-31',
+                              db_path=db_path, layout=layout)
+        with duckdb.connect(db_path, read_only=True) as con:
+            totals[layout] = con.execute("""
+                SELECT COUNT(*), SUM(total_amount_per_product_sgd), COUNT(DISTINCT receipt_number)
+                FROM sales_data
+            """).fetchone()
+            if layout == 'star':
+                columns = [row[0] for row in con.execute("DESCRIBE sales_data").fetchall()]
+                assert {'day_of_week_text', 'month_text', 'hour', 'year', 'hour_sin'} <= set(columns)
+                labels = con.execute("""
+                    SELECT DISTINCT day_of_week_text FROM sales_data
+                    WHERE transaction_desc = 'Product Sale' AND DATE(date) = '2024-01-01'
+                """).fetchall()
+                assert labels == [('MON',)]
+
+    assert totals['flat'][0] == totals['star'][0]
+    assert round(float(totals['flat'][1]), 2) == round(float(totals['star'][1]), 2)
+    assert totals['flat'][2] == totals['star'][2]
+
+
+def test_append_extends_to_new_end_date(tmp_path):
+    """Append mode only generates the missing days and continues the numbering"""
+    for layout in ('flat', 'star'):
+        db_path = str(tmp_path / f"append_{layout}.db")
+        generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-01-20',
+                              db_path=db_path, layout=layout)
+        with duckdb.connect(db_path, read_only=True) as con:
+            before = con.execute("SELECT COUNT(*), MAX(receipt_number) FROM sales_data").fetchone()
+
+        append_sales(chunks=2, end_date='2024-01-31', db_path=db_path)
+        append_sales(chunks=2, end_date='2024-01-31', db_path=db_path)
+
+        with duckdb.connect(db_path, read_only=True) as con:
+            count, min_receipt, max_receipt, receipts = con.execute("""
+                SELECT COUNT(*), MIN(receipt_number), MAX(receipt_number), COUNT(DISTINCT receipt_number)
+                FROM sales_data
+            """).fetchone()
+            new_first = con.execute(f"""
+                SELECT MIN(receipt_number) FROM sales_data WHERE receipt_number > {before[1]}
+            """).fetchone()[0]
+            last_day = con.execute("SELECT CAST(MAX(date) AS VARCHAR) FROM sales_data").fetchone()[0]
+
+        assert count > before[0]
+        assert new_first == before[1] + 1
+        assert receipts == max_receipt - min_receipt + 1
+        assert last_day.replace('-', '').startswith('20240131')
+
+
+def test_append_uses_the_store_profile_the_database_was_built_with(tmp_path):
+    """An append draws with the recorded profile and refuses a different one"""
+    with open(PROFILE_PATH) as f:
+        config = json.load(f)
+    config['hour_of_day'] = {'values': [9], 'weights': [1]}
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(config))
+    db_path = str(tmp_path / "profile.db")
+    generate_initial_data(chunks=1, start_date='2024-01-01', end_date='2024-01-10', db_path=db_path,
+                          store_profile=str(path))
+
+    with pytest.raises(ValueError, match="different store profile"):
+        append_sales(chunks=1, end_date='2024-01-20', db_path=db_path, store_profile=PROFILE_PATH)
+    append_sales(chunks=1, end_date='2024-01-20', db_path=db_path)
+    append_sales(chunks=1, end_date='2024-01-25', db_path=db_path, store_profile=str(path))
+    with duckdb.connect(db_path, read_only=True) as con:
+        hours = con.execute("SELECT DISTINCT hour(date) FROM sales_data WHERE date >= '2024-01-11'").fetchall()
+    assert hours == [(9,)]
+
+
+def test_command_line_refuses_options_a_mode_ignores(capsys):
+    """Options --append or --resume would drop are errors, as is --in-place without --append"""
+    assert main.parse_args(['--append', '--end-date', '2025-01-01', '--in-place']).in_place
+    assert main.parse_args(['--resume', '--no-indexes', '--workers', '2']).indexes is False
+    assert main.parse_args(['--layout', 'star', '--parquet-dir', 'dataset']).layout == 'star'
+    for argv, refused in [(['--append', '--layout', 'flat'], '--layout'),
+                          (['--append', '--parquet=dataset', '--no-indexes'], '--parquet-dir, --no-indexes'),
+                          (['--append', '--engine', 'legacy'], '--engine'),
+                          (['--resume', '--chunks', '4'], '--chunks'),
+                          (['--in-place'], '--in-place')]:
+        with pytest.raises(SystemExit):
+            main.parse_args(argv)
+        assert f"{refused} cannot be used with" in capsys.readouterr().err
+
+
+def test_customer_summary_refreshed_on_append(tmp_path):
+    """An append folds its sales into customer_summary, matching a summary built from scratch"""
+    db_path = str(tmp_path / "summary.db")
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-01-20', db_path=db_path, layout='star')
+    append_sales(chunks=2, end_date='2024-02-10', db_path=db_path)
+
+    columns = """customer_number, total_transactions, ROUND(total_spent, 6), total_receipts, first_purchase,
+                 last_purchase, [item.date FOR item IN recent_purchases],
+                 [(entry.age, entry.country, entry.total_sales, ROUND(entry.total_amount, 6)) FOR entry IN ages]"""
+    with duckdb.connect(db_path, read_only=True) as con:
+        refreshed = con.execute(f"SELECT {columns} FROM customer_summary ORDER BY customer_number").fetchall()
+        rebuilt = con.execute(f"SELECT {columns} FROM ({summary_sql()}) ORDER BY customer_number").fetchall()
+        returning = con.execute("""
+            SELECT COUNT(*) FROM customer_summary
+            WHERE first_purchase < TIMESTAMP '2024-01-21' AND last_purchase >= TIMESTAMP '2024-01-21'
+        """).fetchone()[0]
+    assert refreshed == rebuilt
+    assert returning > 0
+
+
+def test_repeat_customers_come_from_pool(tmp_path):
+    """Receipts are made by returning pool customers with stable attributes, across appends"""
+    db_path = str(tmp_path / "customers.db")
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-06-30', db_path=db_path)
+    with duckdb.connect(db_path, read_only=True) as con:
+        customers, receipts, pool_size = con.execute("""
+            SELECT COUNT(DISTINCT customer_number), COUNT(DISTINCT receipt_number),
+                   (SELECT COUNT(*) FROM dim_customer)
+            FROM sales_data
+        """).fetchone()
+        # Gender and home city never change; nobody shops before signing up
+        mismatches = con.execute("""
+            SELECT COUNT(*) FROM sales_data s JOIN dim_customer c USING (customer_number)
+            WHERE s.gender != c.gender OR s.city != c.city_key OR CAST(s.date AS DATE) < c.signup_date
+        """).fetchone()[0]
+    assert customers < receipts / 3
+    assert customers <= pool_size
+    assert mismatches == 0
+
+    append_sales(chunks=2, end_date='2024-07-31', db_path=db_path)
+    with duckdb.connect(db_path, read_only=True) as con:
+        returning, new_pool = con.execute("""
+            SELECT COUNT(DISTINCT customer_number) FILTER (WHERE customer_number < 100001 + ?),
+                   (SELECT COUNT(*) FROM dim_customer)
+            FROM sales_data WHERE date >= TIMESTAMP '2024-07-01'
+        """, [pool_size]).fetchone()
+    assert returning > 0
+    assert new_pool > pool_size
+
+
+def test_customer_pool_keeps_only_active_customers():
+    """Chunk by chunk, the pool drops customers past their active years and keeps everyone else"""
+    profile = load_store_profile()
+    plans = plan_chunks(pd.date_range('1900-01-01', '1959-12-31'), chunks=12, profile=profile)
+    customers = CustomerSignups(len(plans), load_city_dimension(), profile, 142, 100001)
+    signed_up = 0
+    for plan in plans:
+        pool = customers.pool_for(plan)
+        signed_up += customers.signups.pop(plan['index']).num_rows
+        assert pool.next_number == 100001 + signed_up
+        first_day = np.datetime64(plan['dates'][0].date(), 'D')
+        # The oldest customer kept is still active on the first day
+        assert pool.signup_day[0] > first_day - pool.active_days
+    assert len(pool) < signed_up / 2
+
+
+# Signs up the customers of a 1900-2025 run at the scale factor given as argv[1] and
+# prints the largest pool and the peak RSS in KiB
+_SIGNUP_RSS_SCRIPT = """
+import json, resource, sys
+import pandas as pd
+from city_dimension import load_city_dimension
+from customer_pool import CustomerSignups
+from sales_generator import plan_chunks
+from store_profile import load_store_profile
+scale_factor = float(sys.argv[1])
+profile = load_store_profile()
+plans = plan_chunks(pd.date_range('1900-01-01', '2025-09-02'), 10, batch_rows=10**9, scale_factor=scale_factor,
+                    profile=profile)
+customers = CustomerSignups(len(plans), load_city_dimension(), profile, 142, 100001, scale_factor=scale_factor)
+largest = 0
+for plan in plans:
+    largest = max(largest, len(customers.pool_for(plan)))
+    customers.signups.pop(plan['index'], None)
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps([largest, peak // 1024 if sys.platform == 'darwin' else peak]))
+"""
+
+
+def test_customer_pool_memory_independent_of_scale_factor():
+    """Scaling the volume makes customers shop more often, so the pool and peak RSS stay flat"""
+    pytest.importorskip('resource')
+    measured = {}
+    for scale_factor in (1, 100):
+        result = subprocess.run([sys.executable, '-c', _SIGNUP_RSS_SCRIPT, str(scale_factor)],
+                                cwd=os.path.dirname(__file__), capture_output=True, text=True, check=True)
+        measured[scale_factor] = json.loads(result.stdout.splitlines()[-1])
+    (small_pool, small_rss), (large_pool, large_rss) = measured[1], measured[100]
+    assert large_pool < small_pool * 1.05
+    # Unscaled, 100x the customers would take about 700 MB more
+    assert large_rss - small_rss < 50 * 1024
+
+
+def test_resume_after_interrupted_rebuild(tmp_path, monkeypatch):
+    """An interrupted rebuild resumed from its checkpoint matches an uninterrupted one"""
+    options = dict(chunks=3, start_date='2024-01-01', end_date='2024-03-31', batch_rows=2000)
+    reference = str(tmp_path / "reference.db")
+    generate_initial_data(db_path=reference, **options)
+
+    # Two batches per chunk: fail the second batch of the second chunk before it commits
+    record_batch = main.record_batch
+
+    def failing_record_batch(con, plan, batch, rows):
+        if (plan['index'], batch['batch']) == (1, 1):
+            raise KeyboardInterrupt
+        record_batch(con, plan, batch, rows)
+
+    db_path = str(tmp_path / "resumed.db")
+    monkeypatch.setattr(main, 'record_batch', failing_record_batch)
+    with pytest.raises(KeyboardInterrupt):
+        generate_initial_data(db_path=db_path, **options)
+    monkeypatch.setattr(main, 'record_batch', record_batch)
+
+    with duckdb.connect(db_path, read_only=True) as con:
+        done = con.execute("""
+            SELECT chunk_index, batches_committed, completed FROM generation_checkpoint ORDER BY chunk_index
+        """).fetchall()
+    assert done[0][2] and not done[1][2] and done[1][1] > 0 and done[2][1] == 0
+
+    resume_generation(db_path=db_path)
+
+    query = "SELECT * FROM sales_data ORDER BY receipt_number, product_id"
+    customers = "SELECT * FROM dim_customer ORDER BY customer_number"
+    with duckdb.connect(reference, read_only=True) as con:
+        expected = con.execute(query).fetchall()
+        expected_customers = con.execute(customers).fetchall()
+    with duckdb.connect(db_path, read_only=True) as con:
+        assert con.execute(query).fetchall() == expected
+        assert con.execute(customers).fetchall() == expected_customers
+        assert con.execute("SELECT bool_and(completed) FROM generation_checkpoint").fetchone()[0]
+
+
+def test_pipeline_keeps_order_and_stops_early():
+    """The bounded pipeline yields batches in plan order and shuts down if the writer stops"""
+    cities = load_city_dimension()
+    plans = plan_chunks(pd.date_range(start='2024-01-01', end='2024-02-29', freq='D'), 3, batch_rows=1000)
+
+    pipeline = BatchPipeline(plans, cities, queue_size=2)
+    with pipeline:
+        seen = [(plan['index'], batch['batch']) for plan, batch, _ in pipeline]
+    assert seen == [(plan['index'], batch['batch']) for plan in plans for batch in plan['batches']]
+    assert pipeline.stats['batches'] == len(seen)
+
+    pipeline = BatchPipeline(plans, cities, queue_size=1)
+    with pipeline:
+        for _ in pipeline:
+            break
+    assert not pipeline.producer.is_alive()
+
+
+def test_timestamp_dates_sorted_and_range_filter(tmp_path):
+    """Rows are stored as TIMESTAMPs with the days in order; the range helper selects whole days"""
+    db_path = str(tmp_path / "dates.db")
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-03-31', db_path=db_path,
+                          batch_rows=3000)
+    with duckdb.connect(db_path, read_only=True) as con:
+        assert dict((row[0], row[1]) for row in con.execute("DESCRIBE sales_data").fetchall())['date'] == 'TIMESTAMP'
+        days = [row[0] for row in con.execute("SELECT CAST(date AS DATE) FROM sales_data").fetchall()]
+        assert days == sorted(days)
+
+        conditions, params = date_range_filter('2024-01-31', '2024-02-01')
+        count = con.execute(f"SELECT COUNT(*) FROM sales_data WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+        expected = con.execute("""
+            SELECT COUNT(*) FROM sales_data WHERE CAST(date AS DATE) BETWEEN '2024-01-31' AND '2024-02-01'
+        """).fetchone()[0]
+        assert count == expected > 0
+
+        conditions, params = day_filter('2024-03-31')
+        last_day = con.execute(f"SELECT COUNT(*) FROM sales_data WHERE {' AND '.join(conditions)}", params).fetchone()[0]
+        assert last_day > 0
+
+
+def test_index_report_without_indexes(tmp_path):
+    """--no-indexes leaves sales_data unindexed; the report builds them in a copy"""
+    db_path = str(tmp_path / "no_indexes.db")
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-03-31', db_path=db_path,
+                          layout='star', indexes=False)
+    with duckdb.connect(db_path) as con:
+        assert con.execute("SELECT COUNT(*) FROM duckdb_indexes()").fetchone()[0] == 0
+        report = compare_indexes(con, db_path, 'star', keep_indexes=False, samples=5)
+        # The copy was indexed, the database itself was not
+        assert con.execute("SELECT COUNT(*) FROM duckdb_indexes()").fetchone()[0] == 0
+        assert set(report['index_seconds']) == {'idx_date', 'idx_customer', 'idx_receipt', 'idx_product'}
+        assert report['with']['used_bytes'] > report['without']['used_bytes']
+        assert set(report['without']['lookup_ms']) == set(report['with']['lookup_ms']) == {'customer', 'receipt', 'day'}
+
+        create_indexes(con, 'star')
+        assert con.execute("SELECT COUNT(*) FROM duckdb_indexes()").fetchone()[0] == 4
+
+
+def test_profile_reports_stages_per_chunk(tmp_path):
+    """--profile writes per-chunk stage timings and the index build to JSON, without changing the data"""
+    plain_path = str(tmp_path / "plain.db")
+    profiled_path = str(tmp_path / "profiled.db")
+    summary_path = tmp_path / "profile.json"
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-02-29', db_path=plain_path)
+    generate_initial_data(chunks=2, start_date='2024-01-01', end_date='2024-02-29', db_path=profiled_path,
+                          workers=2, profile_output=str(summary_path))
+
+    summary = json.loads(summary_path.read_text())
+    assert [chunk['chunk'] for chunk in summary['chunks']] == [0, 1]
+    for chunk in summary['chunks']:
+        assert {'sampling', 'row_assembly', 'arrow_build', 'insert'} <= set(chunk['stages'])
+        assert all(stage['calls'] > 0 and stage['wall_seconds'] >= 0 for stage in chunk['stages'].values())
+    assert summary['stages']['index_build']['calls'] == 1
+    assert summary['run']['rows'] > 0
+
+    query = "SELECT * FROM sales_data ORDER BY receipt_number, product_id"
+    with duckdb.connect(plain_path) as plain, duckdb.connect(profiled_path) as profiled:
+        pd.testing.assert_frame_equal(plain.execute(query).df(), profiled.execute(query).df())
+    with pytest.raises(ValueError):
+        generate_initial_data(chunks=1, engine='legacy', db_path=str(tmp_path / "legacy.db"),
+                              profile_output=str(summary_path))
+
+
+def test_parquet_dataset_matches_database(tmp_path):
+    """The partitioned Parquet dataset holds the same rows as the database, listed in the manifest"""
+    db_path = str(tmp_path / "parquet.db")
+    parquet_dir = tmp_path / "dataset"
+    generate_initial_data(chunks=2, start_date='2023-11-01', end_date='2024-02-29', db_path=db_path,
+                          parquet_dir=str(parquet_dir), row_group_size=100)
+
+    manifest = json.loads((parquet_dir / '_manifest.json').read_text())
+    assert manifest['partitioning'] == ['year', 'country'] and manifest['compression'] == 'zstd'
+    assert {entry['partition']['year'] for entry in manifest['files']} == {2023, 2024}
+    for entry in manifest['files']:
+        metadata = pq.read_metadata(parquet_dir / entry['file'])
+        assert metadata.num_rows == entry['rows']
+        assert all(metadata.row_group(i).num_rows <= 100 for i in range(metadata.num_row_groups))
+        assert entry['stats']['date']['min'][:4] == str(entry['partition']['year'])
+
+    query = """
+        SELECT year(date) AS year, country, COUNT(*), SUM(total_amount_per_product_sgd)
+        FROM {} GROUP BY ALL ORDER BY ALL
+    """
+    with duckdb.connect(db_path, read_only=True) as con:
+        expected = con.execute(query.format('sales_data')).fetchall()
+        dataset = f"read_parquet('{parquet_dir}/**/*.parquet', hive_partitioning = true)"
+        assert con.execute(query.format(dataset)).fetchall() == expected
+    assert manifest['total_rows'] == sum(entry['rows'] for entry in manifest['files']) == sum(r[2] for r in expected)
+
+
+def test_resume_removes_incomplete_parquet_dataset(tmp_path, monkeypatch):
+    """Resuming a --parquet-dir rebuild finishes the database and removes the half-written dataset"""
+    db_path = str(tmp_path / "parquet.db")
+    parquet_dir = tmp_path / "dataset"
+    options = dict(chunks=2, start_date='2024-01-01', end_date='2024-02-29', db_path=db_path)
+    record_batch = main.record_batch
+
+    def failing_record_batch(con, plan, batch, rows):
+        if plan['index'] == 1:
+            raise KeyboardInterrupt
+        record_batch(con, plan, batch, rows)
+
+    monkeypatch.setattr(main, 'record_batch', failing_record_batch)
+    with pytest.raises(KeyboardInterrupt):
+        generate_initial_data(parquet_dir=str(parquet_dir), **options)
+    monkeypatch.setattr(main, 'record_batch', record_batch)
+    assert parquet_dir.is_dir() and not (parquet_dir / '_manifest.json').exists()
+
+    resume_generation(db_path=db_path)
+    assert not parquet_dir.exists()
+    with duckdb.connect(db_path, read_only=True) as con:
+        assert con.execute("SELECT bool_and(completed) FROM generation_checkpoint").fetchone()[0]
+    # The directory is free for the next rebuild
+    generate_initial_data(parquet_dir=str(parquet_dir), **options)
+    assert (parquet_dir / '_manifest.json').exists()
+
+
+def test_arrow_sink_batches():
+    """Arrow sink splits writes at its capacity and stores missing columns as NULL"""
+    with duckdb.connect() as con:
+        con.execute("CREATE TABLE t (a BIGINT, b DECIMAL(10,2), c INTEGER)")
+        columns = [('a', 'BIGINT'), ('b', 'DECIMAL(10,2)'), ('c', 'INTEGER')]
+        sink = ArrowSink(con, table_name='t', columns=columns, capacity=4)
+        sink.write({'a': np.arange(6), 'b': np.full(6, 1.25)})
+        sink.write({'a': np.arange(6, 9), 'b': np.full(3, 2.5), 'c': np.ones(3)})
+        sink.close()
+
+        assert [t['rows'] for t in sink.timings] == [4, 4, 1]
+        rows = con.execute("SELECT a, b, c FROM t ORDER BY a").fetchall()
+        assert len(rows) == 9
+        assert rows[0][2] is None and rows[8][2] == 1
+        assert float(rows[8][1]) == 2.5
+
+
+if __name__ == "__main__":
+    test_vectorized_rows()
+    print("✅ Vectorized generator test completed!")
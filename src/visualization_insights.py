@@ -38,7 +38,7 @@ def generate_insights_summary():
                 COUNT(*) as transactions
             FROM sales_data 
             WHERE transaction_desc = 'Product Sale' 
-            AND EXTRACT(year FROM date) >= 2020
+            AND date >= TIMESTAMP '2020-01-01'
             GROUP BY product_name
             ORDER BY revenue DESC
             LIMIT 5
@@ -107,7 +107,7 @@ def generate_insights_summary():
                 COUNT(DISTINCT customer_number) as customers
             FROM sales_data 
             WHERE transaction_desc = 'Product Sale'
-            AND EXTRACT(year FROM date) >= 2020
+            AND date >= TIMESTAMP '2020-01-01'
             GROUP BY EXTRACT(year FROM date)
             ORDER BY year
         """).df()